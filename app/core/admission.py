@@ -0,0 +1,289 @@
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.deadline import current_deadline
+from app.core.metrics import counter, gauge
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """Work refused to protect the service; retry after `retry_after` seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Service overloaded ({reason}); retry after {math.ceil(retry_after)}s")
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class CircuitOpen(Overloaded):
+    pass
+
+
+class CircuitBreaker:
+    """Fail fast while the upstream is erroring.
+
+    - outcomes of upstream attempts are kept for `window_seconds`; once at
+      least `min_calls` are in and the failure share reaches
+      `error_threshold`, the circuit opens for `open_seconds`
+    - while open, `check` raises CircuitOpen without touching the upstream
+    - after that one probe call is let through (half-open): success
+      closes the circuit, failure opens it again
+    - `check` hands each call a token, the circuit's generation, which
+      moves on every time it opens, probes or closes; `record` ignores
+      outcomes of calls let through before the last change, so a slow call
+      from before the circuit opened cannot pass for the probe
+    """
+
+    def __init__(self, error_threshold: float = 0.5, min_calls: int = 20, window_seconds: float = 30, open_seconds: float = 15):
+        self.error_threshold = error_threshold
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._opened_at: Optional[float] = None
+        self._generation = 0
+        self._probe: Optional[int] = None  # token of the half-open probe in flight
+
+        self.opened = counter("llm_circuit_opened_total", "Times the upstream circuit breaker opened")
+        self.rejected = counter("llm_circuit_rejected_total", "Upstream calls refused while the circuit was open")
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.open_seconds:
+            return "open"
+        return "half_open"
+
+    def retry_after(self) -> float:
+        if self._opened_at is None:
+            return 0.0
+        return max(1.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def check(self) -> int:
+        """Raise CircuitOpen unless a call may go upstream now; returns the call's token."""
+        state = self.state
+        if state == "closed":
+            return self._generation
+        if state == "half_open" and self._probe is None:
+            self._generation += 1
+            self._probe = self._generation
+            return self._probe
+        self.rejected.inc()
+        raise CircuitOpen("upstream circuit open", self.retry_after())
+
+    def record(self, token: int, ok: bool) -> None:
+        """Outcome of the call `check` gave `token` to."""
+        if token != self._generation:
+            return  # let through before the circuit last opened, probed or closed
+        now = time.monotonic()
+        if self._probe is not None:
+            self._probe = None
+            if ok:
+                logger.info("Upstream circuit closed after a successful probe")
+                self._generation += 1
+                self._opened_at = None
+                self._outcomes.clear()
+            else:
+                self._trip(now)
+            return
+
+        self._outcomes.append((now, ok))
+        while self._outcomes and self._outcomes[0][0] < now - self.window_seconds:
+            self._outcomes.popleft()
+        if self._opened_at is None and len(self._outcomes) >= self.min_calls:
+            failures = sum(1 for _, success in self._outcomes if not success)
+            if failures / len(self._outcomes) >= self.error_threshold:
+                self._trip(now)
+
+    def abandon(self, token: int) -> None:
+        """The call `check` gave `token` to ended without an outcome (cancelled)."""
+        if token == self._probe:
+            self._probe = None
+
+    def _trip(self, now: float) -> None:
+        logger.warning("Upstream circuit opened for %.0fs", self.open_seconds)
+        self._generation += 1
+        self._opened_at = now
+        self._outcomes.clear()
+        self.opened.inc()
+
+
+class Ticket:
+    """Admitted capacity; `release` (idempotent) hands it back."""
+
+    def __init__(self, controller: Optional["AdmissionController"], cost: int):
+        self.controller = controller
+        self.cost = cost
+        self.started = time.monotonic()
+        self._released = controller is None
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self.controller.release(self.cost, time.monotonic() - self.started)
+
+    async def hold_while(self, events: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        """Pass `events` through, releasing the ticket when they end."""
+        try:
+            async for event in events:
+                yield event
+        finally:
+            self.release()
+
+
+class _Request:
+    def __init__(self, cost: int, future: "asyncio.Future[None]"):
+        self.cost = cost
+        self.future = future
+
+
+class AdmissionController:
+    """Weighted admission in front of the AI routes.
+
+    - each request declares a cost (roughly its upstream calls); up to
+      `capacity` cost runs at once
+    - beyond that requests wait in FIFO order, up to `max_queue_cost`
+      queued cost and `max_wait` seconds each
+    - anything past those limits, or arriving while the upstream circuit
+      is open, is refused at once with Overloaded and a Retry-After hint
+      based on recent service times
+    """
+
+    def __init__(
+        self,
+        capacity: int = 32,
+        max_queue_cost: int = 64,
+        max_wait: float = 10.0,
+        breaker: Optional[CircuitBreaker] = None,
+        enabled: bool = True,
+    ):
+        self.capacity = capacity
+        self.max_queue_cost = max_queue_cost
+        self.max_wait = max_wait
+        self.breaker = breaker
+        self.enabled = enabled
+
+        self._in_use = 0
+        self._queue: List[_Request] = []
+        self._seconds_per_cost = 1.0  # EWMA of hold time per unit of cost
+
+        self.admitted = counter("admission_admitted_total", "Requests admitted to the AI routes")
+        self.shed = counter("admission_shed_total", "Requests refused with 503, by reason")
+
+    @property
+    def queued_cost(self) -> int:
+        return sum(r.cost for r in self._queue)
+
+    def retry_after(self, cost: int) -> float:
+        backlog = self._in_use + self.queued_cost + cost - self.capacity
+        return min(60.0, max(1.0, backlog * self._seconds_per_cost / max(1, self.capacity) * 2))
+
+    async def acquire(self, cost: int) -> None:
+        cost = max(1, min(cost, self.capacity))
+        if self.breaker is not None and self.breaker.state == "open":
+            self.shed.inc(reason="circuit_open")
+            raise CircuitOpen("upstream circuit open", self.breaker.retry_after())
+
+        if not self._queue and self._in_use + cost <= self.capacity:
+            self._in_use += cost
+            self.admitted.inc()
+            return
+
+        if self.queued_cost + cost > self.max_queue_cost:
+            self.shed.inc(reason="queue_full")
+            raise Overloaded("admission queue full", self.retry_after(cost))
+
+        # no point queueing past the request's own deadline
+        deadline = current_deadline()
+        max_wait = self.max_wait if deadline is None else min(self.max_wait, deadline.remaining())
+        request = _Request(cost, asyncio.get_running_loop().create_future())
+        self._queue.append(request)
+        try:
+            await asyncio.wait_for(asyncio.shield(request.future), timeout=max_wait)
+        except asyncio.TimeoutError:
+            if request in self._queue:
+                self._queue.remove(request)
+                self._pump()
+                self.shed.inc(reason="timeout")
+                raise Overloaded("queued too long", self.retry_after(cost))
+            # granted just as the timeout fired: keep the slot
+        except asyncio.CancelledError:
+            if request in self._queue:
+                self._queue.remove(request)
+                self._pump()
+            elif request.future.done():
+                self.release(cost)
+            raise
+        self.admitted.inc()
+
+    def release(self, cost: int, held_seconds: Optional[float] = None) -> None:
+        cost = max(1, min(cost, self.capacity))
+        self._in_use -= cost
+        if held_seconds is not None:
+            self._seconds_per_cost = 0.8 * self._seconds_per_cost + 0.2 * held_seconds / cost
+        self._pump()
+
+    def _pump(self) -> None:
+        while self._queue and self._in_use + self._queue[0].cost <= self.capacity:
+            request = self._queue.pop(0)
+            self._in_use += request.cost
+            request.future.set_result(None)
+
+    async def enter(self, cost: int) -> Ticket:
+        """Admit `cost` units (raising Overloaded if refused) and return the ticket."""
+        if not self.enabled:
+            return Ticket(None, cost)
+        await self.acquire(cost)
+        return Ticket(self, cost)
+
+    @asynccontextmanager
+    async def slot(self, cost: int) -> AsyncIterator[None]:
+        """Hold `cost` units of capacity for the duration of the block."""
+        ticket = await self.enter(cost)
+        try:
+            yield
+        finally:
+            ticket.release()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "capacity": self.capacity,
+            "in_use": self._in_use,
+            "queued": len(self._queue),
+            "queued_cost": self.queued_cost,
+            "max_queue_cost": self.max_queue_cost,
+            "circuit": self.breaker.state if self.breaker is not None else None,
+            "admitted": self.admitted.value,
+            "shed": self.shed.value,
+        }
+
+
+breaker = CircuitBreaker(
+    error_threshold=settings.CIRCUIT_ERROR_THRESHOLD,
+    min_calls=settings.CIRCUIT_MIN_CALLS,
+    window_seconds=settings.CIRCUIT_WINDOW_SECONDS,
+    open_seconds=settings.CIRCUIT_OPEN_SECONDS,
+)
+
+admission = AdmissionController(
+    capacity=settings.ADMISSION_CAPACITY,
+    max_queue_cost=settings.ADMISSION_MAX_QUEUE_COST,
+    max_wait=settings.ADMISSION_MAX_WAIT_SECONDS,
+    breaker=breaker,
+    enabled=settings.ADMISSION_ENABLED,
+)
+
+gauge("admission_in_use", "Cost units currently admitted", lambda: admission._in_use)
+gauge("admission_queue_depth", "Requests waiting for admission", lambda: len(admission._queue))
+gauge("admission_queue_cost", "Cost units waiting for admission", lambda: admission.queued_cost)
+gauge("llm_circuit_open", "1 while the upstream circuit breaker is open", lambda: 1 if breaker.state == "open" else 0)
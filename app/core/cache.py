@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+from app.core import json_codec
+from app.core.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return " ".join(value.split()).lower()
+    if isinstance(value, Mapping):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        items = [_normalize(v) for v in value]
+        return sorted(items, key=lambda v: json.dumps(v, sort_keys=True))
+    return value
+
+
+def canonical_key(payload: Mapping[str, Any]) -> str:
+    """Content hash of a request payload.
+
+    Strings are whitespace-collapsed and lower-cased and list fields are
+    sorted, so cosmetically different submissions of the same trip collide.
+    """
+    canonical = json.dumps(_normalize(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """Bounded in-memory LRU whose entries also expire after `ttl_seconds`."""
+
+    def __init__(self, name: str, max_entries: int = 512, ttl_seconds: float = 3600):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = counter(f"{name}_evictions_total", "Entries dropped for capacity or TTL")
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.evictions.inc()
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions.inc()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def delete_where(self, predicate: Callable[[Any], bool]) -> int:
+        """Drop every entry whose value matches `predicate`; returns how many."""
+        with self._lock:
+            keys = [k for k, (_, value) in self._data.items() if predicate(value)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteStore:
+    """Small key -> JSON text store on local disk; survives restarts."""
+
+    def __init__(self, path: str, table: str = "cache", ttl_seconds: float = 3600):
+        self.path = path
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < time.time():
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + self.ttl_seconds),
+            )
+            conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            conn.commit()
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            conn = self._connect()
+            cur = conn.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (time.time(),))
+            conn.commit()
+            return cur.rowcount
+
+
+class TieredCache:
+    """In-memory LRU/TTL tier in front of a SQLite tier.
+
+    Disk access runs in a worker thread so the event loop never waits on it.
+    Values must be JSON-serialisable. Expired rows only leave the SQLite
+    tier when their key is looked up again, so `start` runs a background
+    purge of the whole tier every `purge_interval` seconds.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl_seconds: float, db_path: Optional[str] = None):
+        self.name = name
+        self.memory = TTLCache(name, max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.disk = SQLiteStore(db_path, table=name, ttl_seconds=ttl_seconds) if db_path else None
+        self.memory_hits = counter(f"{name}_memory_hits_total", "Lookups served from memory")
+        self.disk_hits = counter(f"{name}_disk_hits_total", "Lookups served from the SQLite tier")
+        self.misses = counter(f"{name}_misses_total", "Lookups that found nothing")
+        self.purged = counter(f"{name}_purged_total", "Expired rows deleted from the SQLite tier")
+        self._purger: Optional["asyncio.Task[None]"] = None
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits.inc()
+            return value
+
+        if self.disk is not None:
+            try:
+                raw = await asyncio.to_thread(self.disk.get, key)
+            except sqlite3.Error as e:
+                logger.warning("%s: disk tier read failed: %s", self.name, e)
+                raw = None
+            if raw is not None:
+                value = json_codec.loads(raw)
+                self.memory.set(key, value)
+                self.disk_hits.inc()
+                return value
+
+        self.misses.inc()
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.set, key, json_codec.dumps(value))
+            except sqlite3.Error as e:
+                logger.warning("%s: disk tier write failed: %s", self.name, e)
+
+    async def delete(self, key: str) -> None:
+        self.memory.delete(key)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.delete, key)
+
+    async def purge_expired(self) -> int:
+        """Delete every expired row of the SQLite tier; returns how many."""
+        if self.disk is None:
+            return 0
+        try:
+            purged = await asyncio.to_thread(self.disk.purge_expired)
+        except sqlite3.Error as e:
+            logger.warning("%s: disk tier purge failed: %s", self.name, e)
+            return 0
+        if purged:
+            self.purged.inc(purged)
+            logger.info("%s: purged %d expired row(s)", self.name, purged)
+        return purged
+
+    async def _purge_loop(self, interval: float) -> None:
+        while True:
+            await self.purge_expired()
+            await asyncio.sleep(interval)
+
+    def start(self, purge_interval: float = 600) -> None:
+        if self.disk is not None and self._purger is None:
+            self._purger = asyncio.create_task(self._purge_loop(purge_interval))
+
+    async def stop(self) -> None:
+        if self._purger is not None:
+            self._purger.cancel()
+            await asyncio.gather(self._purger, return_exceptions=True)
+            self._purger = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self.memory),
+            "max_entries": self.memory.max_entries,
+            "ttl_seconds": self.memory.ttl_seconds,
+            "memory_hits": self.memory_hits.value,
+            "disk_hits": self.disk_hits.value,
+            "misses": self.misses.value,
+            "evictions": self.memory.evictions.value,
+            "purged": self.purged.value,
+        }
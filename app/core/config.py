@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -6,6 +7,154 @@ from dotenv import load_dotenv
 load_dotenv()
 
 class Settings(BaseSettings):
-    OPENAI_API_KEY: str
+    OPENAI_API_KEY: str = ""
+    OPENAI_BASE_URL: Optional[str] = None
 
-settings = Settings()
\ No newline at end of file
+    # "openai" for the real API (or anything speaking its wire format via
+    # OPENAI_BASE_URL), "stub" for the in-process offline backend
+    LLM_BACKEND: str = "openai"
+
+    # worker processes; uvicorn reads the same variable. RELOAD (for
+    # `python main.py` during development) only works with one worker
+    WEB_CONCURRENCY: int = 1
+    RELOAD: bool = False
+
+    # stub backend behaviour (see app/core/llm_stub.py)
+    STUB_LATENCY_DIST: str = "lognormal"
+    STUB_LATENCY_MEAN: float = 1.0
+    STUB_LATENCY_STDDEV: float = 0.3
+    STUB_LATENCY_PER_ITEM: float = 0.0
+    STUB_ERROR_RATE: float = 0.0
+    STUB_MALFORMED_RATE: float = 0.0
+    STUB_SEED: int = 0
+
+    # /ai_suggestion response cache (memory LRU in front of SQLite)
+    SUGGESTION_CACHE_ENABLED: bool = True
+    SUGGESTION_CACHE_MAX_ENTRIES: int = 512
+    SUGGESTION_CACHE_TTL_SECONDS: int = 6 * 60 * 60
+    SUGGESTION_CACHE_DB_PATH: str = "data/suggestion_cache.sqlite3"
+    SUGGESTION_CACHE_PURGE_INTERVAL_SECONDS: int = 10 * 60
+
+    # long-trip outlines, shared by requests with the same destination,
+    # trip length and start date (in memory only)
+    OUTLINE_CACHE_ENABLED: bool = True
+    OUTLINE_CACHE_MAX_ENTRIES: int = 256
+    OUTLINE_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+
+    # long-trip generation: start detail chunks while the outline streams;
+    # chunk size adapts to trip length within these bounds
+    LONG_TRIP_PIPELINE: bool = True
+    LONG_TRIP_MIN_CHUNK_DAYS: int = 2
+    LONG_TRIP_MAX_CHUNK_DAYS: int = 6
+    # follow-up calls per chunk for days that came back missing or invalid
+    LONG_TRIP_REPAIR_ROUNDS: int = 2
+
+    # background itinerary jobs (/ai_suggestion/jobs); finished results are
+    # kept for JOBS_RESULT_TTL_SECONDS
+    JOBS_WORKERS: int = 4
+    JOBS_MAX_QUEUED: int = 1000
+    JOBS_RESULT_TTL_SECONDS: int = 60 * 60
+    JOBS_DB_PATH: str = "data/jobs.sqlite3"
+    # how often a worker process checks whether its running jobs were
+    # cancelled through another worker
+    JOBS_CANCEL_POLL_SECONDS: float = 1.0
+
+    # batch itineraries (/ai_suggestion/batch): items per request, and how
+    # many distinct items of one batch are generated at a time
+    BATCH_MAX_ITEMS: int = 50
+    BATCH_CONCURRENCY: int = 4
+
+    # opt-in: after /ai_suggestion returns, precompute regenerate
+    # alternatives for each activity at background priority
+    REGENERATE_PREFETCH_ENABLED: bool = False
+    REGENERATE_PREFETCH_MAX_SLOTS: int = 24
+    REGENERATE_PREFETCH_MAX_PENDING: int = 200
+    REGENERATE_PREFETCH_MAX_ENTRIES: int = 2048
+    REGENERATE_PREFETCH_TTL_SECONDS: int = 60 * 60
+
+    # local venue index (SQLite, full-text search), filled from generated
+    # itineraries and alternatives. A regenerate request is answered from
+    # it, without an upstream call, when 4 distinct venues of its
+    # destination match every word of the search; venues not seen again
+    # for TTL_SECONDS drop out
+    VENUE_INDEX_ENABLED: bool = True
+    VENUE_INDEX_DB_PATH: str = "data/venues.sqlite3"
+    VENUE_INDEX_TTL_SECONDS: int = 30 * 24 * 60 * 60
+
+    # per-request deadline: X-Request-Timeout (seconds) or this default,
+    # which stays under nginx's 300s proxy_read_timeout; upstream work stops
+    # MARGIN seconds early, and with less than LOW left requests degrade
+    # (no retries/repairs, fallback models, partial long trips)
+    REQUEST_TIMEOUT_SECONDS: float = 280.0
+    REQUEST_DEADLINE_MARGIN_SECONDS: float = 2.0
+    REQUEST_DEADLINE_LOW_SECONDS: float = 20.0
+
+    # admission control in front of the AI routes, in cost units (about one
+    # per upstream call a request makes); requests past the queue limits
+    # get 503 + Retry-After
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_CAPACITY: int = 32
+    ADMISSION_MAX_QUEUE_COST: int = 64
+    ADMISSION_MAX_WAIT_SECONDS: float = 10.0
+
+    # upstream circuit breaker: opens for CIRCUIT_OPEN_SECONDS when at least
+    # ERROR_THRESHOLD of the calls in the window failed
+    CIRCUIT_ERROR_THRESHOLD: float = 0.5
+    CIRCUIT_MIN_CALLS: int = 20
+    CIRCUIT_WINDOW_SECONDS: float = 30.0
+    CIRCUIT_OPEN_SECONDS: float = 15.0
+
+    # pooled HTTP client for upstream calls, opened in the app lifespan.
+    # Keep MAX_KEEPALIVE at or above LLM_MAX_IN_FLIGHT so finished calls
+    # leave their connection for the next; HTTP2 needs the `h2` package.
+    # WARMUP_CONNECTIONS are opened at startup (0 = none)
+    UPSTREAM_MAX_CONNECTIONS: int = 64
+    UPSTREAM_MAX_KEEPALIVE: int = 32
+    UPSTREAM_KEEPALIVE_EXPIRY: float = 60.0
+    UPSTREAM_CONNECT_TIMEOUT: float = 5.0
+    UPSTREAM_TIMEOUT: float = 600.0
+    UPSTREAM_HTTP2: bool = False
+    UPSTREAM_WARMUP_CONNECTIONS: int = 4
+    UPSTREAM_WARMUP_TIMEOUT: float = 5.0
+
+    # upstream LLM scheduler (0 tokens/minute = no TPM limit). With several
+    # workers, LLM_MAX_IN_FLIGHT holds across all of them (lock files in
+    # LLM_SLOTS_DIR) and the token budget is split between them
+    LLM_MAX_IN_FLIGHT: int = 16
+    LLM_SLOTS_DIR: str = "data/llm_slots"
+    LLM_TOKENS_PER_MINUTE: int = 0
+    LLM_RETRY_BASE_DELAY: float = 1.0
+    LLM_RETRY_MAX_DELAY: float = 30.0
+    LLM_PRIORITY_AGING_SECONDS: float = 10.0
+    # slots background work (regenerate prefetch) may hold at once
+    LLM_BACKGROUND_MAX_IN_FLIGHT: int = 4
+
+    # model per generation stage; while a primary's error rate or
+    # MODEL_ROUTER_PERCENTILE latency (over the last WINDOW_SECONDS) breaks
+    # its LATENCY_BUDGET, calls go to the FALLBACK (empty = no fallback)
+    MODEL_SHORT_TRIP: str = "gpt-4o-search-preview"
+    MODEL_SHORT_TRIP_FALLBACK: str = "gpt-4o-mini-search-preview"
+    MODEL_SHORT_TRIP_LATENCY_BUDGET: float = 60.0
+    MODEL_OUTLINE: str = "gpt-4o-search-preview"
+    MODEL_OUTLINE_FALLBACK: str = "gpt-4o-mini-search-preview"
+    MODEL_OUTLINE_LATENCY_BUDGET: float = 20.0
+    MODEL_DETAIL: str = "gpt-4o-search-preview"
+    MODEL_DETAIL_FALLBACK: str = "gpt-4o-mini-search-preview"
+    MODEL_DETAIL_LATENCY_BUDGET: float = 45.0
+    MODEL_REGENERATE: str = "gpt-3.5-turbo"
+    MODEL_REGENERATE_FALLBACK: str = ""
+    MODEL_REGENERATE_LATENCY_BUDGET: float = 20.0
+    MODEL_ROUTER_WINDOW_SECONDS: float = 60.0
+    MODEL_ROUTER_MIN_SAMPLES: int = 10
+    MODEL_ROUTER_ERROR_THRESHOLD: float = 0.3
+    MODEL_ROUTER_PERCENTILE: float = 90.0
+
+    # hedged itinerary calls: a call still running at this percentile of
+    # recent latency gets a duplicate; hedges are capped at BUDGET_RATIO
+    # of calls
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_PERCENTILE: float = 95.0
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+    LLM_HEDGE_BUDGET_RATIO: float = 0.1
+
+settings = Settings()
@@ -0,0 +1,141 @@
+import time
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from app.core.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before the work finished."""
+
+
+class Deadline:
+    """Point in time by which a request's work must be done.
+
+    `low` turns true once less than `low_seconds` remain; callers use it
+    to degrade (no retries, a faster model, partial results) rather than
+    start work that cannot finish.
+    """
+
+    def __init__(self, seconds: float, low_seconds: float = 0):
+        self.expires_at = time.monotonic() + seconds
+        self.low_seconds = low_seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def low(self) -> bool:
+        return self.remaining() < self.low_seconds
+
+
+deadline_var: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+
+disconnects = counter("http_client_disconnects_total", "Requests cancelled because the client went away")
+
+
+def current_deadline() -> Optional[Deadline]:
+    return deadline_var.get()
+
+
+def deadline_low() -> bool:
+    deadline = deadline_var.get()
+    return deadline is not None and deadline.low()
+
+
+def parse_timeout(value: Optional[bytes], default: float) -> float:
+    """Seconds from an `X-Request-Timeout` header value, capped at `default`."""
+    if not value:
+        return default
+    try:
+        seconds = float(value.decode("latin-1"))
+    except ValueError:
+        return default
+    return min(default, max(0.0, seconds))
+
+
+class DeadlineMiddleware:
+    """ASGI middleware giving each HTTP request a deadline and cancelling it on disconnect.
+
+    - the deadline is the caller's `X-Request-Timeout` (seconds, no more
+      than `default_seconds`) or `default_seconds`, minus `margin_seconds`
+      to get the answer back in time; it is set in `deadline_var` for
+      everything the request runs
+    - once the request body has been read, the connection is watched: if
+      the client goes away before the response is complete, the request is
+      cancelled so its upstream calls stop (coalesced generations carry on
+      while anyone still waits on them)
+    """
+
+    def __init__(self, app: Any, default_seconds: float, margin_seconds: float = 0, low_seconds: float = 0):
+        self.app = app
+        self.default_seconds = default_seconds
+        self.margin_seconds = margin_seconds
+        self.low_seconds = low_seconds
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        seconds = parse_timeout(headers.get(b"x-request-timeout"), self.default_seconds)
+        token = deadline_var.set(Deadline(max(0.0, seconds - self.margin_seconds), self.low_seconds))
+        try:
+            await self._run(scope, receive, send)
+        finally:
+            deadline_var.reset(token)
+
+    async def _run(self, scope: dict, receive: Any, send: Any) -> None:
+        body_read = asyncio.Event()
+        disconnected = asyncio.Event()
+        responded = False
+
+        async def app_receive() -> dict:
+            if body_read.is_set():
+                # the watcher owns `receive` now
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+            elif not message.get("more_body"):
+                body_read.set()
+            return message
+
+        async def app_send(message: dict) -> None:
+            nonlocal responded
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                responded = True
+            await send(message)
+
+        async def watch() -> None:
+            await body_read.wait()
+            while not disconnected.is_set():
+                if (await receive())["type"] == "http.disconnect":
+                    disconnected.set()
+
+        app_task = asyncio.ensure_future(self.app(scope, app_receive, app_send))
+        watcher = asyncio.ensure_future(watch())
+        try:
+            await asyncio.wait({app_task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not app_task.done() and disconnected.is_set() and not responded:
+                logger.info("Client disconnected from %s; cancelling the request", scope.get("path", ""))
+                disconnects.inc()
+                app_task.cancel()
+                try:
+                    await app_task
+                except asyncio.CancelledError:
+                    pass
+                return
+            await app_task
+        finally:
+            watcher.cancel()
+            if not app_task.done():
+                app_task.cancel()
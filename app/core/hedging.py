@@ -0,0 +1,128 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional
+
+from app.core.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+
+class Hedger:
+    """Launch a duplicate of a slow call and keep whichever finishes first.
+
+    - latencies of successful calls are kept per `group` in a rolling window;
+      once `min_samples` are in, a call still running at the `percentile`
+      of that window gets one hedge
+    - hedges are paid from a budget that earns `budget_ratio` of a hedge
+      per call (capped at `burst`), so they stay a bounded share of
+      upstream spend no matter how slow the upstream gets
+    - the loser is cancelled; a failure only counts once both copies failed
+
+    Both copies run concurrently, so anything `func` does on the side
+    (e.g. streaming items to a callback) must tolerate duplicates.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        percentile: float = 95.0,
+        min_samples: int = 20,
+        window: int = 200,
+        budget_ratio: float = 0.1,
+        burst: float = 10.0,
+        min_delay: float = 0.05,
+    ):
+        self.name = name
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.budget_ratio = budget_ratio
+        self.burst = burst
+        self.min_delay = min_delay
+
+        self._latencies: Dict[Hashable, Deque[float]] = {}
+        self._budget = 0.0
+
+        self.requests = counter(f"{name}_requests_total", "Calls eligible for hedging")
+        self.hedges = counter(f"{name}_hedges_total", "Hedge calls launched")
+        self.wins = counter(f"{name}_wins_total", "Hedge calls that finished first")
+        self.budget_exhausted = counter(f"{name}_budget_exhausted_total", "Hedges skipped for lack of budget")
+
+    def observe(self, group: Hashable, seconds: float) -> None:
+        samples = self._latencies.get(group)
+        if samples is None:
+            samples = self._latencies[group] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def delay(self, group: Hashable) -> Optional[float]:
+        """Seconds to wait before hedging a call in `group`; None until enough samples."""
+        samples = self._latencies.get(group)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        rank = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay, ordered[rank])
+
+    def _take_budget(self) -> bool:
+        if self._budget >= 1:
+            self._budget -= 1
+            return True
+        self.budget_exhausted.inc()
+        return False
+
+    async def run(
+        self,
+        func: Callable[[], Awaitable[Any]],
+        group: Hashable = None,
+        can_hedge: Optional[Callable[[], bool]] = None,
+    ) -> Any:
+        """Await `func()`, hedging it once if it runs long.
+
+        `can_hedge` is checked at hedge time; returning False (e.g. no free
+        upstream slot, so the copy would only queue) skips the hedge.
+        """
+        self.requests.inc()
+        self._budget = min(self.burst, self._budget + self.budget_ratio)
+        started = time.monotonic()
+        primary = asyncio.ensure_future(func())
+        hedge: Optional["asyncio.Future[Any]"] = None
+        try:
+            wait = self.delay(group)
+            if wait is not None:
+                done, _ = await asyncio.wait({primary}, timeout=wait)
+                if not done and (can_hedge is None or can_hedge()) and self._take_budget():
+                    logger.info("%s: call running past %.2fs, hedging", self.name, wait)
+                    self.hedges.inc()
+                    hedge = asyncio.ensure_future(func())
+
+            pending = {primary} if hedge is None else {primary, hedge}
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [t for t in done if t.exception() is None]
+                winner = succeeded[0] if succeeded else None
+                if winner is not None or not pending:
+                    break
+            if winner is None:
+                # every copy failed: surface the primary's error
+                return primary.result()
+            if winner is hedge:
+                self.wins.inc()
+            self.observe(group, time.monotonic() - started)
+            return winner.result()
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def stats(self) -> dict:
+        requests = self.requests.value
+        return {
+            "requests": requests,
+            "hedges": self.hedges.value,
+            "wins": self.wins.value,
+            "hedge_rate": round(self.hedges.value / requests, 4) if requests else 0.0,
+            "budget_exhausted": self.budget_exhausted.value,
+            "delays": {str(g): self.delay(g) for g in self._latencies},
+        }
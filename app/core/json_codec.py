@@ -0,0 +1,43 @@
+import json
+from typing import Any, Union
+
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib json module does the same job, slower
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Parse one JSON document; raises json.JSONDecodeError (a ValueError)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value: Any) -> str:
+    """Compact JSON text. Non-ASCII is written as is, not \\u-escaped."""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class ModelResponse(Response):
+    """JSON response for a model that is already validated.
+
+    Returning a model from a route makes FastAPI validate it again against
+    `response_model` and then encode it with `json.dumps`; returning it
+    wrapped in this skips both, and pydantic serializes it straight to
+    JSON. The route keeps `response_model` for the OpenAPI schema.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.model_dump_json().encode()
+        return dumps(content).encode()
@@ -0,0 +1,114 @@
+import logging
+from typing import Any, AsyncIterator, Callable, List, Optional
+
+from app.core import json_codec
+
+logger = logging.getLogger(__name__)
+
+
+class JSONArrayStreamParser:
+    """Pull completed elements of one named JSON array out of streamed text.
+
+    Feed completion deltas as they arrive; `feed` returns every element of
+    the `key` array whose closing brace has been seen since the last call.
+    Text before the first `{` (code fences, leading prose) is skipped, which
+    covers the wrappers `parse_json` skips in full completions. The key is
+    matched as a real JSON key, not inside string values. Only object/array
+    elements are emitted; an element that fails to parse is logged and
+    skipped.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self._buffer = ""
+        self._pos = 0  # next unscanned index in _buffer
+        self._started = False  # seen the first "{"
+        self._in_array = False
+        self._pending: Optional[str] = None  # after the key: expecting ":" then "["
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._start: Optional[int] = None  # start of the current string/element
+        self.done = False
+        self.count = 0
+
+    def feed(self, text: str) -> List[Any]:
+        if self.done or not text:
+            return []
+        self._buffer += text
+        found: List[Any] = []
+        buf = self._buffer
+        i = self._pos
+
+        while i < len(buf) and not self.done:
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if not self._in_array:
+                        is_key = buf[self._start + 1 : i] == self.key
+                        self._pending = "colon" if is_key else None
+                        self._start = None
+            elif not self._started:
+                self._started = ch == "{"
+            elif not self._in_array:
+                if ch.isspace():
+                    pass
+                elif ch == ":" and self._pending == "colon":
+                    self._pending = "bracket"
+                elif ch == "[" and self._pending == "bracket":
+                    self._in_array = True
+                else:
+                    self._pending = None
+                    if ch == '"':
+                        self._in_string = True
+                        self._start = i
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0:
+                    # closing bracket of the array itself
+                    self.done = True
+                else:
+                    self._depth -= 1
+                    if self._depth == 0 and self._start is not None:
+                        self._emit(buf[self._start : i + 1], found)
+                        self._start = None
+            i += 1
+
+        # drop what has been fully consumed
+        cut = self._start if self._start is not None else i
+        self._buffer = buf[cut:]
+        self._pos = i - cut
+        if self._start is not None:
+            self._start = 0
+        return found
+
+    def _emit(self, element: str, found: List[Any]) -> None:
+        try:
+            found.append(json_codec.loads(element))
+            self.count += 1
+        except ValueError as e:
+            logger.warning("Skipping unparseable %s element: %s", self.key, e)
+
+
+async def collect_stream(pieces: AsyncIterator[str], key: str, on_item: Callable[[Any], None]) -> str:
+    """Consume streamed completion text, calling `on_item` for each finished `key[]` element.
+
+    Returns the full text once the stream ends.
+    """
+    parser = JSONArrayStreamParser(key)
+    received: List[str] = []
+    async for piece in pieces:
+        received.append(piece)
+        for item in parser.feed(piece):
+            on_item(item)
+    return "".join(received).strip()
@@ -0,0 +1,113 @@
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from openai import AsyncOpenAI
+
+from app.core.config import settings
+from app.core.tokens import record as record_tokens
+from app.core.upstream import UpstreamPool, upstream
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBackend(ABC):
+    """Chat-completion provider used by the services' `get_openai_response`."""
+
+    name = "base"
+
+    @abstractmethod
+    async def complete(self, model: str, messages: List[Dict[str, str]], **kwargs: Any) -> str:
+        """Return the assistant message text for `messages`."""
+
+    async def stream(self, model: str, messages: List[Dict[str, str]], **kwargs: Any) -> AsyncIterator[str]:
+        """Yield the assistant message text in pieces as it is generated.
+
+        Backends without native streaming yield the whole completion at once.
+        """
+        yield await self.complete(model, messages, **kwargs)
+
+    async def aclose(self) -> None:
+        pass
+
+    def record_usage(self, messages: List[Dict[str, str]], text: str, usage: Any = None) -> None:
+        """Count the call's tokens: provider-reported `usage` if given, else ~4 chars per token."""
+        if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+            details = getattr(usage, "prompt_tokens_details", None)
+            cached = getattr(details, "cached_tokens", None) or 0
+            record_tokens(usage.prompt_tokens, usage.completion_tokens or 0, cached, source="reported")
+            return
+        prompt_chars = sum(len(m.get("content") or "") for m in messages)
+        record_tokens(prompt_chars // 4, len(text) // 4)
+
+
+class OpenAIBackend(LLMBackend):
+    """OpenAI (or any server speaking its chat-completions wire format)."""
+
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, pool: Optional[UpstreamPool] = None):
+        self.api_key = api_key or settings.OPENAI_API_KEY
+        self.base_url = base_url or settings.OPENAI_BASE_URL
+        self.pool = pool
+        self._client: Optional[AsyncOpenAI] = None
+        self._http_client: Any = None
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        """SDK client on the pool's current HTTP client (rebuilt if the pool was reopened)."""
+        http_client = self.pool.get() if self.pool is not None else None
+        if self._client is None or http_client is not self._http_client:
+            # retries belong to the LLMScheduler; the SDK's own would multiply them
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                max_retries=0,
+                http_client=http_client,
+            )
+            self._http_client = http_client
+        return self._client
+
+    async def complete(self, model: str, messages: List[Dict[str, str]], **kwargs: Any) -> str:
+        completion = await self.client.chat.completions.create(model=model, messages=messages, **kwargs)
+        text = completion.choices[0].message.content.strip()
+        self.record_usage(messages, text, getattr(completion, "usage", None))
+        return text
+
+    async def stream(self, model: str, messages: List[Dict[str, str]], **kwargs: Any) -> AsyncIterator[str]:
+        if not settings.OPENAI_BASE_URL:
+            # only OpenAI itself is known to accept this; it adds a final usage chunk
+            kwargs.setdefault("stream_options", {"include_usage": True})
+        response = await self.client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs)
+        received: List[str] = []
+        usage = None
+        async with response:
+            async for chunk in response:
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    received.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        self.record_usage(messages, "".join(received), usage)
+
+    async def aclose(self) -> None:
+        # a shared pool is closed by its owner (the app lifespan)
+        if self.pool is None and self._client is not None:
+            await self._client.close()
+
+
+def create_backend(name: Optional[str] = None, pool: Optional[UpstreamPool] = upstream) -> LLMBackend:
+    """Build the backend selected by `name` or `settings.LLM_BACKEND`.
+
+    OpenAI backends send their calls through `pool`, the app's shared
+    client by default.
+    """
+    name = (name or settings.LLM_BACKEND).lower()
+    if name == "openai":
+        return OpenAIBackend(pool=pool)
+    if name == "stub":
+        from app.core.llm_stub import StubBackend, StubConfig
+
+        logger.warning("Using the local stub LLM backend; responses are synthetic")
+        return StubBackend(StubConfig.from_settings())
+    raise ValueError(f"Unknown LLM_BACKEND {name!r}; expected 'openai' or 'stub'")
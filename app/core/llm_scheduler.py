@@ -0,0 +1,410 @@
+import time
+import random
+import asyncio
+import logging
+import itertools
+from enum import IntEnum
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, List, Optional
+
+from app.core.admission import CircuitBreaker, Overloaded, breaker as default_breaker
+from app.core.config import settings
+from app.core.deadline import DeadlineExceeded, current_deadline
+from app.core.hedging import Hedger
+from app.core.metrics import counter, gauge, histogram
+from app.core.process_locks import SharedSlots
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Lower value is served first."""
+
+    INTERACTIVE = 0  # short trips, regenerate
+    STANDARD = 1  # long-trip outline pass
+    BULK = 2  # long-trip detail chunks
+    BACKGROUND = 3  # speculative work (regenerate prefetch); never ages
+
+
+NON_RETRYABLE_STATUS = {400, 401, 403, 404, 422}
+
+# calls made under a lower class (e.g. a batch) never outrank it
+priority_floor: ContextVar[Priority] = ContextVar("llm_priority_floor", default=Priority.INTERACTIVE)
+
+
+def estimate_tokens(*texts: str, completion: int = 0) -> int:
+    """Rough token estimate (~4 chars per token) used for TPM budgeting."""
+    return sum(len(t) for t in texts) // 4 + completion
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    # OpenAI reset headers look like "1s", "6m0s", "20ms"
+    total, number = 0.0, ""
+    i = 0
+    try:
+        while i < len(value):
+            ch = value[i]
+            if ch.isdigit() or ch == ".":
+                number += ch
+            elif value.startswith("ms", i):
+                total += float(number) / 1000
+                number = ""
+                i += 1
+            elif ch in "hms":
+                total += float(number) * {"h": 3600, "m": 60, "s": 1}[ch]
+                number = ""
+            else:
+                return None
+            i += 1
+        if number:
+            total += float(number)
+    except ValueError:
+        return None
+    return total
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Server-requested wait from Retry-After / rate-limit reset headers, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    if headers.get("retry-after"):
+        value = headers["retry-after"]
+        try:
+            return float(value)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    resets = [
+        _parse_duration(headers[h])
+        for h in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+        if headers.get(h)
+    ]
+    resets = [r for r in resets if r is not None]
+    return max(resets) if resets else None
+
+
+def error_status(error: BaseException) -> Optional[int]:
+    """HTTP status of an upstream error (on the error or its response), if it has one."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+class _Waiter:
+    def __init__(self, priority: Priority, tokens: int, seq: int, future: "asyncio.Future[None]"):
+        self.priority = priority
+        self.tokens = tokens
+        self.seq = seq
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class LLMScheduler:
+    """Process-wide gate for every upstream LLM call.
+
+    - at most `max_in_flight` calls run at once, across all requests
+    - a tokens-per-minute bucket (0 disables it) paces admissions
+    - a 429 with Retry-After / rate-limit reset headers pauses all dispatch
+      until the server says it is safe again
+    - waiters are served by priority class; a waiter gains one class per
+      `aging_seconds` spent queued so bulk fan-outs still make progress
+    - BACKGROUND calls only run when nothing else is waiting, never age,
+      and hold at most `background_max_in_flight` slots
+    - with a circuit `breaker`, calls fail fast with CircuitOpen while the
+      upstream error rate is over its threshold; those are never retried
+    - failed calls retry with full-jitter exponential backoff, releasing
+      their slot while they sleep
+    - with `shared_slots`, a call also holds one of those cross-process
+      slots while it runs, so several workers together stay within them;
+      priority order only holds within a process
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 16,
+        tokens_per_minute: int = 0,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        aging_seconds: float = 10.0,
+        background_max_in_flight: int = 4,
+        breaker: Optional[CircuitBreaker] = None,
+        shared_slots: Optional[SharedSlots] = None,
+    ):
+        self.max_in_flight = max_in_flight
+        self.tokens_per_minute = tokens_per_minute
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.aging_seconds = aging_seconds
+        self.background_max_in_flight = background_max_in_flight
+        self.breaker = breaker
+        self.shared_slots = shared_slots
+
+        self._in_flight = 0
+        self._background_in_flight = 0
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self.calls = counter("llm_calls_total", "Upstream LLM call attempts")
+        self.retries = counter("llm_retries_total", "Upstream LLM call retries")
+        self.rate_limited = counter("llm_rate_limited_total", "Upstream 429 responses")
+        self.deadline_exceeded = counter("llm_deadline_exceeded_total", "Upstream calls abandoned at the request deadline")
+        self.upstream_seconds = histogram("llm_upstream_duration_seconds", "Duration of single upstream call attempts")
+        self.queue_seconds = histogram("llm_queue_wait_seconds", "Time calls waited for a scheduler slot")
+
+    # admission
+    async def acquire(self, priority: Priority = Priority.STANDARD, tokens: int = 0) -> None:
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(priority, tokens, next(self._seq), loop.create_future())
+        self._waiters.append(waiter)
+        self._pump()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter.future.done() and not waiter.future.cancelled():
+                # granted in the same tick we were cancelled: hand the slot back
+                self.release(priority)
+            raise
+
+    def release(self, priority: Priority = Priority.STANDARD) -> None:
+        self._in_flight -= 1
+        if priority == Priority.BACKGROUND:
+            self._background_in_flight -= 1
+        self._pump()
+
+    def _effective_priority(self, waiter: _Waiter, now: float) -> float:
+        if self.aging_seconds <= 0 or waiter.priority == Priority.BACKGROUND:
+            return waiter.priority
+        return waiter.priority - (now - waiter.enqueued_at) / self.aging_seconds
+
+    def _refill(self, now: float) -> None:
+        if self.tokens_per_minute <= 0:
+            return
+        elapsed = now - self._refilled_at
+        self._refilled_at = now
+        self._tokens = min(float(self.tokens_per_minute), self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def _pump(self) -> None:
+        now = time.monotonic()
+        self._refill(now)
+        while self._waiters and self._in_flight < self.max_in_flight:
+            if now < self._blocked_until:
+                self._wake_in(self._blocked_until - now)
+                return
+
+            eligible = [
+                w for w in self._waiters
+                if w.priority != Priority.BACKGROUND or self._background_in_flight < self.background_max_in_flight
+            ]
+            if not eligible:
+                return
+            waiter = min(eligible, key=lambda w: (self._effective_priority(w, now), w.seq))
+            if waiter.future.done():
+                self._waiters.remove(waiter)
+                continue
+
+            if self.tokens_per_minute > 0:
+                # a single call bigger than the whole budget may go once the bucket is full
+                needed = min(waiter.tokens, self.tokens_per_minute)
+                if self._tokens < needed:
+                    self._wake_in((needed - self._tokens) * 60 / self.tokens_per_minute)
+                    return
+                self._tokens -= needed
+
+            self._waiters.remove(waiter)
+            self._in_flight += 1
+            if waiter.priority == Priority.BACKGROUND:
+                self._background_in_flight += 1
+            waiter.future.set_result(None)
+
+    def _wake_in(self, delay: float) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(max(delay, 0.01), self._pump)
+
+    def _block_for(self, seconds: float) -> None:
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    # execution
+    async def call(self, func: Callable[[], Awaitable[Any]], priority: Priority = Priority.STANDARD, tokens: int = 0) -> Any:
+        """Run one attempt of `func` inside a scheduler slot."""
+        token = self.breaker.check() if self.breaker is not None else 0
+        try:
+            with self.queue_seconds.time(priority=priority.name):
+                await self.acquire(priority, tokens)
+                try:
+                    slot = await self.shared_slots.acquire() if self.shared_slots is not None else None
+                except BaseException:
+                    self.release(priority)
+                    raise
+        except BaseException:
+            if self.breaker is not None:
+                self.breaker.abandon(token)
+            raise
+        self.calls.inc(priority=priority.name)
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            result = await func()
+            if self.breaker is not None:
+                self.breaker.record(token, True)
+            return result
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            if self.breaker is not None:
+                self.breaker.abandon(token)
+            raise
+        except Exception as e:
+            outcome = "error"
+            if self.breaker is not None:
+                # client errors (4xx, incl. 429) say nothing about upstream health
+                status = error_status(e)
+                self.breaker.record(token, status is not None and status < 500)
+            if error_status(e) == 429:
+                self.rate_limited.inc()
+                wait = retry_after_seconds(e)
+                if wait is not None:
+                    logger.warning("Upstream rate limited; pausing dispatch for %.1fs", wait)
+                    self._block_for(wait)
+            raise
+        finally:
+            self.upstream_seconds.observe(time.perf_counter() - started, priority=priority.name, outcome=outcome)
+            if slot is not None:
+                self.shared_slots.release(slot)
+            self.release(priority)
+
+    async def run(
+        self,
+        func: Callable[[], Awaitable[Any]],
+        priority: Priority = Priority.STANDARD,
+        tokens: int = 0,
+        max_retries: int = 2,
+        hedger: Optional[Hedger] = None,
+    ) -> Any:
+        """Run `func` through the scheduler, retrying transient failures.
+
+        With a `hedger`, each attempt may be duplicated when it runs long;
+        the duplicate takes its own slot and tokens like any other call, and
+        is only launched while a slot is free.
+
+        Under a request deadline (`app.core.deadline`) attempts are cut off
+        when it expires (raising DeadlineExceeded), a retry whose backoff
+        would outlast it is not made, and once the deadline is low there
+        are no retries at all.
+
+        `priority` is lowered to the context's `priority_floor` if it is above it.
+        """
+        priority = max(priority, priority_floor.get())
+        deadline = current_deadline()
+        attempt = 0
+        while True:
+            if deadline is not None:
+                if deadline.expired():
+                    self.deadline_exceeded.inc(priority=priority.name)
+                    raise DeadlineExceeded("request deadline passed before the upstream call")
+                if deadline.low():
+                    max_retries = min(max_retries, attempt)
+            try:
+                return await self._attempt(func, priority, tokens, hedger, deadline)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                attempt += 1
+                logger.warning("Attempt %d failed with error: %s", attempt, e)
+                status = error_status(e)
+                if attempt > max_retries or status in NON_RETRYABLE_STATUS or isinstance(e, Overloaded):
+                    logger.error("Giving up after %d attempt(s).", attempt)
+                    raise
+                delay = self.backoff_delay(attempt, retry_after_seconds(e))
+                if deadline is not None and delay >= deadline.remaining():
+                    logger.error("Giving up after %d attempt(s); a retry would outlast the deadline.", attempt)
+                    raise
+                self.retries.inc(priority=priority.name)
+                await asyncio.sleep(delay)
+
+    async def _attempt(
+        self,
+        func: Callable[[], Awaitable[Any]],
+        priority: Priority,
+        tokens: int,
+        hedger: Optional[Hedger],
+        deadline: Any,
+    ) -> Any:
+        if hedger is not None:
+            attempt = hedger.run(
+                lambda: self.call(func, priority, tokens),
+                group=priority.name,
+                can_hedge=self._has_free_slot,
+            )
+        else:
+            attempt = self.call(func, priority, tokens)
+        if deadline is None:
+            return await attempt
+        try:
+            return await asyncio.wait_for(attempt, deadline.remaining())
+        except asyncio.TimeoutError:
+            if not deadline.expired():
+                raise
+            self.deadline_exceeded.inc(priority=priority.name)
+            raise DeadlineExceeded("request deadline passed during the upstream call") from None
+
+    def _has_free_slot(self) -> bool:
+        return self._in_flight < self.max_in_flight and not self._waiters and time.monotonic() >= self._blocked_until
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, self.base_delay)
+        return delay
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self._in_flight,
+            "queued": len(self._waiters),
+            "max_in_flight": self.max_in_flight,
+            "shared_slots": self.shared_slots.slots if self.shared_slots is not None else None,
+            "background_in_flight": self._background_in_flight,
+            "tokens_available": round(self._tokens) if self.tokens_per_minute > 0 else None,
+            "blocked_for": max(0.0, self._blocked_until - time.monotonic()),
+        }
+
+
+# several workers share the upstream limits of one deployment
+workers = max(1, settings.WEB_CONCURRENCY)
+scheduler = LLMScheduler(
+    max_in_flight=settings.LLM_MAX_IN_FLIGHT,
+    tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE // workers,
+    base_delay=settings.LLM_RETRY_BASE_DELAY,
+    max_delay=settings.LLM_RETRY_MAX_DELAY,
+    aging_seconds=settings.LLM_PRIORITY_AGING_SECONDS,
+    background_max_in_flight=max(1, settings.LLM_BACKGROUND_MAX_IN_FLIGHT // workers),
+    breaker=default_breaker,
+    shared_slots=SharedSlots(settings.LLM_SLOTS_DIR, settings.LLM_MAX_IN_FLIGHT) if workers > 1 else None,
+)
+
+hedger = Hedger(
+    "llm_hedge",
+    percentile=settings.LLM_HEDGE_PERCENTILE,
+    min_samples=settings.LLM_HEDGE_MIN_SAMPLES,
+    budget_ratio=settings.LLM_HEDGE_BUDGET_RATIO,
+)
+
+gauge("llm_in_flight", "Upstream LLM calls currently running", lambda: scheduler._in_flight)
+gauge("llm_queued", "Upstream LLM calls waiting for a slot", lambda: len(scheduler._waiters))
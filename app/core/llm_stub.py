@@ -0,0 +1,404 @@
+"""Deterministic stand-in for the upstream LLM.
+
+Used to run and load-test the whole service offline. Two ways in:
+
+- in-process: `LLM_BACKEND=stub` makes both services use `StubBackend`
+- over HTTP: `python -m app.core.llm_stub --port 9075` serves
+  `/v1/chat/completions`; point the real client at it with
+  `LLM_BACKEND=openai OPENAI_BASE_URL=http://localhost:9075/v1`
+
+Completions are derived from the prompt (same prompt -> same itinerary) and
+follow the JSON shapes the prompts ask for. Latency, upstream errors and
+malformed JSON are injected from a separately seeded RNG.
+"""
+import re
+import json
+import math
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import datetime
+from collections import Counter as TallyCounter
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.llm_backend import LLMBackend
+from app.core.metrics import counter
+
+CATEGORIES = [
+    "Cultural & Heritage", "Museums & Art", "Food & Culinary Experiences", "Outdoor & Nature",
+    "Local Experiences", "Historical Sites", "Photography & Scenic Spots", "Leisure & Relaxation",
+]
+SLOTS = [
+    ("9:00 AM", "cultural", "Old Town Walk"),
+    ("12:30 PM", "meal", "Market Lunch"),
+    ("3:00 PM", "museum", "City Museum"),
+    ("7:00 PM", "food_local", "Harbour Dinner"),
+]
+VENUE_WORDS = ["Grand", "Royal", "Riverside", "Hidden", "Central", "Old", "Botanical", "National", "Little", "Sunset"]
+VENUE_KINDS = ["Gallery", "Bistro", "Park", "Museum", "Market", "Cathedral", "Viewpoint", "Cafe", "Theatre", "Gardens"]
+
+
+class StubUpstreamError(Exception):
+    """Injected upstream failure; looks like an API status error to the scheduler."""
+
+    def __init__(self, status_code: int = 503, retry_after: Optional[float] = None):
+        super().__init__(f"stub upstream error {status_code}")
+        self.status_code = status_code
+        self.response = None
+        if retry_after is not None:
+            self.response = type("StubResponse", (), {"headers": {"retry-after": str(retry_after)}, "status_code": status_code})()
+
+
+class StubConfig:
+    def __init__(
+        self,
+        latency_dist: str = "lognormal",
+        latency_mean: float = 1.0,
+        latency_stddev: float = 0.3,
+        latency_per_item: float = 0.0,
+        error_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency_dist = latency_dist
+        self.latency_mean = latency_mean
+        self.latency_stddev = latency_stddev
+        self.latency_per_item = latency_per_item
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.seed = seed
+
+    @classmethod
+    def from_settings(cls) -> "StubConfig":
+        return cls(
+            latency_dist=settings.STUB_LATENCY_DIST,
+            latency_mean=settings.STUB_LATENCY_MEAN,
+            latency_stddev=settings.STUB_LATENCY_STDDEV,
+            latency_per_item=settings.STUB_LATENCY_PER_ITEM,
+            error_rate=settings.STUB_ERROR_RATE,
+            malformed_rate=settings.STUB_MALFORMED_RATE,
+            seed=settings.STUB_SEED,
+        )
+
+    def sample_latency(self, rng: random.Random, items: float = 0) -> float:
+        mean, sd = self.latency_mean, self.latency_stddev
+        if self.latency_dist == "fixed" or mean <= 0:
+            base = mean
+        elif self.latency_dist == "uniform":
+            spread = sd * math.sqrt(3)
+            base = rng.uniform(mean - spread, mean + spread)
+        elif self.latency_dist == "normal":
+            base = rng.gauss(mean, sd)
+        elif self.latency_dist == "exponential":
+            base = rng.expovariate(1 / mean)
+        elif self.latency_dist == "lognormal":
+            sigma2 = math.log(1 + (sd / mean) ** 2)
+            base = rng.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+        else:
+            raise ValueError(f"Unknown latency distribution {self.latency_dist!r}")
+        return max(0.0, base) + self.latency_per_item * items
+
+
+# prompt -> completion
+def _prompt_text(messages: List[Dict[str, str]]) -> str:
+    return "\n".join(str(m.get("content", "")) for m in messages)
+
+
+def _search(pattern: str, text: str, default: str = "") -> str:
+    match = re.search(pattern, text)
+    return match.group(1).strip() if match else default
+
+
+def _venue(rng: random.Random, destination: str) -> str:
+    return f"{rng.choice(VENUE_WORDS)} {destination.split(',')[0]} {rng.choice(VENUE_KINDS)}"
+
+
+def _detailed_day(rng: random.Random, destination: str, day_number: int, date: str, itinerary_id: str, places: List[str]) -> dict:
+    activities = []
+    for i, (time_, keyword, label) in enumerate(SLOTS[: rng.randint(2, 4)]):
+        place = places[i] if i < len(places) else _venue(rng, destination)
+        activities.append({
+            "time": time_,
+            "title": f"{label}: {place}",
+            "description": f"Spend time at {place}, a favourite with visitors to {destination}.",
+            "place": place,
+            "keyword": keyword,
+        })
+    return {"day_number": day_number, "day_uuid": f"day-{day_number}-{itinerary_id}", "date": date, "activities": activities}
+
+
+def _dates(start: str, count: int) -> List[str]:
+    try:
+        first = datetime.date.fromisoformat(start)
+    except ValueError:
+        first = datetime.date(2025, 1, 1)
+    return [(first + datetime.timedelta(days=i)).isoformat() for i in range(count)]
+
+
+def render_completion(messages: List[Dict[str, str]], rng: random.Random) -> Tuple[str, dict]:
+    """Return (kind, payload) for the prompt in `messages`."""
+    text = _prompt_text(messages)
+    itinerary_id = _search(r"Itinerary ID:\s*(itinerary-[0-9a-f-]+)", text, "itinerary-stub")
+
+    if "alternative_options" in text:
+        destination = _search(r"DESTINATION:\s*(.+)", text, "the city")
+        query = _search(r"USER SEARCH QUERY:\s*(.+)", text, "activity")
+        options = []
+        for i in range(4):
+            place = _venue(rng, destination)
+            options.append({
+                "option": i + 1,
+                "time": SLOTS[i][0],
+                "title": f"{query.title()} at {place}",
+                "description": f"A {query} option at {place} in {destination}.",
+                "place": place,
+                "keyword": SLOTS[i][1],
+            })
+        return "regenerate", {"success": True, "data": {"alternative_options": options}, "message": "Alternative activities generated successfully"}
+
+    if "ASSIGNED DAYS" in text:
+        destination = _search(r"Destination:\s*(.+)", text, "the city")
+        assigned = re.findall(r"Day (\d+) \((\d{4}-\d{2}-\d{2})\): ?(.*)", text)
+        days = [
+            _detailed_day(rng, destination, int(n), date, itinerary_id, [p.strip() for p in places.split(",") if p.strip()])
+            for n, date, places in assigned
+        ]
+        return "detail", {"days": days}
+
+    if "itinerary outline" in text:
+        trip_days = int(_search(r"Trip Duration:\s*(\d+)", text, "5"))
+        destination = _search(r"Destination:\s*(.+)", text, "the city")
+        start = _search(r"Departure Date:\s*(\d{4}-\d{2}-\d{2})", text)
+        days = [
+            {"day_number": i + 1, "date": date, "places": [_venue(rng, destination) for _ in range(rng.randint(2, 4))]}
+            for i, date in enumerate(_dates(start, trip_days))
+        ]
+        return "outline", {"title": f"{destination.split(',')[0]} Discovery", "category": rng.choice(CATEGORIES), "days": days}
+
+    trip_days = int(_search(r"Trip Duration:\s*(\d+)", text, "1"))
+    destination = _search(r"Destination:\s*(.+)", text, "the city")
+    start = _search(r"Departure Date:\s*(\d{4}-\d{2}-\d{2})", text)
+    days = [
+        _detailed_day(rng, destination, i + 1, date, itinerary_id, [])
+        for i, date in enumerate(_dates(start, trip_days))
+    ]
+    return "short", {
+        "success": True,
+        "data": {"title": f"{destination.split(',')[0]} Escape", "category": rng.choice(CATEGORIES), "days": days, "status": "COMPLETED"},
+        "message": "Itinerary generated successfully",
+    }
+
+
+# outline days are a few words each; a detailed day is a few hundred tokens
+OUTLINE_ITEM_WEIGHT = 0.2
+
+
+def _item_count(kind: str, payload: dict) -> int:
+    if kind == "regenerate":
+        return len(payload["data"]["alternative_options"])
+    if kind == "short":
+        return len(payload["data"]["days"])
+    return len(payload.get("days", []))
+
+
+class StubBackend(LLMBackend):
+    """In-process stub; see the module docstring."""
+
+    name = "stub"
+
+    def __init__(self, config: Optional[StubConfig] = None):
+        self.config = config or StubConfig()
+        self._rng = random.Random(self.config.seed)
+        self.calls: TallyCounter = TallyCounter()
+        self.upstream_calls = counter("stub_llm_calls_total", "Completions requested from the stub backend")
+
+    def _content_rng(self, model: str, messages: List[Dict[str, str]]) -> random.Random:
+        digest = hashlib.sha256((model + _prompt_text(messages)).encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big") ^ self.config.seed)
+
+    def _prepare(self, model: str, messages: List[Dict[str, str]]) -> Tuple[str, str, int, float]:
+        kind, payload = render_completion(messages, self._content_rng(model, messages))
+        self.calls[kind] += 1
+        self.upstream_calls.inc()
+
+        content = json.dumps(payload)
+        if self._rng.random() < self.config.malformed_rate:
+            # cut the document off mid-way, like a truncated completion
+            content = content[: max(1, len(content) // 2)]
+        item_latency = self.config.latency_per_item * (OUTLINE_ITEM_WEIGHT if kind == "outline" else 1)
+        return kind, content, _item_count(kind, payload), item_latency
+
+    async def generate(self, model: str, messages: List[Dict[str, str]]) -> Tuple[str, str]:
+        """Return (kind, content) after the injected latency; may raise StubUpstreamError."""
+        kind, content, items, item_latency = self._prepare(model, messages)
+        await asyncio.sleep(self.config.sample_latency(self._rng) + item_latency * items)
+        if self._rng.random() < self.config.error_rate:
+            raise StubUpstreamError(503)
+        return kind, content
+
+    async def generate_stream(self, model: str, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Like `generate`, but the per-item latency is spread across the output.
+
+        After the base (time-to-first-token) latency the content is released
+        in one slice per generated item (day/option), each taking the
+        per-item latency.
+        """
+        _, content, items, per_item = self._prepare(model, messages)
+        await asyncio.sleep(self.config.sample_latency(self._rng))
+        if self._rng.random() < self.config.error_rate:
+            raise StubUpstreamError(503)
+
+        pieces = max(1, items)
+        size = -(-len(content) // pieces)
+        for n in range(pieces):
+            if per_item:
+                await asyncio.sleep(per_item)
+            yield content[n * size : (n + 1) * size]
+
+    async def complete(self, model: str, messages: List[Dict[str, str]], **kwargs: Any) -> str:
+        _, content = await self.generate(model, messages)
+        self.record_usage(messages, content)
+        return content
+
+    async def stream(self, model: str, messages: List[Dict[str, str]], **kwargs: Any) -> AsyncIterator[str]:
+        received: List[str] = []
+        async for piece in self.generate_stream(model, messages):
+            received.append(piece)
+            yield piece
+        self.record_usage(messages, "".join(received))
+
+
+# chat-completions wire format over HTTP
+def create_stub_app(config: Optional[StubConfig] = None):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    stub = StubBackend(config)
+    stub_app = FastAPI(title="Vacay Breeze stub LLM")
+    stub_app.state.backend = stub
+    seen_prefixes: set = set()
+    # completions being served right now, and the most at once: shows
+    # whether callers (e.g. several app workers) kept to their limit
+    load = {"in_flight": 0, "peak_in_flight": 0}
+
+    def enter() -> None:
+        load["in_flight"] += 1
+        load["peak_in_flight"] = max(load["peak_in_flight"], load["in_flight"])
+
+    def leave() -> None:
+        load["in_flight"] -= 1
+
+    @stub_app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "stub")
+        messages = body.get("messages", [])
+        if body.get("stream"):
+            return await _stream_completion(model, messages)
+        enter()
+        try:
+            _, content = await stub.generate(model, messages)
+        except StubUpstreamError as e:
+            return JSONResponse(
+                status_code=e.status_code,
+                content={"error": {"message": str(e), "type": "server_error", "code": None}},
+            )
+        finally:
+            leave()
+
+        prompt_tokens = len(_prompt_text(messages)) // 4
+        completion_tokens = len(content) // 4
+        # mimic provider prefix caching: a system prompt seen before is "cached"
+        system = "".join(str(m.get("content", "")) for m in messages if m.get("role") == "system")
+        cached_tokens = len(system) // 4 if system in seen_prefixes else 0
+        seen_prefixes.add(system)
+        return {
+            "id": f"chatcmpl-stub-{int(time.time() * 1000)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens},
+            },
+        }
+
+    async def _stream_completion(model: str, messages: List[Dict[str, str]]):
+        pieces = stub.generate_stream(model, messages)
+        enter()
+        try:
+            # pull the first piece so injected errors become a status code
+            first = await pieces.__anext__()
+        except StubUpstreamError as e:
+            leave()
+            return JSONResponse(
+                status_code=e.status_code,
+                content={"error": {"message": str(e), "type": "server_error", "code": None}},
+            )
+        completion_id = f"chatcmpl-stub-{int(time.time() * 1000)}"
+
+        def chunk(content: Optional[str], finish_reason: Optional[str] = None) -> str:
+            delta = {"content": content} if content is not None else {}
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def body():
+            try:
+                yield chunk(first)
+                async for piece in pieces:
+                    yield chunk(piece)
+                yield chunk(None, "stop")
+                yield "data: [DONE]\n\n"
+            finally:
+                leave()
+
+        return StreamingResponse(body(), media_type="text/event-stream")
+
+    @stub_app.get("/stats")
+    async def stub_stats():
+        return {"calls": dict(stub.calls), **load}
+
+    return stub_app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the stub LLM over the chat-completions wire format")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9075)
+    parser.add_argument("--latency-dist", default=settings.STUB_LATENCY_DIST)
+    parser.add_argument("--latency-mean", type=float, default=settings.STUB_LATENCY_MEAN)
+    parser.add_argument("--latency-stddev", type=float, default=settings.STUB_LATENCY_STDDEV)
+    parser.add_argument("--latency-per-item", type=float, default=settings.STUB_LATENCY_PER_ITEM)
+    parser.add_argument("--error-rate", type=float, default=settings.STUB_ERROR_RATE)
+    parser.add_argument("--malformed-rate", type=float, default=settings.STUB_MALFORMED_RATE)
+    parser.add_argument("--seed", type=int, default=settings.STUB_SEED)
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency_dist=args.latency_dist,
+        latency_mean=args.latency_mean,
+        latency_stddev=args.latency_stddev,
+        latency_per_item=args.latency_per_item,
+        error_rate=args.error_rate,
+        malformed_rate=args.malformed_rate,
+        seed=args.seed,
+    )
+    uvicorn.run(create_stub_app(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import json
+from typing import Any
+
+from app.core.json_codec import loads
+from app.core.metrics import counter
+
+repairs = counter("json_repair_total", "parse_json outcomes: valid as-is, extracted from fences/prose, or unrepaired")
+
+_decoder = json.JSONDecoder()
+
+
+def parse_json(raw: str) -> Any:
+    """Parse an LLM completion, skipping markdown fences / surrounding prose.
+
+    Valid JSON is parsed once. Otherwise parsing starts at the first `{`:
+    the span up to the last `}` is tried first, then (if prose after the
+    object has braces of its own) the object that opens there, ignoring
+    whatever follows it. A fenced completion therefore costs one full parse
+    rather than a validity check, an extraction and the caller's own parse.
+
+    Raises json.JSONDecodeError (a ValueError) if no object can be found.
+    """
+    try:
+        value = loads(raw)
+        repairs.inc(outcome="valid")
+        return value
+    except ValueError:
+        pass
+
+    start = raw.find("{")
+    end = raw.rfind("}")
+    if start != -1 and end > start:
+        try:
+            value = loads(raw[start : end + 1])
+            repairs.inc(outcome="extracted")
+            return value
+        except ValueError:
+            pass
+        try:
+            value, _ = _decoder.raw_decode(raw, start)
+            repairs.inc(outcome="extracted")
+            return value
+        except ValueError:
+            pass
+    repairs.inc(outcome="unrepaired")
+    # raises with the position of the first bad character (the stdlib parser
+    # also takes the NaN/Infinity literals orjson rejects)
+    return json.loads(raw)
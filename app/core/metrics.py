@@ -0,0 +1,161 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# seconds; covers cache hits (ms) up to long itineraries (minutes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Monotonic counter, safe to bump from worker threads.
+
+    Optional labels split the count into series; `value` is the total.
+    """
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    @property
+    def value(self) -> float:
+        with self._lock:
+            return sum(self._values.values())
+
+    def expose(self) -> List[str]:
+        with self._lock:
+            series = sorted(self._values.items()) or [((), 0)]
+        return [f"{self.name}{_format_labels(key)} {value}" for key, value in series]
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense, per label set."""
+
+    def __init__(self, name: str, description: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, List[float]] = {}  # bucket counts..., +Inf count, sum
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def expose(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        lines = []
+        for key, values in series:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                le = _format_labels(key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += values[len(self.buckets)]
+            le = _format_labels(key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {values[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Point-in-time value read from `func` at scrape time."""
+
+    def __init__(self, name: str, description: str, func: Callable[[], float]):
+        self.name = name
+        self.description = description
+        self.func = func
+
+    @property
+    def value(self) -> float:
+        return self.func()
+
+    def expose(self) -> List[str]:
+        return [f"{self.name} {self.value}"]
+
+
+_counters: Dict[str, Counter] = {}
+_histograms: Dict[str, Histogram] = {}
+_gauges: Dict[str, Gauge] = {}
+_registry_lock = threading.Lock()
+
+
+def counter(name: str, description: str = "") -> Counter:
+    """Return the process-wide counter called `name`, creating it on first use."""
+    with _registry_lock:
+        if name not in _counters:
+            _counters[name] = Counter(name, description)
+        return _counters[name]
+
+
+def histogram(name: str, description: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    """Return the process-wide histogram called `name`, creating it on first use."""
+    with _registry_lock:
+        if name not in _histograms:
+            _histograms[name] = Histogram(name, description, buckets)
+        return _histograms[name]
+
+
+def gauge(name: str, description: str, func: Callable[[], float]) -> Gauge:
+    """Register (or replace) the gauge called `name`, read from `func`."""
+    with _registry_lock:
+        _gauges[name] = Gauge(name, description, func)
+        return _gauges[name]
+
+
+def snapshot() -> Dict[str, float]:
+    with _registry_lock:
+        return {name: c.value for name, c in _counters.items()}
+
+
+def render_prometheus() -> str:
+    """Every registered metric in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = [
+            *(("counter", m) for m in _counters.values()),
+            *(("histogram", m) for m in _histograms.values()),
+            *(("gauge", m) for m in _gauges.values()),
+        ]
+    lines: List[str] = []
+    for kind, metric in sorted(metrics, key=lambda item: item[1].name):
+        if metric.description:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+        lines.append(f"# TYPE {metric.name} {kind}")
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
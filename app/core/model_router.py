@@ -0,0 +1,209 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from app.core.admission import Overloaded
+from app.core.config import settings
+from app.core.deadline import DeadlineExceeded, deadline_low
+from app.core.llm_scheduler import error_status
+from app.core.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Route:
+    """Models for one stage: the primary, an optional faster fallback, and the latency budget."""
+
+    def __init__(self, primary: str, fallback: Optional[str] = None, latency_budget: float = 0):
+        self.primary = primary
+        self.fallback = fallback or None
+        self.latency_budget = latency_budget
+
+
+class ModelStats:
+    """Rolling latency and outcome of one model's upstream attempts over `window_seconds`."""
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self._samples: Deque[Tuple[float, float, bool]] = deque()  # (at, seconds, ok)
+
+    def add(self, seconds: float, ok: bool) -> None:
+        now = time.monotonic()
+        self._samples.append((now, seconds, ok))
+        self._expire(now)
+
+    def _expire(self, now: float) -> None:
+        while self._samples and self._samples[0][0] < now - self.window_seconds:
+            self._samples.popleft()
+
+    def __len__(self) -> int:
+        self._expire(time.monotonic())
+        return len(self._samples)
+
+    def error_rate(self) -> float:
+        if not len(self):
+            return 0.0
+        return sum(1 for _, _, ok in self._samples if not ok) / len(self._samples)
+
+    def latency(self, percentile: float) -> Optional[float]:
+        """Latency percentile of the successful attempts in the window."""
+        self._expire(time.monotonic())
+        ordered = sorted(seconds for _, seconds, ok in self._samples if ok)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+
+class ModelRouter:
+    """Pick the model for each generation stage.
+
+    - each stage (short_trip, outline, detail, regenerate) has a primary
+      model, an optional fallback and a latency budget
+    - every attempt's latency and outcome is kept per model for
+      `window_seconds`; once a model has `min_samples`, it counts as
+      degraded while its error rate is at least `error_threshold` or its
+      `percentile` latency is over the stage's budget
+    - a degraded primary is skipped for its fallback; because samples
+      expire, the primary gets traffic back one window later
+    - a call that still fails on the primary (after the scheduler's
+      retries) gets one more go on the fallback, unless the failure was
+      Overloaded (admission / open circuit) or DeadlineExceeded
+    - once the request deadline is low, stages with a fallback use it
+    """
+
+    def __init__(
+        self,
+        routes: Dict[str, Route],
+        window_seconds: float = 60,
+        min_samples: int = 10,
+        error_threshold: float = 0.3,
+        percentile: float = 90.0,
+    ):
+        self.routes = routes
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.error_threshold = error_threshold
+        self.percentile = percentile
+        self._stats: Dict[str, ModelStats] = {}
+
+        self.model_calls = counter("llm_model_calls_total", "Upstream attempts by model and outcome")
+        self.fallbacks = counter("llm_model_fallbacks_total", "Calls sent to a stage's fallback model, by reason")
+
+    def stats_for(self, model: str) -> ModelStats:
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = ModelStats(self.window_seconds)
+        return stats
+
+    def health(self, model: str, latency_budget: float = 0) -> Optional[str]:
+        """Why `model` counts as degraded ("errors" or "slow"); None if healthy or unknown."""
+        stats = self.stats_for(model)
+        if len(stats) < self.min_samples:
+            return None
+        if stats.error_rate() >= self.error_threshold:
+            return "errors"
+        latency = stats.latency(self.percentile)
+        if latency_budget > 0 and latency is not None and latency > latency_budget:
+            return "slow"
+        return None
+
+    def _pick(self, route: Route) -> Tuple[str, Optional[str]]:
+        """(model, why the primary was skipped or None)."""
+        if route.fallback is None:
+            return route.primary, None
+        if deadline_low():
+            return route.fallback, "deadline"
+        reason = self.health(route.primary, route.latency_budget)
+        # both failing: stay on the primary rather than flap
+        if reason is None or self.health(route.fallback, route.latency_budget) == "errors":
+            return route.primary, None
+        return route.fallback, reason
+
+    def choose(self, stage: str) -> str:
+        model, reason = self._pick(self.routes[stage])
+        if reason is not None:
+            self.fallbacks.inc(stage=stage, reason=reason)
+        return model
+
+    async def observe(self, model: str, call: Awaitable[T]) -> T:
+        """Await one upstream attempt on `model`, recording its latency and outcome."""
+        started = time.monotonic()
+        try:
+            result = await call
+        except asyncio.CancelledError:
+            raise  # hedge losers and disconnects say nothing about the model
+        except Exception as e:
+            status = error_status(e)
+            # 4xx other than 429 are our request's fault, not the model's
+            ok = status is not None and status < 500 and status != 429
+            self.stats_for(model).add(time.monotonic() - started, ok)
+            self.model_calls.inc(model=model, outcome="ok" if ok else "error")
+            raise
+        self.stats_for(model).add(time.monotonic() - started, True)
+        self.model_calls.inc(model=model, outcome="ok")
+        return result
+
+    async def run(
+        self,
+        stage: str,
+        call: Callable[[str], Awaitable[T]],
+        execute: Callable[[Callable[[], Awaitable[T]]], Awaitable[T]],
+    ) -> T:
+        """Run `call(model)` for the model `stage` routes to.
+
+        `execute` runs an attempt factory to completion (the scheduler with
+        its retries); each attempt is observed against its model.
+        """
+        model = self.choose(stage)
+        try:
+            return await execute(lambda: self.observe(model, call(model)))
+        except (Overloaded, DeadlineExceeded):
+            raise
+        except Exception as e:
+            route = self.routes[stage]
+            if route.fallback is None or model == route.fallback:
+                raise
+            logger.warning("Stage %s failed on %s (%s); falling back to %s", stage, model, e, route.fallback)
+            self.fallbacks.inc(stage=stage, reason="failed")
+            return await execute(lambda: self.observe(route.fallback, call(route.fallback)))
+
+    def stats(self) -> Dict[str, Any]:
+        models = {}
+        for model, stats in self._stats.items():
+            latency = stats.latency(self.percentile)
+            models[model] = {
+                "samples": len(stats),
+                "error_rate": round(stats.error_rate(), 4),
+                f"p{self.percentile:g}_seconds": round(latency, 3) if latency is not None else None,
+            }
+        return {
+            "routes": {
+                stage: {
+                    "primary": route.primary,
+                    "fallback": route.fallback,
+                    "latency_budget": route.latency_budget,
+                    "current": self._pick(route)[0],
+                }
+                for stage, route in self.routes.items()
+            },
+            "models": models,
+            "fallbacks": self.fallbacks.value,
+        }
+
+
+model_router = ModelRouter(
+    routes={
+        "short_trip": Route(settings.MODEL_SHORT_TRIP, settings.MODEL_SHORT_TRIP_FALLBACK, settings.MODEL_SHORT_TRIP_LATENCY_BUDGET),
+        "outline": Route(settings.MODEL_OUTLINE, settings.MODEL_OUTLINE_FALLBACK, settings.MODEL_OUTLINE_LATENCY_BUDGET),
+        "detail": Route(settings.MODEL_DETAIL, settings.MODEL_DETAIL_FALLBACK, settings.MODEL_DETAIL_LATENCY_BUDGET),
+        "regenerate": Route(settings.MODEL_REGENERATE, settings.MODEL_REGENERATE_FALLBACK, settings.MODEL_REGENERATE_LATENCY_BUDGET),
+    },
+    window_seconds=settings.MODEL_ROUTER_WINDOW_SECONDS,
+    min_samples=settings.MODEL_ROUTER_MIN_SAMPLES,
+    error_threshold=settings.MODEL_ROUTER_ERROR_THRESHOLD,
+    percentile=settings.MODEL_ROUTER_PERCENTILE,
+)
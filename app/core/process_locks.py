@@ -0,0 +1,123 @@
+import os
+import random
+import asyncio
+import logging
+from typing import List, Optional, Set
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; locks below are then process-local only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class FileLock:
+    """Non-blocking exclusive `flock` on a file, shared by every process on the host.
+
+    The kernel drops the lock when the holder exits, however it exits, so
+    a crashed worker never leaves a lock behind.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+        self.held = False
+
+    def _open(self) -> int:
+        if self._fd is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        return self._fd
+
+    def try_acquire(self) -> bool:
+        if self.held:
+            return False
+        fd = self._open()
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+        self.held = True
+        return True
+
+    def release(self) -> None:
+        if self.held:
+            self.held = False
+            if fcntl is not None and self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self) -> None:
+        self.release()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def is_locked(path: str) -> bool:
+    """True if another process holds `path` locked right now."""
+    if not os.path.exists(path):
+        return False
+    lock = FileLock(path)
+    try:
+        if lock.try_acquire():
+            return False
+        return True
+    finally:
+        lock.close()
+
+
+class SharedSlots:
+    """Cross-process semaphore: `slots` lock files in `directory`.
+
+    Each holder locks one free slot file; when all are taken `acquire`
+    polls (with jitter, up to `max_poll` seconds apart) until one frees.
+    Used to cap upstream calls across all workers of one host.
+    """
+
+    def __init__(self, directory: str, slots: int, poll: float = 0.005, max_poll: float = 0.1):
+        self.directory = directory
+        self.slots = slots
+        self.poll = poll
+        self.max_poll = max_poll
+        self._locks: List[FileLock] = [FileLock(os.path.join(directory, f"slot-{n}.lock")) for n in range(slots)]
+        self._held: Set[int] = set()
+        # start the scan at a different slot in each process
+        self._start = os.getpid() % max(1, slots)
+        if fcntl is None:
+            logger.warning("fcntl unavailable: upstream slots are not shared between processes")
+
+    def try_acquire(self) -> Optional[int]:
+        for n in range(self.slots):
+            slot = (self._start + n) % self.slots
+            if slot not in self._held and self._locks[slot].try_acquire():
+                self._held.add(slot)
+                return slot
+        return None
+
+    async def acquire(self) -> int:
+        delay = self.poll
+        while True:
+            slot = self.try_acquire()
+            if slot is not None:
+                return slot
+            await asyncio.sleep(random.uniform(delay / 2, delay))
+            delay = min(self.max_poll, delay * 2)
+
+    def release(self, slot: int) -> None:
+        if slot in self._held:
+            self._held.discard(slot)
+            self._locks[slot].release()
+
+    @property
+    def held(self) -> int:
+        """Slots held by this process."""
+        return len(self._held)
+
+    def close(self) -> None:
+        for lock in self._locks:
+            lock.close()
+        self._held.clear()
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from app.core.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self, task: "asyncio.Task[Any]"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key onto one in-flight task.
+
+    The first caller for a key starts `func()` as a task; later callers with
+    the same key await that task instead of starting their own. Every waiter
+    gets the same result or the same exception. A waiter that is cancelled
+    just stops waiting, unless it was the last one, in which case the shared
+    task is cancelled too since nobody wants its result any more.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, _Call] = {}
+        self.leaders = counter(f"{name}_leaders_total", "Calls that started a new generation")
+        self.coalesced = counter(f"{name}_coalesced_total", "Calls that joined an in-flight generation")
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(func()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.leaders.inc()
+        else:
+            logger.info("%s: joining in-flight call %s", self.name, key[:12])
+            self.coalesced.inc()
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                logger.info("%s: last waiter left, cancelling %s", self.name, key[:12])
+                call.task.cancel()
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def __len__(self) -> int:
+        return len(self._calls)
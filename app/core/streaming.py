@@ -0,0 +1,67 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, List
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.core import json_codec
+from app.core.admission import Overloaded
+from app.core.deadline import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+
+async def drain_queue(queue: "asyncio.Queue[dict]", tasks: List["asyncio.Future[Any]"]) -> AsyncIterator[dict]:
+    """Yield queued events until every task is done; re-raise task failures."""
+    pending = set(tasks)
+    while pending or not queue.empty():
+        if not queue.empty():
+            yield queue.get_nowait()
+            continue
+        getter = asyncio.ensure_future(queue.get())
+        try:
+            done, _ = await asyncio.wait(pending | {getter}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if not getter.done():
+                getter.cancel()
+        if getter in done:
+            yield getter.result()
+        for task in done - {getter}:
+            pending.discard(task)
+            task.result()
+
+
+def encode_event(event: dict, sse: bool) -> str:
+    data = json_codec.dumps(event)
+    if sse:
+        return f"event: {event['event']}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+def event_stream_response(events: AsyncIterator[dict], accept: str) -> StreamingResponse:
+    """Stream `events` as NDJSON, or SSE when the client accepts text/event-stream.
+
+    Failures after the response has started are sent as a final `error` event.
+    """
+    sse = "text/event-stream" in accept
+
+    async def body() -> AsyncIterator[str]:
+        try:
+            async for event in events:
+                yield encode_event(event, sse)
+        except HTTPException as e:
+            yield encode_event({"event": "error", "status_code": e.status_code, "detail": e.detail}, sse)
+        except Overloaded as e:
+            yield encode_event({"event": "error", "status_code": 503, "detail": str(e), "retry_after": e.retry_after}, sse)
+        except DeadlineExceeded as e:
+            yield encode_event({"event": "error", "status_code": 504, "detail": str(e)}, sse)
+        except Exception as e:
+            logger.exception("Event stream failed")
+            yield encode_event({"event": "error", "status_code": 500, "detail": str(e)}, sse)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
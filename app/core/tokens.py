@@ -0,0 +1,89 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from app.core.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+token_usage = counter(
+    "llm_tokens_total",
+    "Upstream tokens by stage and type; `source` says if the provider reported them or they were estimated. "
+    "cached_prompt is the part of prompt served from the provider's prefix cache",
+)
+
+stage_var: ContextVar[str] = ContextVar("llm_stage", default="other")
+ledger_var: ContextVar[Optional["TokenLedger"]] = ContextVar("token_ledger", default=None)
+
+
+class TokenLedger:
+    """Tokens spent on behalf of one request (or job), split by stage.
+
+    Work the request started that outlives it (e.g. background prefetch)
+    still shares the ledger; once `closed` it stops counting there and is
+    only reflected in `llm_tokens_total`.
+    """
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, Dict[str, int]] = {}
+        self.closed = False
+
+    def add(self, stage: str, prompt: int, completion: int, cached_prompt: int = 0) -> None:
+        if self.closed:
+            return
+        totals = self.stages.setdefault(stage, {"calls": 0, "prompt": 0, "completion": 0, "cached_prompt": 0})
+        totals["calls"] += 1
+        totals["prompt"] += prompt
+        totals["completion"] += completion
+        totals["cached_prompt"] += cached_prompt
+
+    def totals(self) -> Dict[str, int]:
+        totals = {"calls": 0, "prompt": 0, "completion": 0, "cached_prompt": 0}
+        for stage in self.stages.values():
+            for k, v in stage.items():
+                totals[k] += v
+        return totals
+
+    def summary(self) -> str:
+        """One-line `key=value` form, also used for the X-Token-Usage header."""
+        totals = self.totals()
+        stages = ",".join(f"{name}:{t['prompt']}+{t['completion']}" for name, t in sorted(self.stages.items()))
+        return (
+            f"calls={totals['calls']} prompt={totals['prompt']} completion={totals['completion']} "
+            f"cached_prompt={totals['cached_prompt']} stages={stages}"
+        )
+
+
+def record(prompt: int, completion: int, cached_prompt: int = 0, source: str = "estimated") -> None:
+    """Count one upstream call's tokens under the current stage and ledger."""
+    stage = stage_var.get()
+    token_usage.inc(prompt, type="prompt", stage=stage, source=source)
+    token_usage.inc(completion, type="completion", stage=stage, source=source)
+    if cached_prompt:
+        token_usage.inc(cached_prompt, type="cached_prompt", stage=stage, source=source)
+    ledger = ledger_var.get()
+    if ledger is not None:
+        ledger.add(stage, prompt, completion, cached_prompt)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Attribute upstream calls made inside the block (and tasks it starts) to `name`."""
+    token = stage_var.set(name)
+    try:
+        yield
+    finally:
+        stage_var.reset(token)
+
+
+@contextmanager
+def open_ledger() -> Iterator[TokenLedger]:
+    """Start a ledger for the current request; it is closed when the block exits."""
+    ledger = TokenLedger()
+    token = ledger_var.set(ledger)
+    try:
+        yield ledger
+    finally:
+        ledger.closed = True
+        ledger_var.reset(token)
@@ -0,0 +1,104 @@
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from app.core.metrics import histogram
+from app.core.tokens import open_ledger
+
+logger = logging.getLogger(__name__)
+
+trace_id_var: ContextVar[str] = ContextVar("trace_id", default="-")
+
+stage_seconds = histogram("stage_duration_seconds", "Time spent in each generation stage")
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(trace_id)s] %(name)s: %(message)s"
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id() -> str:
+    return trace_id_var.get()
+
+
+class TraceIdFilter(logging.Filter):
+    """Stamp every record with the trace id of the request that logged it."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = trace_id_var.get()
+        return True
+
+
+def configure_logging(level: int = logging.INFO) -> None:
+    logging.basicConfig(level=level, format=LOG_FORMAT, force=True)
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(TraceIdFilter())
+
+
+@contextmanager
+def span(stage: str, **attrs: Any) -> Iterator[None]:
+    """Time one stage of a request into `stage_duration_seconds{stage=...}`.
+
+    A structured `span` line with the duration, outcome and `attrs` is
+    logged at DEBUG; failures are logged at INFO so they show by default.
+    """
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.observe(elapsed, stage=stage)
+        extra = "".join(f" {k}={v}" for k, v in attrs.items())
+        logger.log(
+            logging.DEBUG if outcome == "ok" else logging.INFO,
+            "span stage=%s duration_ms=%.1f outcome=%s%s", stage, elapsed * 1000, outcome, extra,
+        )
+
+
+class TraceMiddleware:
+    """ASGI middleware giving each HTTP request a trace id and a token ledger.
+
+    Uses the caller's `X-Trace-Id` (or `X-Request-Id`) header when present
+    and echoes the id back on the response. Requests that called the LLM
+    log their token use when they finish; if the calls were done before the
+    response started (non-streaming routes) it is also sent back as
+    `X-Token-Usage`.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        incoming: Optional[bytes] = headers.get(b"x-trace-id") or headers.get(b"x-request-id")
+        trace_id = incoming.decode("latin-1")[:64] if incoming else new_trace_id()
+        token = trace_id_var.set(trace_id)
+
+        with open_ledger() as ledger:
+
+            async def send_with_trace(message: dict) -> None:
+                if message["type"] == "http.response.start":
+                    extra = [(b"x-trace-id", trace_id.encode("latin-1"))]
+                    if ledger.stages:
+                        extra.append((b"x-token-usage", ledger.summary().encode("latin-1")))
+                    message["headers"] = list(message.get("headers") or []) + extra
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace)
+            finally:
+                if ledger.stages:
+                    logger.info("tokens %s %s", scope.get("path", ""), ledger.summary())
+                trace_id_var.reset(token)
@@ -0,0 +1,207 @@
+import time
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+OPENAI_URL = "https://api.openai.com/v1"
+
+
+class _DrainOnClose(httpx.AsyncByteStream):
+    """Response body that reads what is left before closing.
+
+    The SDK closes a stream as soon as it sees `data: [DONE]`, before the
+    final chunk of the body arrives; closing an HTTP/1.1 response early
+    drops its connection. Draining a short tail (at most `max_bytes`
+    within `max_seconds`) keeps it for reuse. Cancelled callers skip the
+    drain, and anything longer is closed as before.
+    """
+
+    def __init__(self, stream: httpx.AsyncByteStream, max_bytes: int = 64 * 1024, max_seconds: float = 0.5):
+        self._stream = stream
+        self._iterator: Optional[AsyncIterator[bytes]] = None
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+
+    async def _read(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        self._iterator = self._read()
+        return self._iterator
+
+    async def aclose(self) -> None:
+        task = asyncio.current_task()
+        if self._iterator is not None and not (task is not None and task.cancelling()):
+            drained = 0
+            try:
+                async with asyncio.timeout(self.max_seconds):
+                    async for chunk in self._iterator:
+                        drained += len(chunk)
+                        if drained > self.max_bytes:
+                            break
+            except (TimeoutError, httpx.HTTPError, OSError):
+                pass
+            await self._iterator.aclose()
+        await self._stream.aclose()
+
+
+class _DrainingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self._transport.handle_async_request(request)
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_DrainOnClose(response.stream),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class UpstreamPool:
+    """The one HTTP client every upstream LLM call goes through.
+
+    - opened by `start` in the app lifespan and closed by `close`; code
+      running outside the app (scripts, benchmarks) gets one on first use
+    - keep-alive pool sized for the scheduler's in-flight calls, so
+      back-to-back calls reuse connections instead of paying TCP/TLS setup;
+      streams the SDK closes early are drained so theirs are reused too
+    - optional HTTP/2 (needs the `h2` package; falls back to HTTP/1.1)
+    - `start` opens `warmup_connections` connections to the upstream
+      before the first request needs them; failures there only log
+    - new connections and requests are counted, so reuse shows in /metrics
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        api_key: str = "",
+        max_connections: int = 64,
+        max_keepalive: int = 32,
+        keepalive_expiry: float = 60.0,
+        connect_timeout: float = 5.0,
+        timeout: float = 600.0,
+        http2: bool = False,
+        warmup_connections: int = 0,
+        warmup_timeout: float = 5.0,
+    ):
+        self.base_url = (base_url or OPENAI_URL).rstrip("/")
+        self.api_key = api_key
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http2 = http2
+        self.warmup_connections = warmup_connections
+        self.warmup_timeout = warmup_timeout
+        self.client: Optional[httpx.AsyncClient] = None
+
+        self.connections = counter("upstream_connections_opened_total", "New TCP connections to the upstream")
+        self.requests = counter("upstream_http_requests_total", "HTTP requests sent to the upstream")
+
+    async def _trace(self, event: str, info: Dict[str, Any]) -> None:
+        if event == "connection.connect_tcp.complete":
+            self.connections.inc()
+
+    async def _on_request(self, request: httpx.Request) -> None:
+        self.requests.inc()
+        request.extensions["trace"] = self._trace
+
+    def _build(self) -> httpx.AsyncClient:
+        if self.http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("UPSTREAM_HTTP2 needs the h2 package (pip install 'httpx[http2]'); using HTTP/1.1")
+                self.http2 = False
+        transport = httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+        return httpx.AsyncClient(
+            transport=_DrainingTransport(transport),
+            timeout=self.timeout,
+            event_hooks={"request": [self._on_request]},
+        )
+
+    def get(self) -> httpx.AsyncClient:
+        if self.client is None:
+            self.client = self._build()
+        return self.client
+
+    async def start(self) -> None:
+        self.get()
+        if self.warmup_connections > 0:
+            await self.warm_up()
+
+    async def warm_up(self) -> None:
+        """Open connections now so the first requests find them in the pool."""
+        client = self.get()
+        started = time.perf_counter()
+        before = self.connections.value
+        # one request per connection; with HTTP/2 one connection carries them all
+        count = 1 if self.http2 else self.warmup_connections
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+
+        async def ping() -> None:
+            # any answer (even 401/404) means the connection is up
+            await client.get(f"{self.base_url}/models", headers=headers)
+
+        try:
+            results = await asyncio.wait_for(
+                asyncio.gather(*(ping() for _ in range(count)), return_exceptions=True),
+                timeout=self.warmup_timeout,
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Upstream warm-up timed out after %.1fs", self.warmup_timeout)
+            return
+        failures = [r for r in results if isinstance(r, Exception)]
+        if failures:
+            logger.warning("Upstream warm-up: %d of %d request(s) failed: %s", len(failures), count, failures[0])
+        logger.info(
+            "Upstream warm-up opened %d connection(s) to %s in %.0f ms",
+            self.connections.value - before, self.base_url, (time.perf_counter() - started) * 1000,
+        )
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def stats(self) -> Dict[str, Any]:
+        opened, requests = self.connections.value, self.requests.value
+        return {
+            "open": self.client is not None,
+            "base_url": self.base_url,
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive": self.limits.max_keepalive_connections,
+            "connections_opened": opened,
+            "requests": requests,
+            "reuse_rate": round(1 - opened / requests, 4) if requests else None,
+        }
+
+
+upstream = UpstreamPool(
+    base_url=settings.OPENAI_BASE_URL,
+    api_key=settings.OPENAI_API_KEY,
+    max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+    max_keepalive=settings.UPSTREAM_MAX_KEEPALIVE,
+    keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY,
+    connect_timeout=settings.UPSTREAM_CONNECT_TIMEOUT,
+    timeout=settings.UPSTREAM_TIMEOUT,
+    http2=settings.UPSTREAM_HTTP2,
+    warmup_connections=settings.UPSTREAM_WARMUP_CONNECTIONS,
+    warmup_timeout=settings.UPSTREAM_WARMUP_TIMEOUT,
+)
@@ -0,0 +1,227 @@
+import os
+import re
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from app.core.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+# words of a regenerate query that say nothing about the venue wanted
+STOPWORDS = {
+    "a", "an", "the", "to", "for", "of", "in", "at", "on", "and", "or", "with", "near", "by", "from",
+    "some", "something", "somewhere", "any", "instead", "find", "want", "like", "please", "me", "my",
+    "we", "our", "us", "i", "is", "are", "be", "can", "you", "show", "give", "get", "suggest", "good",
+    "nice", "best", "new", "another", "other", "different", "alternative", "alternatives", "option",
+    "options", "activity", "activities", "place", "places", "replace", "change", "swap", "do", "go",
+    "am", "pm",
+}
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def norm(text: Any) -> str:
+    return " ".join(str(text or "").split()).lower()
+
+
+def _stem(word: str) -> str:
+    # rough plural folding for the fallback search; FTS5 uses its porter stemmer
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def words(text: Any) -> List[str]:
+    return _WORD.findall(norm(text))
+
+
+def search_terms(query: str, ignore: Iterable[str] = ()) -> List[str]:
+    """Words of `query` worth matching venues on: no stopwords, numbers or `ignore` words."""
+    skip = STOPWORDS | {w for text in ignore for w in words(text)}
+    terms: List[str] = []
+    for word in words(query):
+        if len(word) > 1 and not word.isdigit() and word not in skip and word not in terms:
+            terms.append(word)
+    return terms
+
+
+class VenueIndex:
+    """Venues from generated itineraries and alternatives, searchable per destination.
+
+    One row per (destination, place) in a local SQLite file, shared by all
+    workers; seeing a venue again refreshes it and bumps its `seen` count,
+    and venues not seen for `ttl_seconds` are no longer returned. Title,
+    description, place and keyword are full-text indexed with FTS5 (porter
+    stemming); where SQLite lacks FTS5 the same search runs as a word match
+    over the destination's rows.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 30 * 24 * 60 * 60):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.fts5: Optional[bool] = None  # known once connected
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.added = counter("venue_index_upserts_total", "Venues written to the local venue index (new or refreshed)")
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS venues ("
+                "id INTEGER PRIMARY KEY, destination TEXT NOT NULL, place_key TEXT NOT NULL, "
+                "keyword TEXT NOT NULL, time TEXT NOT NULL, title TEXT NOT NULL, description TEXT NOT NULL, "
+                "place TEXT NOT NULL, seen INTEGER NOT NULL DEFAULT 1, updated_at REAL NOT NULL, "
+                "UNIQUE (destination, place_key))"
+            )
+            try:
+                conn.executescript(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS venues_fts USING fts5("
+                    "title, description, place, keyword, content='venues', content_rowid='id', "
+                    "tokenize='porter unicode61');"
+                    "CREATE TRIGGER IF NOT EXISTS venues_ai AFTER INSERT ON venues BEGIN "
+                    "INSERT INTO venues_fts (rowid, title, description, place, keyword) "
+                    "VALUES (new.id, new.title, new.description, new.place, new.keyword); END;"
+                    "CREATE TRIGGER IF NOT EXISTS venues_ad AFTER DELETE ON venues BEGIN "
+                    "INSERT INTO venues_fts (venues_fts, rowid, title, description, place, keyword) "
+                    "VALUES ('delete', old.id, old.title, old.description, old.place, old.keyword); END;"
+                    "CREATE TRIGGER IF NOT EXISTS venues_au AFTER UPDATE ON venues BEGIN "
+                    "INSERT INTO venues_fts (venues_fts, rowid, title, description, place, keyword) "
+                    "VALUES ('delete', old.id, old.title, old.description, old.place, old.keyword); "
+                    "INSERT INTO venues_fts (rowid, title, description, place, keyword) "
+                    "VALUES (new.id, new.title, new.description, new.place, new.keyword); END;"
+                )
+                self.fts5 = True
+            except sqlite3.OperationalError as e:
+                # "no such module: fts5"
+                logger.warning("Venue index without full-text search (%s); using word matching", e)
+                self.fts5 = False
+            # stale venues go when a process first opens the index
+            conn.execute("DELETE FROM venues WHERE updated_at < ?", (time.time() - self.ttl_seconds,))
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _add(self, destination: str, activities: List[Dict[str, Any]]) -> int:
+        rows = []
+        now = time.time()
+        for activity in activities:
+            place = norm(activity.get("place")) or norm(activity.get("title"))
+            if not place or not activity.get("title"):
+                continue
+            rows.append((
+                destination, place, str(activity.get("keyword") or ""), str(activity.get("time") or ""),
+                str(activity["title"]), str(activity.get("description") or ""),
+                str(activity.get("place") or activity["title"]), now,
+            ))
+        if not rows:
+            return 0
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT INTO venues (destination, place_key, keyword, time, title, description, place, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (destination, place_key) DO UPDATE SET keyword = excluded.keyword, "
+                "time = excluded.time, title = excluded.title, description = excluded.description, "
+                "place = excluded.place, seen = seen + 1, updated_at = excluded.updated_at",
+                rows,
+            )
+            conn.commit()
+        self.added.inc(len(rows))
+        return len(rows)
+
+    def _search(self, destination: str, terms: List[str], keyword: Optional[str], exclude: Set[str], limit: int) -> List[Dict[str, Any]]:
+        fresh = time.time() - self.ttl_seconds
+        # fetch enough to still have `limit` left after dropping excluded places and repeated titles
+        fetch = 2 * limit + len(exclude)
+        with self._lock:
+            conn = self._connect()
+            where, params = "v.destination = ? AND v.updated_at >= ?", [destination, fresh]
+            if keyword:
+                where += " AND v.keyword = ?"
+                params.append(keyword)
+            if not terms:
+                rows = conn.execute(
+                    f"SELECT v.* FROM venues v WHERE {where} ORDER BY v.seen DESC, v.updated_at DESC LIMIT ?",
+                    (*params, fetch),
+                ).fetchall()
+            elif self.fts5:
+                match = " ".join('"' + term.replace('"', "") + '"' for term in terms)
+                rows = conn.execute(
+                    f"SELECT v.* FROM venues_fts JOIN venues v ON v.id = venues_fts.rowid "
+                    f"WHERE venues_fts MATCH ? AND {where} ORDER BY bm25(venues_fts), v.seen DESC LIMIT ?",
+                    (match, *params, fetch),
+                ).fetchall()
+            else:
+                wanted = {_stem(term) for term in terms}
+                rows = [
+                    row for row in conn.execute(
+                        f"SELECT v.* FROM venues v WHERE {where} ORDER BY v.seen DESC, v.updated_at DESC", params
+                    )
+                    if wanted <= {_stem(w) for w in words(" ".join((row["title"], row["description"], row["place"], row["keyword"])))}
+                ][:fetch]
+        found: List[Dict[str, Any]] = []
+        titles = set(exclude)
+        for row in rows:
+            title = norm(row["title"])
+            if row["place_key"] in exclude or title in titles:
+                continue
+            titles.add(title)
+            found.append({
+                "time": row["time"], "title": row["title"], "description": row["description"],
+                "place": row["place"], "keyword": row["keyword"],
+            })
+            if len(found) == limit:
+                break
+        return found
+
+    async def add(self, destination: Any, activities: List[Dict[str, Any]]) -> int:
+        """Record `activities` (dicts with title/place/keyword/...) for `destination`; returns how many."""
+        try:
+            return await asyncio.to_thread(self._add, norm(destination), activities)
+        except sqlite3.Error as e:
+            logger.warning("Venue index write failed: %s", e)
+            return 0
+
+    async def search(
+        self, destination: Any, terms: List[str], keyword: Optional[str] = None, exclude: Iterable[str] = (), limit: int = 4
+    ) -> List[Dict[str, Any]]:
+        """Up to `limit` distinct venues of `destination` matching every one of `terms`, best first.
+
+        With no terms, the most often seen venues with `keyword`. `exclude`
+        holds places/titles to leave out (compared case-insensitively).
+        """
+        if not terms and not keyword:
+            return []
+        try:
+            return await asyncio.to_thread(
+                self._search, norm(destination), terms, keyword, {norm(e) for e in exclude if e}, limit
+            )
+        except sqlite3.Error as e:
+            logger.warning("Venue index search failed: %s", e)
+            return []
+
+    def _stats(self) -> Dict[str, Any]:
+        with self._lock:
+            conn = self._connect()
+            venues, destinations = conn.execute("SELECT COUNT(*), COUNT(DISTINCT destination) FROM venues").fetchone()
+        return {"venues": venues, "destinations": destinations}
+
+    async def stats(self) -> Dict[str, Any]:
+        try:
+            counts = await asyncio.to_thread(self._stats)
+        except sqlite3.Error as e:
+            logger.warning("Venue index stats failed: %s", e)
+            counts = {"venues": None, "destinations": None}
+        return {**counts, "full_text_search": self.fts5, "upserts": self.added.value}
@@ -1,44 +1,430 @@
-import os
 import json
+import math
+import time
 import asyncio
 import datetime
 import logging
 from uuid import uuid4
-from typing import Any, Callable, List, Tuple
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
 
-from dotenv import load_dotenv
-from openai import AsyncOpenAI
 from fastapi import HTTPException
 
-from .ai_suggestion_schema import ai_suggestion_response, ai_suggestion_request
-
-load_dotenv()
+from app.core.admission import Overloaded, admission
+from app.core.cache import TTLCache, TieredCache, canonical_key
+from app.core.config import settings
+from app.core.deadline import DeadlineExceeded, current_deadline, deadline_low
+from app.core.json_stream import collect_stream
+from app.core.llm_backend import LLMBackend, create_backend
+from app.core.llm_scheduler import Priority, estimate_tokens, hedger, scheduler
+from app.core.llm_utils import parse_json
+from app.core.metrics import counter, histogram
+from app.core.model_router import model_router
+from app.core.singleflight import SingleFlight
+from app.core.streaming import drain_queue
+from app.core.tokens import stage as token_stage
+from app.core.tracing import span
+from app.core.venue_index import VenueIndex
+from .ai_suggestion_schema import ai_suggestion_response, ai_suggestion_request, itinerary_data
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 
+# System prompts are fixed text so every request shares the same prefix and
+# the provider's prompt cache can serve it; everything request-specific
+# goes in the user message built by the create_*_prompt methods.
+KEYWORDS = [
+    "outdoor", "hotel", "meal", "leisure", "museum", "cultural", "adventure", "nature", "shopping",
+    "entertainment", "romantic", "water", "wildlife", "sports", "spa", "amenity_workspace",
+    "amenity_game_room", "amenity_gym", "amenity_pool", "amenity_parking", "amenity_outdoor_space",
+    "pace_relaxed", "pace_balanced", "pace_fast", "food_casual", "food_fine", "food_local", "food_asian",
+    "food_italian", "food_mexican", "service_transport",
+]
+
+TITLE_AND_CATEGORY = """Generate a SHORT title for this itinerary using only 2-3 words that reflects the trip's main theme (e.g., "Cultural Moscow", "Tokyo Adventures", "Paris Discovery"). You MUST choose exactly one category from this list based on the planned activities: "Cultural & Heritage", "Museums & Art", "Food & Culinary Experiences", "Outdoor & Nature", "Shopping & Fashion", "Leisure & Relaxation", "Family-Friendly Activities", "Accessibility-Friendly", "Local Experiences", "Historical Sites", "Photography & Scenic Spots", "Wellness & Spa", "Adventure & Outdoor Sports", "Seasonal & Festive", "Shopping & Souvenirs"."""
+
+SHORT_TRIP_SYSTEM_PROMPT = f"""You are an expert travel planner AI. The user message gives the TRAVEL DETAILS and PREFERENCES of one trip. Use web search to find current, accurate information about its destination.
+
+Search the web for real places, restaurants, hotels, and current events that match these preferences.
+
+{TITLE_AND_CATEGORY}
+
+Keywords to use for activities: {json.dumps(KEYWORDS)}
+
+Plan exactly the number of days given as the trip duration, starting on the departure date. Every day_uuid is "day-<day_number>-<Itinerary ID>", using the Itinerary ID from the user message.
+
+IMPORTANT: Return ONLY valid JSON, no markdown, no comments:
+
+{{
+"success": true,
+"data": {{
+    "title": "Short Title",
+    "category": "Cultural & Heritage",
+    "days": [
+    {{
+        "day_number": 1,
+        "day_uuid": "day-1-<Itinerary ID>",
+        "date": "<Departure Date>",
+        "activities": [
+        {{
+            "time": "9:00 AM",
+            "title": "Airport Arrival",
+            "description": "Arrive at [Destination] Airport and proceed through customs and baggage claim",
+            "place": "[Destination] Airport",
+            "keyword": "arrival"
+        }},
+        {{
+            "time": "10:30 AM",
+            "title": "Hotel Check-in",
+            "description": "Check-in at [Real Hotel Name that matches amenities]",
+            "place": "[Real Hotel Name]",
+            "keyword": "hotel"
+        }},
+        {{
+            "time": "12:00 PM",
+            "title": "[Real Restaurant/Dining Experience]",
+            "description": "Description matching food preferences",
+            "place": "[Real Restaurant Name]",
+            "keyword": "meal"
+        }},
+        {{
+            "time": "2:00 PM",
+            "title": "[Real Attraction/Activity]",
+            "description": "Activity description matching user interests and any current special events",
+            "place": "[Real Venue Name]",
+            "keyword": "amenity_outdoor_space"
+        }}
+        ]
+    }}
+    ],
+    "status": "COMPLETED"
+}},
+"message": "Itinerary generated successfully"
+}}
+
+Use real place names found through web search that match the user's preferences."""
+
+OUTLINE_SYSTEM_PROMPT = f"""You are a travel planner AI.
+
+Generate a structured JSON itinerary outline for the trip in the user message: one entry per day of the trip duration, the first on the departure date.
+ONLY include this structure per day:
+
+- day_number (integer)
+- date (YYYY-MM-DD)
+- places (list of 2–4 unique attractions/activities per day, brief names only)
+
+DO NOT include full descriptions or times. Only suggest unique, culturally and logistically appropriate activities. No duplication.
+
+{TITLE_AND_CATEGORY}
+
+Return only valid JSON in this format:
+
+{{
+  "title": "Short Title",
+  "category": "Cultural & Heritage",
+  "days": [
+    {{
+      "day_number": 1,
+      "date": "YYYY-MM-DD",
+      "places": ["Place 1", "Place 2", "Place 3"]
+    }},
+    ...
+  ]
+}}"""
+
+DETAIL_SYSTEM_PROMPT = """You are an expert travel planner AI. Based on the given per-day list of places, generate a detailed JSON travel itinerary.
+
+The user message gives the TRAVEL DETAILS of the trip and its assigned days, one line per day: "Day <day_number> (<date>): <places>".
+
+INSTRUCTIONS
+- Only generate the assigned days, keeping their day_number and date
+- Each day should have 2–4 activities
+- Activities should flow logically (morning → evening)
+- Consider accessibility, age group, and pacing
+- Every day_uuid is "day-<day_number>-<Itinerary ID>", using the Itinerary ID from the user message
+- Use appropriate keywords: ["Travel", "Meal", "Relaxation", "Cultural", "Outdoor", "Leisure", "Historical", "Museum", "Shopping", "Backup"]
+
+Return ONLY valid JSON in this exact format:
+{
+"days": [
+    {
+    "day_number": 1,
+    "day_uuid": "day-1-<Itinerary ID>",
+    "date": "YYYY-MM-DD",
+    "activities": [
+        {
+        "time": "9:00 AM",
+        "title": "Activity title",
+        "description": "Brief activity description",
+        "place": "Place name",
+        "keyword": "activity-type"
+        }
+    ]
+    }
+]
+}
+
+IMPORTANT: Return only the JSON object with the "days" array. Do not include any other text or markdown."""
+
+
+def plan_chunk_size(trip_days: int, concurrency: int) -> int:
+    """Days per detail chunk for a long trip.
+
+    The critical path is the slowest chunk, and a chunk's latency grows with
+    the days it has to write, so spread the trip evenly across the workers
+    that can run at once, within the configured bounds (too small wastes
+    calls and prompt tokens, too large makes one call the bottleneck).
+    """
+    size = math.ceil(trip_days / max(1, concurrency))
+    return max(settings.LONG_TRIP_MIN_CHUNK_DAYS, min(settings.LONG_TRIP_MAX_CHUNK_DAYS, size))
+
+
+def validate_day(day: Any, outline_day: dict) -> bool:
+    """True if `day` is a usable detailed version of `outline_day`."""
+    if not isinstance(day, dict) or day.get("day_number") != outline_day.get("day_number"):
+        return False
+    if outline_day.get("date") and day.get("date") != outline_day["date"]:
+        return False
+    activities = day.get("activities")
+    if not isinstance(activities, list) or not activities:
+        return False
+    return all(isinstance(a, dict) and a.get("title") for a in activities)
+
+
+def _day_order(day: dict) -> float:
+    """Sort key: the day's number; days without a usable one go last, in arrival order."""
+    try:
+        return int(day.get("day_number"))
+    except (TypeError, ValueError):
+        return math.inf
+
+
+def _status(data: Any) -> Optional[str]:
+    """`status` of response data: typed, or a dict when it did not fit the itinerary model."""
+    if isinstance(data, itinerary_data):
+        return data.status
+    if isinstance(data, dict):
+        return data.get("status")
+    return None
+
+
+class _DayEmitter:
+    """Callback that queues each new day of chunk `idx` as a `days` event.
+
+    Retries re-stream days that were already sent, so days are keyed on
+    day_number and only the first copy goes out. When the chunk's outline
+    days are given as `expected`, days that don't validate against them are
+    dropped (and counted) so they can be re-requested.
+    """
+
+    def __init__(self, queue: "asyncio.Queue[dict]", idx: int, expected: Optional[Dict[int, dict]] = None):
+        self.queue = queue
+        self.idx = idx
+        self.expected = expected
+        self.seen: set = set()
+        self.rejected = 0
+
+    def __call__(self, day: Any) -> None:
+        if not isinstance(day, dict):
+            return
+        marker = day.get("day_number", json.dumps(day, sort_keys=True))
+        if marker in self.seen:
+            return
+        if self.expected is not None:
+            outline_day = self.expected.get(marker) if isinstance(marker, int) else None
+            if outline_day is None or not validate_day(day, outline_day):
+                self.rejected += 1
+                return
+        self.seen.add(marker)
+        event = {"event": "days", "chunk": self.idx, "days": [day]}
+        if isinstance(marker, int):
+            # repaired days arrive after later ones; this says where the day goes
+            event["day_number"] = marker
+        self.queue.put_nowait(event)
+
+    def missing(self) -> List[dict]:
+        return [day for n, day in (self.expected or {}).items() if n not in self.seen]
+
+
 class AISuggestion:
     """AISuggestion -- single-file, drop-in replacement.
 
     Features:
     - short-trip (<=5 days) single-shot prompt
-    - long-trip (>5 days) outline -> chunk -> parallel detailed prompts
+    - long-trip (>5 days) outline -> chunk -> parallel detailed prompts,
+      pipelined so chunks start while the outline is still streaming
     - robust JSON cleaning & parsing
-    - concurrency semaphore + retry/backoff
+    - long-trip chunks are validated per day and only missing/invalid days
+      are re-requested, so one bad chunk doesn't sink the itinerary
+    - the request deadline bounds every upstream call; when it runs low,
+      repairs and retries stop, stages switch to their fallback model, and
+      a long trip comes back with the days done so far, status PARTIAL
+    - upstream calls go through the shared LLMScheduler (global in-flight/TPM
+      limits, priority classes, jittered retry/backoff); a per-request
+      semaphore still caps how much of it one itinerary can take
+    - optional hedging: a call running past the recent latency percentile
+      gets a budgeted duplicate and the first to finish wins
     - UUID generation for itinerary_id (you can replace with DB ids)
-
-    Note: this expects an AsyncOpenAI client (openai package) and a pydantic-like
-    ai_suggestion_request with `.json()` available. If you don't use FastAPI,
-    replace HTTPException with appropriate exceptions.
+    - optional response cache keyed on the canonicalised request
+    - optional outline cache keyed on destination, trip length and start
+      date; a hit skips the outline call and goes straight to detail chunks,
+      and a request whose outline is being generated by another waits for it
+    - single-flight coalescing of identical in-flight requests
+    - streamed completions parsed incrementally, so each day is available
+      as soon as its JSON object closes
+    - streaming variant that emits the outline and each day as it completes
+    - optional venue index: the activities of each fresh itinerary are
+      recorded in it, for /regenerate_plan to answer from
+
+    Note: completions come from an LLMBackend (OpenAI by default, or the
+    offline stub). Each prompt is a fixed system prompt plus a user message
+    with only this request's details, so the provider can cache the prefix.
+    If you don't use FastAPI, replace HTTPException with appropriate
+    exceptions.
     """
 
-    def __init__(self, concurrency_limit: int = 5, max_retries: int = 2):
-        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(
+        self,
+        concurrency_limit: int = 5,
+        max_retries: int = 2,
+        cache: Optional[TieredCache] = None,
+        backend: Optional[LLMBackend] = None,
+        pipeline: Optional[bool] = None,
+        hedging: Optional[bool] = None,
+        outline_cache: Optional[TTLCache] = None,
+        venues: Optional[VenueIndex] = None,
+    ):
+        self.backend = backend or create_backend()
+        hedging = settings.LLM_HEDGE_ENABLED if hedging is None else hedging
+        self.hedger = hedger if hedging else None
+        self.pipeline = settings.LONG_TRIP_PIPELINE if pipeline is None else pipeline
+        self.max_repair_rounds = settings.LONG_TRIP_REPAIR_ROUNDS
+        self.repair_calls = counter("itinerary_repair_calls_total", "Detail calls re-requesting missing or invalid days")
+        self.invalid_days = counter("itinerary_invalid_days_total", "Generated days rejected by validation")
+        self.partial_days = counter("itinerary_partial_days_total", "Days left out of itineraries returned partial at the deadline")
         self.concurrency_limit = concurrency_limit
         self.max_retries = max_retries
-        
-    async def get_suggestion(self, input_data: ai_suggestion_request) -> ai_suggestion_response:
+        self.cache = cache
+        self.inflight = SingleFlight("suggestion_inflight")
+        self.outline_cache = outline_cache
+        self.outline_hits = counter("outline_cache_hits_total", "Long trips that reused a cached outline")
+        self.outline_misses = counter("outline_cache_misses_total", "Long trips that had to generate an outline")
+        self.outline_shared = counter("outline_shared_total", "Long trips that waited for an outline another request was generating")
+        self._outline_leaders: Dict[str, "asyncio.Future[None]"] = {}
+        self.venues = venues
+        self.request_seconds = histogram("itinerary_request_duration_seconds", "Itinerary generation time by path")
+
+    async def get_suggestion(self, input_data: ai_suggestion_request, bypass_cache: bool = False, admit: bool = True) -> ai_suggestion_response:
+        """Cached itinerary, or a fresh one.
+
+        Fresh generations pass admission control first (raising Overloaded
+        when refused) unless `admit` is False, as for callers that bound
+        their own concurrency.
+        """
+        key = canonical_key(input_data.model_dump())
+        if self.cache is not None and not bypass_cache:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                logger.info("Serving itinerary from cache (%s)", key[:12])
+                return ai_suggestion_response(**cached)
+
+        # identical requests already being generated share that generation
+        return await self.inflight.do(key, lambda: self._generate_and_store(key, input_data, admit))
+
+    async def _generate_and_store(self, key: str, input_data: ai_suggestion_request, admit: bool = True) -> ai_suggestion_response:
+        if admit:
+            async with admission.slot(self.estimate_cost(input_data)):
+                response = await self.generate_suggestion(input_data)
+        else:
+            response = await self.generate_suggestion(input_data)
+        partial = _status(response.data) == "PARTIAL"
+        payload = response.model_dump()
+        if self.cache is not None and not partial:
+            await self.cache.set(key, payload)
+        await self._remember_venues(input_data, payload["data"])
+        return response
+
+    async def stream_suggestion(self, input_data: ai_suggestion_request, bypass_cache: bool = False) -> AsyncIterator[dict]:
+        """Yield itinerary events as soon as each part is ready.
+
+        Events: `outline` (title/category, plus the day outline on the long
+        path), a `days` event for each day as soon as its JSON object has
+        streamed in, then `complete`. On the short path there is no outline
+        pass, so `outline` follows the days.
+        """
+        key = canonical_key(input_data.model_dump())
+        if self.cache is not None and not bypass_cache:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                logger.info("Streaming itinerary from cache (%s)", key[:12])
+                for event in self._events_from_response(cached):
+                    yield event
+                return
+
+        trip_days = self.get_trip_days(input_data)
+        started = time.perf_counter()
+        if trip_days <= 4:
+            path = "short"
+            events = self._iter_short_trip(input_data, trip_days)
+            message = "Itinerary (short trip) generated successfully."
+        else:
+            path = "long"
+            events = self._iter_long_trip(input_data, trip_days)
+            message = "Itinerary generated successfully."
+
+        title, category, chunks, missing = "", "", {}, []
+        async for event in events:
+            if event["event"] == "outline":
+                title, category = event["title"], event["category"]
+            elif event["event"] == "partial":
+                missing.extend(event["missing_days"])
+            else:
+                chunks.setdefault(event["chunk"], []).extend(event["days"])
+            yield event
+        payload = self._build_response(title, category, chunks, message, missing).model_dump()
+        self.request_seconds.observe(time.perf_counter() - started, path=path)
+        complete = {"event": "complete", "status": payload["data"]["status"], "total_days": len(payload["data"]["days"])}
+        if missing:
+            complete["missing_days"] = payload["data"]["missing_days"]
+        yield complete
+
+        if self.cache is not None and not missing:
+            await self.cache.set(key, payload)
+        await self._remember_venues(input_data, payload["data"])
+
+    async def _remember_venues(self, input_data: ai_suggestion_request, data: Any) -> None:
+        if self.venues is None or not isinstance(data, dict):
+            return
+        activities = [
+            activity
+            for day in data.get("days", []) if isinstance(day, dict)
+            for activity in day.get("activities", []) if isinstance(activity, dict)
+        ]
+        await self.venues.add(input_data.destination, activities)
+
+    def _events_from_response(self, payload: dict) -> List[dict]:
+        data = payload.get("data")
+        if not isinstance(data, dict):
+            data = {}
+        days = data.get("days", [])
+        return [
+            {"event": "outline", "title": data.get("title", ""), "category": data.get("category", "")},
+            {"event": "days", "chunk": 0, "days": days},
+            {"event": "complete", "status": data.get("status", "COMPLETED"), "total_days": len(days)},
+        ]
+
+    def estimate_cost(self, input_data: ai_suggestion_request) -> int:
+        """Admission cost: the upstream calls a fresh itinerary is expected to make."""
+        try:
+            trip_days = self.get_trip_days(input_data)
+        except HTTPException:
+            return 1
+        if trip_days <= 4:
+            return 1
+        chunk_size = plan_chunk_size(trip_days, min(self.concurrency_limit, scheduler.max_in_flight)) if self.pipeline else 4
+        return 1 + math.ceil(trip_days / chunk_size)
+
+    def get_trip_days(self, input_data: ai_suggestion_request) -> int:
         try:
             dep = datetime.datetime.strptime(input_data.departure_date, "%Y-%m-%d")
             ret = datetime.datetime.strptime(input_data.return_date, "%Y-%m-%d")
@@ -48,30 +434,40 @@ class AISuggestion:
         if ret < dep:
             raise HTTPException(status_code=400, detail="return_date must be the same or after departure_date.")
 
-        trip_days = (ret - dep).days + 1
+        return (ret - dep).days + 1
+
+    async def generate_suggestion(self, input_data: ai_suggestion_request) -> ai_suggestion_response:
+        trip_days = self.get_trip_days(input_data)
 
         logger.info("Generating itinerary for %s -> %s (%d days)", input_data.departure_date, input_data.return_date, trip_days)
 
         if trip_days <= 4:
             logger.info("Using SHORT TRIP path")
-            return await self.handle_short_trip(input_data, trip_days)
+            with self.request_seconds.time(path="short"):
+                return await self.handle_short_trip(input_data, trip_days)
         else:
             logger.info("Using LONG TRIP path")
-            return await self._handle_long_trip(input_data, trip_days)
+            with self.request_seconds.time(path="long"):
+                return await self._handle_long_trip(input_data, trip_days)
 
     # short-trip path (<=4 days)
     async def handle_short_trip(self, input_data: ai_suggestion_request, trip_days: int) -> ai_suggestion_response:
         logger.info("SHORT TRIP: Starting processing for %d days", trip_days)
         itinerary_id = f"itinerary-{uuid4()}"
-        prompt = self.create_short_trip_prompt(input_data, trip_days, itinerary_id)
-
-        raw = await self._call_with_retries(lambda: self.get_openai_response(prompt, input_data))
-        cleaned = self.clean_json(raw)
-
-        try:
-            parsed = json.loads(cleaned)
-        except Exception as e:
-            raise HTTPException(status_code=502, detail=f"LLM returned invalid JSON: {e}")
+        with span("prompt_build", kind="short"):
+            prompt = self.create_short_trip_prompt(input_data, trip_days, itinerary_id)
+
+        raw = await self._call_with_retries(
+            lambda model: self.get_openai_response(SHORT_TRIP_SYSTEM_PROMPT, prompt, model),
+            priority=Priority.INTERACTIVE,
+            tokens=estimate_tokens(SHORT_TRIP_SYSTEM_PROMPT, prompt, completion=400 * trip_days),
+            stage="short_trip",
+        )
+        with span("parse", kind="short"):
+            try:
+                parsed = self.parse_json(raw)
+            except ValueError as e:
+                raise HTTPException(status_code=502, detail=f"LLM returned invalid JSON: {e}")
 
         # Extract data from the response structure
         if "data" in parsed:
@@ -79,183 +475,339 @@ class AISuggestion:
         else:
             response_data = parsed
 
-        return ai_suggestion_response(
-            success=True,
-            message="Itinerary (short trip) generated successfully.",
-            data=response_data,
-        )
+        with span("validate", kind="short"):
+            return ai_suggestion_response(
+                success=True,
+                message="Itinerary (short trip) generated successfully.",
+                data=response_data,
+            )
 
-    def create_short_trip_prompt(self, input_data: ai_suggestion_request, trip_days: int, itinerary_id: str) -> str:
-        return f"""You are an expert travel planner AI. Use web search to find current, accurate information about {input_data.destination}.
-
-    TRAVEL DETAILS:
-    - Trip Duration: {trip_days} days
-    - Travelers: {input_data.total_adults} adults, {input_data.total_children} children (under 12)
-    - Destination: {input_data.destination}, {input_data.destination_state}
-    - Departure Date: {input_data.departure_date}
-    - Return Date: {input_data.return_date}
-
-    PREFERENCES:
-    - Activities: {', '.join(input_data.activities)}
-    - Amenities: {', '.join(input_data.amenities)}
-    - Food: {', '.join(input_data.food)}
-    - Pacing: {', '.join(input_data.pacing)}
-    - Special Notes: {input_data.special_note or 'None specified'}
-
-    Search the web for real places, restaurants, hotels, and current events that match these preferences. 
-    
-    Generate a SHORT title for this itinerary using only 2-3 words that reflects the trip's main theme (e.g., "Cultural Moscow", "Tokyo Adventures", "Paris Discovery"). You MUST choose exactly one category from this list based on the planned activities: "Cultural & Heritage", "Museums & Art", "Food & Culinary Experiences", "Outdoor & Nature", "Shopping & Fashion", "Leisure & Relaxation", "Family-Friendly Activities", "Accessibility-Friendly", "Local Experiences", "Historical Sites", "Photography & Scenic Spots", "Wellness & Spa", "Adventure & Outdoor Sports", "Seasonal & Festive", "Shopping & Souvenirs".
-    
-    Keywords to use for activities: [
-  "outdoor",
-  "hotel"
-  "meal",
-  "leisure",
-  "museum",
-  "cultural",
-  "adventure",
-  "nature",
-  "shopping",
-  "entertainment",
-  "romantic",
-  "water",
-  "wildlife",
-  "sports",
-  "spa",
-  "amenity_workspace",
-  "amenity_game_room",
-  "amenity_gym",
-  "amenity_pool",
-  "amenity_parking",
-  "amenity_outdoor_space",
-  "pace_relaxed",
-  "pace_balanced",
-  "pace_fast",
-  "food_casual",
-  "food_fine",
-  "food_local",
-  "food_asian",
-  "food_italian",
-  "food_mexican",
-  "service_transport"
-    ]
-    IMPORTANT: Return ONLY valid JSON, no markdown, no comments:
+    async def _iter_short_trip(self, input_data: ai_suggestion_request, trip_days: int) -> AsyncIterator[dict]:
+        logger.info("SHORT TRIP: Streaming %d days", trip_days)
+        itinerary_id = f"itinerary-{uuid4()}"
+        with span("prompt_build", kind="short"):
+            prompt = self.create_short_trip_prompt(input_data, trip_days, itinerary_id)
+
+        queue: "asyncio.Queue[dict]" = asyncio.Queue()
+        emit = _DayEmitter(queue, 0)
+        call = asyncio.ensure_future(self._stream_with_retries(
+            SHORT_TRIP_SYSTEM_PROMPT, prompt, "days", emit,
+            priority=Priority.INTERACTIVE,
+            tokens=estimate_tokens(SHORT_TRIP_SYSTEM_PROMPT, prompt, completion=400 * trip_days),
+            stage="short_trip",
+        ))
+        try:
+            async for event in drain_queue(queue, [call]):
+                yield event
+            raw = call.result()
+        finally:
+            call.cancel()
 
-    {{
-    "success": true,
-    "data": {{
-        "title": "Short Title",
-        "category": "Cultural & Heritage",
-        "days": [
-        {{
-            "day_number": 1,
-            "day_uuid": "day-1-{itinerary_id}",
-            "date": "{input_data.departure_date}",
-            "activities": [
-            {{
-                "time": "9:00 AM",
-                "title": "Airport Arrival",
-                "description": "Arrive at {input_data.destination} Airport and proceed through customs and baggage claim",
-                "place": "{input_data.destination} Airport",
-                "keyword": "arrival"
-            }},
-            {{
-                "time": "10:30 AM",
-                "title": "Hotel Check-in",
-                "description": "Check-in at [Real Hotel Name that matches amenities]",
-                "place": "[Real Hotel Name]",
-                "keyword": "hotel"
-            }},
-            {{
-                "time": "12:00 PM", 
-                "title": "[Real Restaurant/Dining Experience]",
-                "description": "Description matching food preferences",
-                "place": "[Real Restaurant Name]",
-                "keyword": "meal"
-            }},
-            {{
-                "time": "2:00 PM",
-                "title": "[Real Attraction/Activity]",
-                "description": "Activity description matching user interests and any current special events",
-                "place": "[Real Venue Name]", 
-                "keyword": "amenity_outdoor_space"
-            }}
-            ]
-        }}
-        ],
-        "status": "COMPLETED"
-    }},
-    "message": "Itinerary generated successfully"
-    }}
+        with span("parse", kind="short"):
+            try:
+                parsed = self.parse_json(raw)
+            except ValueError as e:
+                if len(emit.seen) < trip_days:
+                    raise HTTPException(status_code=502, detail=f"LLM returned invalid JSON: {e}")
+                logger.warning("Short trip JSON incomplete (%s) after all its days streamed", e)
+                parsed = {}
+
+        response_data = parsed.get("data", parsed) if isinstance(parsed, dict) else {}
+        for day in response_data.get("days", []):
+            emit(day)
+        while not queue.empty():
+            yield queue.get_nowait()
+        yield {"event": "outline", "title": response_data.get("title", ""), "category": response_data.get("category", "")}
 
-    Generate {trip_days} days of activities. Use real place names found through web search that match the user's preferences."""
+    def create_short_trip_prompt(self, input_data: ai_suggestion_request, trip_days: int, itinerary_id: str) -> str:
+        """Per-request half of the short-trip prompt; the instructions are SHORT_TRIP_SYSTEM_PROMPT."""
+        return f"""TRAVEL DETAILS:
+- Trip Duration: {trip_days} days
+- Travelers: {input_data.total_adults} adults, {input_data.total_children} children (under 12)
+- Destination: {input_data.destination}, {input_data.destination_state}
+- Departure Date: {input_data.departure_date}
+- Return Date: {input_data.return_date}
+- Itinerary ID: {itinerary_id}
+
+PREFERENCES:
+- Activities: {', '.join(input_data.activities)}
+- Amenities: {', '.join(input_data.amenities)}
+- Food: {', '.join(input_data.food)}
+- Pacing: {', '.join(input_data.pacing)}
+- Special Notes: {input_data.special_note or 'None specified'}
+
+Generate {trip_days} days of activities."""
 
     # long-trip path (>4 days)
     async def _handle_long_trip(self, input_data: ai_suggestion_request, trip_days: int) -> ai_suggestion_response:
+        title, category, chunks, missing = "", "", {}, []
+        async for event in self._iter_long_trip(input_data, trip_days):
+            if event["event"] == "outline":
+                title, category = event["title"], event["category"]
+            elif event["event"] == "partial":
+                missing.extend(event["missing_days"])
+            else:
+                chunks.setdefault(event["chunk"], []).extend(event["days"])
+        return self._build_response(title, category, chunks, "Itinerary generated successfully.", missing)
+
+    async def _iter_long_trip(self, input_data: ai_suggestion_request, trip_days: int) -> AsyncIterator[dict]:
         logger.info("LONG TRIP: Starting processing for %d days", trip_days)
-        
-        # 1) Outline pass
         itinerary_id = f"itinerary-{uuid4()}"
-        outline_prompt = self.create_outline_prompt(input_data, trip_days)
-        raw_outline = await self._call_with_retries(lambda: self.get_openai_response(outline_prompt, input_data))
-        outline_clean = self.clean_json(raw_outline)
-
-        try:
-            outline_obj = json.loads(outline_clean)
-        except Exception as e:
-            logger.error("Failed parsing outline JSON: %s\nCleaned (truncated): %s\nRaw (truncated): %s", e, outline_clean[:2000], raw_outline[:2000])
-            raise HTTPException(status_code=502, detail=f"LLM returned invalid outline JSON: {e}")
-
-        days_outline = outline_obj.get("days", [])
-        title = outline_obj.get("title", f"Trip to {input_data.destination}")
-        category = outline_obj.get("category", "Cultural & Heritage")
-        logger.info("Outline generated %d days", len(days_outline))
-        
-        if not days_outline:
-            raise HTTPException(status_code=502, detail="Outline returned empty days")
-
-        # 2) chunk the days
-        chunk_size = 4
-        chunks = [days_outline[i : i + chunk_size] for i in range(0, len(days_outline), chunk_size)]
-        logger.info("Split into %d chunks of max size %d", len(chunks), chunk_size)
-
-        # 3) process chunks in parallel but with concurrency limit and proper merging
         sem = asyncio.Semaphore(self.concurrency_limit)
+        queue: "asyncio.Queue[dict]" = asyncio.Queue()
+        tasks: List["asyncio.Future[None]"] = []
 
-        async def worker(chunk: List[dict], idx: int,itinerary_id:str) -> Tuple[int, List[dict]]:
+        # detail chunks are small enough to spread the trip over every worker;
+        # without pipelining keep the original fixed split
+        if self.pipeline:
+            chunk_size = plan_chunk_size(trip_days, min(self.concurrency_limit, scheduler.max_in_flight))
+        else:
+            chunk_size = 4
+
+        async def worker(chunk: List[dict], idx: int,itinerary_id:str) -> None:
             async with sem:
                 logger.info("Worker %d processing chunk with %d days", idx, len(chunk))
-                prompt = self.create_detailed_prompt(input_data, chunk,itinerary_id)
-                raw = await self._call_with_retries(lambda: self.get_openai_response(prompt, input_data))
-                cleaned = self.clean_json(raw)
-                try:
-                    parsed = json.loads(cleaned)
-                except Exception as e:
-                    logger.error("Failed parsing detailed chunk %s: %s\nCleaned (truncated): %s\nRaw (truncated): %s", idx, e, cleaned[:2000], raw[:2000])
-                    raise HTTPException(status_code=502, detail=f"LLM returned invalid JSON for chunk {idx}: {e}")
-
-                # Handle different response structures
-                days = []
-                if "days" in parsed:
-                    days = parsed["days"]
-                elif "data" in parsed and "days" in parsed["data"]:
-                    days = parsed["data"]["days"]
-                elif isinstance(parsed, list):
-                    days = parsed 
-                
-                logger.info("Worker %d successfully processed %d days", idx, len(days))
-                return idx, days
-
-        tasks = [worker(chunk, i, itinerary_id) for i, chunk in enumerate(chunks)]
-
-        results = await asyncio.gather(*tasks)
-
-        # 4) merge preserving order
-        results_sorted = sorted(results, key=lambda x: x[0])
-        merged_days: List[dict] = []
-        for idx, days in results_sorted:
-            merged_days.extend(days)
-        
+                emit = _DayEmitter(queue, idx, {day["day_number"]: day for day in chunk})
+                todo = chunk
+                for attempt in range(self.max_repair_rounds + 1):
+                    if attempt:
+                        if deadline_low():
+                            break  # no time left for repairs
+                        logger.warning("Chunk %d: re-requesting %d missing/invalid day(s)", idx, len(todo))
+                        self.repair_calls.inc()
+                    try:
+                        await self._detail_days(input_data, todo, itinerary_id, idx, emit)
+                    except DeadlineExceeded:
+                        todo = emit.missing()
+                        break
+                    todo = emit.missing()
+                    if not todo:
+                        break
+                if emit.rejected:
+                    self.invalid_days.inc(emit.rejected)
+                if todo:
+                    numbers = [day["day_number"] for day in todo]
+                    deadline = current_deadline()
+                    if deadline is not None and deadline.low():
+                        # out of time: hand back what we have, flagged partial
+                        logger.warning("Chunk %d: deadline reached with day(s) %s missing", idx, numbers)
+                        self.partial_days.inc(len(numbers))
+                        queue.put_nowait({"event": "partial", "chunk": idx, "missing_days": numbers})
+                        return
+                    missing = ", ".join(str(n) for n in numbers)
+                    raise HTTPException(status_code=502, detail=f"LLM did not return valid days {missing} for chunk {idx}")
+
+                logger.info("Worker %d successfully processed %d days", idx, len(emit.seen))
+
+        days_outline: List[dict] = []
+        pending: List[dict] = []
+        outlined: set = set()
+
+        def dispatch() -> None:
+            if pending:
+                tasks.append(asyncio.ensure_future(worker(list(pending), len(tasks), itinerary_id)))
+                pending.clear()
+
+        def on_outline_day(day: Any) -> None:
+            # retried outline streams repeat days that may already be dispatched
+            if not isinstance(day, dict) or "day_number" not in day or day["day_number"] in outlined:
+                return
+            outlined.add(day["day_number"])
+            days_outline.append(day)
+            pending.append(day)
+            if self.pipeline and len(pending) >= chunk_size:
+                dispatch()
+
+        outline_key = self._outline_key(input_data, trip_days)
+        cached = await self._cached_outline(outline_key)
+        outline_call: Optional["asyncio.Future[str]"] = None
+        leader: Optional["asyncio.Future[None]"] = None
+        try:
+            if cached is not None:
+                # same destination, length and start date seen before: skip
+                # the outline round-trip and dispatch the detail chunks now
+                self.outline_hits.inc()
+                logger.info("Outline cache hit for %s", input_data.destination)
+                for day in cached["days"]:
+                    on_outline_day(dict(day))
+                title, category = cached["title"], cached["category"]
+            else:
+                if self.outline_cache is not None:
+                    self.outline_misses.inc()
+                    # concurrent requests for this outline wait for ours
+                    leader = asyncio.get_running_loop().create_future()
+                    self._outline_leaders[outline_key] = leader
+                # 1) Outline pass, streamed: with pipelining, detail chunks
+                # start as soon as `chunk_size` outline days have arrived
+                with span("prompt_build", kind="outline"):
+                    outline_prompt = self.create_outline_prompt(input_data, trip_days)
+                outline_call = asyncio.ensure_future(self._stream_with_retries(
+                    OUTLINE_SYSTEM_PROMPT, outline_prompt, "days", on_outline_day,
+                    priority=Priority.STANDARD,
+                    tokens=estimate_tokens(OUTLINE_SYSTEM_PROMPT, outline_prompt, completion=60 * trip_days),
+                    stage="outline",
+                ))
+                async for event in drain_queue(queue, [outline_call]):
+                    yield event
+                raw_outline = outline_call.result()
+                with span("parse", kind="outline"):
+                    try:
+                        outline_obj = self.parse_json(raw_outline)
+                    except ValueError as e:
+                        if len(days_outline) < trip_days:
+                            logger.error("Failed parsing outline JSON: %s\nRaw (truncated): %s", e, raw_outline[:2000])
+                            raise HTTPException(status_code=502, detail=f"LLM returned invalid outline JSON: {e}")
+                        logger.warning("Outline JSON incomplete (%s) after all its days streamed", e)
+                        outline_obj = {}
+
+                for day in outline_obj.get("days", []):
+                    on_outline_day(day)
+                title = outline_obj.get("title", f"Trip to {input_data.destination}")
+                category = outline_obj.get("category", "Cultural & Heritage")
+                logger.info("Outline generated %d days", len(days_outline))
+
+                if not days_outline:
+                    raise HTTPException(status_code=502, detail="Outline returned empty days")
+                if self.outline_cache is not None and len(days_outline) == trip_days:
+                    self.outline_cache.set(outline_key, {
+                        "destination": " ".join(input_data.destination.split()).lower(),
+                        "title": title,
+                        "category": category,
+                        "days": [dict(day) for day in days_outline],
+                    })
+                self._release_outline(outline_key, leader)
+
+            yield {"event": "outline", "itinerary_id": itinerary_id, "title": title, "category": category, "outline": days_outline}
+
+            # 2) chunk whatever has not been dispatched yet
+            while len(pending) > chunk_size:
+                rest = pending[chunk_size:]
+                del pending[chunk_size:]
+                dispatch()
+                pending.extend(rest)
+            dispatch()
+            logger.info("Split into %d chunks of max size %d", len(tasks), chunk_size)
+
+            # 3) detail chunks run in parallel under the concurrency limit; each
+            # day is queued as soon as its object closes in the streamed completion
+            async for event in drain_queue(queue, tasks):
+                yield event
+        finally:
+            # consumer went away or a call failed: don't leave workers running
+            self._release_outline(outline_key, leader)
+            if outline_call is not None:
+                outline_call.cancel()
+            for task in tasks:
+                task.cancel()
+
+    async def _cached_outline(self, key: str) -> Optional[dict]:
+        """Cached outline for `key`; if another request is generating it right now, wait for that one."""
+        if self.outline_cache is None:
+            return None
+        cached = self.outline_cache.get(key)
+        leader = self._outline_leaders.get(key)
+        if cached is None and leader is not None:
+            self.outline_shared.inc()
+            logger.info("Waiting for the in-flight outline %s", key[:12])
+            await asyncio.shield(leader)
+            # None if the leader failed; then this request makes its own
+            cached = self.outline_cache.get(key)
+        return cached
+
+    def _release_outline(self, key: str, leader: Optional["asyncio.Future[None]"]) -> None:
+        if leader is None:
+            return
+        if self._outline_leaders.get(key) is leader:
+            del self._outline_leaders[key]
+        if not leader.done():
+            leader.set_result(None)
+
+    @staticmethod
+    def _outline_key(input_data: ai_suggestion_request, trip_days: int) -> str:
+        # the outline prompt only depends on these
+        return canonical_key({
+            "destination": input_data.destination,
+            "trip_days": trip_days,
+            "departure_date": input_data.departure_date,
+        })
+
+    def invalidate_outlines(self, destination: Optional[str] = None) -> int:
+        """Drop cached outlines, all of them or only those for `destination`."""
+        if self.outline_cache is None:
+            return 0
+        if destination is None:
+            count = len(self.outline_cache)
+            self.outline_cache.clear()
+            return count
+        wanted = " ".join(destination.split()).lower()
+        return self.outline_cache.delete_where(lambda entry: entry["destination"] == wanted)
+
+    def outline_cache_stats(self) -> Dict[str, Any]:
+        if self.outline_cache is None:
+            return {"enabled": False}
+        hits, misses = self.outline_hits.value, self.outline_misses.value
+        return {
+            "enabled": True,
+            "entries": len(self.outline_cache),
+            "max_entries": self.outline_cache.max_entries,
+            "ttl_seconds": self.outline_cache.ttl_seconds,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "evictions": self.outline_cache.evictions.value,
+        }
+
+    async def _detail_days(self, input_data: ai_suggestion_request, days: List[dict], itinerary_id: str, idx: int, emit: _DayEmitter) -> None:
+        """One detail call for `days`; every valid day it yields goes to `emit`.
+
+        A failed call or unparseable completion is logged, not raised: whatever
+        streamed in is kept and the caller re-requests the rest.
+        """
+        with span("prompt_build", kind="detail", chunk=idx):
+            prompt = self.create_detailed_prompt(input_data, days, itinerary_id)
+        try:
+            raw = await self._stream_with_retries(
+                DETAIL_SYSTEM_PROMPT, prompt, "days", emit,
+                priority=Priority.BULK,
+                tokens=estimate_tokens(DETAIL_SYSTEM_PROMPT, prompt, completion=400 * len(days)),
+                stage="detail",
+            )
+        except (Overloaded, DeadlineExceeded):
+            raise
+        except Exception as e:
+            logger.error("Detail call for chunk %s failed: %s", idx, e)
+            return
+
+        with span("parse", kind="detail", chunk=idx):
+            try:
+                parsed = self.parse_json(raw)
+            except ValueError as e:
+                logger.warning("Failed parsing detailed chunk %s: %s\nRaw (truncated): %s", idx, e, raw[:2000])
+                return
+
+        # Handle different response structures; anything the stream parser
+        # missed is emitted now
+        found = []
+        if isinstance(parsed, list):
+            found = parsed
+        elif "days" in parsed:
+            found = parsed["days"]
+        elif "data" in parsed and "days" in parsed["data"]:
+            found = parsed["data"]["days"]
+        for day in found:
+            emit(day)
+
+    def _build_response(
+        self, title: str, category: str, chunks: Dict[int, List[dict]], message: str, missing: Optional[List[int]] = None
+    ) -> ai_suggestion_response:
+        # 4) merge in day order: repair rounds append their days to the end
+        # of the chunk, after days that come later in the trip
+        with span("merge", chunks=len(chunks)):
+            merged_days: List[dict] = []
+            for idx in sorted(chunks):
+                merged_days.extend(chunks[idx])
+            merged_days.sort(key=_day_order)
+
         logger.info("Merged %d total days from all workers", len(merged_days))
 
         response_obj = {
@@ -269,143 +821,98 @@ class AISuggestion:
             "message": "Itinerary generated successfully",
         }
 
-        return ai_suggestion_response(success=True, message="Itinerary generated successfully.", data=response_obj["data"])
+        if missing:
+            # the request deadline cut generation short
+            response_obj["data"]["status"] = "PARTIAL"
+            response_obj["data"]["missing_days"] = sorted(missing)
+            message = f"Itinerary partially generated: ran out of time before day(s) {', '.join(map(str, sorted(missing)))}."
 
-    def create_outline_prompt(self, input_data: ai_suggestion_request, trip_days: int) -> str:
-        return f"""You are a travel planner AI.
-
-Generate a structured JSON itinerary outline for a {trip_days}-day trip to {input_data.destination} starting on {input_data.departure_date}.
-ONLY include this structure per day:
+        with span("validate"):
+            return ai_suggestion_response(success=True, message=message, data=response_obj["data"])
 
-- day_number (integer)
-- date (YYYY-MM-DD)
-- places (list of 2–4 unique attractions/activities per day, brief names only)
-
-DO NOT include full descriptions or times. Only suggest unique, culturally and logistically appropriate activities. No duplication. 
-
-Generate a SHORT title for this itinerary using only 2-3 words that reflects the trip's main theme (e.g., "Cultural Moscow", "Tokyo Adventures", "Paris Discovery"). You MUST choose exactly one category from this list based on the planned activities: "Cultural & Heritage", "Museums & Art", "Food & Culinary Experiences", "Outdoor & Nature", "Shopping & Fashion", "Leisure & Relaxation", "Family-Friendly Activities", "Accessibility-Friendly", "Local Experiences", "Historical Sites", "Photography & Scenic Spots", "Wellness & Spa", "Adventure & Outdoor Sports", "Seasonal & Festive", "Shopping & Souvenirs".
-
-Return only valid JSON in this format:
-
-{{
-  "title": "Short Title",
-  "category": "Cultural & Heritage",
-  "days": [
-    {{
-      "day_number": 1,
-      "date": "YYYY-MM-DD",
-      "places": ["Place 1", "Place 2", "Place 3"]
-    }},
-    ...
-  ]
-}}"""
+    def create_outline_prompt(self, input_data: ai_suggestion_request, trip_days: int) -> str:
+        """Per-request half of the outline prompt; only these fields go in, so they key the outline cache."""
+        return f"""TRIP:
+- Trip Duration: {trip_days} days
+- Destination: {input_data.destination}
+- Departure Date: {input_data.departure_date}"""
 
     def create_detailed_prompt(self, input_data: ai_suggestion_request, day_chunk: List[dict], itinerary_id: str) -> str:
+        """Per-request half of a detail chunk prompt; the instructions are DETAIL_SYSTEM_PROMPT."""
         day_info = "\n".join(
             f"Day {day['day_number']} ({day['date']}): {', '.join(day['places'])}"
             for day in day_chunk
         )
 
-        return f"""You are an expert travel planner AI. Based on the given per-day list of places, generate a detailed JSON travel itinerary.
-
-    TRAVEL DETAILS
-    - Travelers: {input_data.total_adults} adults, {input_data.total_children} children
-    - Destination: {input_data.destination}
-    - Accessibility/Amenities: {', '.join(input_data.amenities)}
-    - Interests: {', '.join(input_data.activities)}
-    - Food Preferences: {', '.join(input_data.food)}
-    - Pacing: {', '.join(input_data.pacing)}
-    - Special Notes: {input_data.special_note or 'None'}
-
-    ---
-
-    ASSIGNED DAYS
-    {day_info}
-
-    ---
-
-    INSTRUCTIONS
-    - Only generate days assigned above
-    - Each day should have 2–4 activities
-    - Activities should flow logically (morning → evening)
-    - Consider accessibility, age group, and pacing
-    - Use appropriate keywords: ["Travel", "Meal", "Relaxation", "Cultural", "Outdoor", "Leisure", "Historical", "Museum", "Shopping", "Backup"]
-
-    Return ONLY valid JSON in this exact format:
-    {{
-    "days": [
-        {{
-        "day_number": 1,
-        "day_uuid": "day-1-{itinerary_id}",
-        "date": "YYYY-MM-DD",
-        "activities": [
-            {{
-            "time": "9:00 AM",
-            "title": "Activity title",
-            "description": "Brief activity description",
-            "place": "Place name",
-            "keyword": "activity-type"
-            }}
-        ]
-        }}
-    ]
-    }}
-
-    IMPORTANT: Return only the JSON object with the "days" array. Do not include any other text or markdown."""
-
-    async def get_openai_response(self, prompt: str, data_obj: Any) -> str:
-        if hasattr(data_obj, "json") and callable(getattr(data_obj, "json")):
-            data_json = data_obj.json()
-        else:
-            data_json = json.dumps(data_obj)
+        return f"""TRAVEL DETAILS
+- Travelers: {input_data.total_adults} adults, {input_data.total_children} children
+- Destination: {input_data.destination}
+- Accessibility/Amenities: {', '.join(input_data.amenities)}
+- Interests: {', '.join(input_data.activities)}
+- Food Preferences: {', '.join(input_data.food)}
+- Pacing: {', '.join(input_data.pacing)}
+- Special Notes: {input_data.special_note or 'None'}
+- Itinerary ID: {itinerary_id}
+
+ASSIGNED DAYS
+{day_info}"""
+
+    async def get_openai_response(self, system_prompt: str, user_prompt: str, model: str) -> str:
+        return await self.backend.complete(
+            model=model,
+            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+        )
 
-        completion = await self.client.chat.completions.create(
-            model="gpt-4o-search-preview",
-            messages=[{"role": "system", "content": prompt}, {"role": "user", "content": data_json}],
+    async def stream_openai_response(self, system_prompt: str, user_prompt: str, model: str) -> AsyncIterator[str]:
+        async for piece in self.backend.stream(
+            model=model,
+            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+        ):
+            yield piece
+
+    async def _stream_with_retries(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        key: str,
+        on_item: Callable[[Any], None],
+        priority: Priority = Priority.STANDARD,
+        tokens: int = 0,
+        stage: str = "short_trip",
+    ) -> str:
+        """Stream a completion, handing each finished `key[]` element to `on_item`.
+
+        Returns the full completion text. Each retry restarts the stream, so
+        `on_item` may see an element more than once.
+        """
+        return await self._call_with_retries(
+            lambda model: collect_stream(self.stream_openai_response(system_prompt, user_prompt, model), key, on_item),
+            priority=priority,
+            tokens=tokens,
+            stage=stage,
         )
 
-        return completion.choices[0].message.content.strip()
-
-    async def _call_with_retries(self, func: Callable[[], Any]) -> Any:
-        attempt = 0
-        while True:
-            try:
-                return await func()
-            except Exception as e:
-                attempt += 1
-                logger.warning("Attempt %d failed with error: %s", attempt, e)
-                if attempt > self.max_retries:
-                    logger.error("Max retries reached. Raising error.")
-                    raise
-                await asyncio.sleep(1.2 ** attempt)
+    async def _call_with_retries(
+        self, func: Callable[[str], Any], priority: Priority = Priority.STANDARD, tokens: int = 0, stage: str = "short_trip"
+    ) -> Any:
+        """Run `func(model)` for the model routed to `stage`, through the scheduler."""
+        with span("upstream", priority=priority.name, llm_stage=stage), token_stage(stage):
+            return await model_router.run(
+                stage,
+                func,
+                lambda attempt: scheduler.run(
+                    attempt,
+                    priority=priority,
+                    tokens=tokens,
+                    max_retries=self.max_retries,
+                    hedger=self.hedger,
+                ),
+            )
 
     def calculate_trip_days(self) -> int:
         departure = datetime.datetime.strptime(self.departure_date, "%Y-%m-%d")
         return_date = datetime.datetime.strptime(self.return_date, "%Y-%m-%d")
         return (return_date - departure).days + 1
 
-    def clean_json(self, raw: str) -> str:
-        # If already valid JSON, return it
-        try:
-            json.loads(raw)
-            return raw
-        except Exception:
-            pass
-
-        # Remove backtick fences
-        if raw.startswith("```json"):
-            raw = raw[len("```json"):].strip()
-        elif raw.startswith("```"):
-            raw = raw[len("```"):].strip()
-
-        # Extract first { ... } pair as candidate
-        start = raw.find("{")
-        end = raw.rfind("}")
-        if start != -1 and end != -1 and end > start:
-            candidate = raw[start : end + 1]
-            try:
-                json.loads(candidate)
-                return candidate
-            except Exception:
-                pass
-        return raw
+    def parse_json(self, raw: str) -> Any:
+        return parse_json(raw)
@@ -1,15 +1,87 @@
-from fastapi import APIRouter, HTTPException
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Header, Query
+from app.core.admission import Overloaded, admission
+from app.core.cache import TTLCache, TieredCache
+from app.core.config import settings
+from app.core.deadline import DeadlineExceeded
+from app.core.json_codec import ModelResponse
+from app.core.llm_scheduler import hedger
+from app.core.streaming import event_stream_response
+from app.services.regenerate_plan.regenerate_plan_route import regenerate_plan, venue_index
 from .ai_suggestion import AISuggestion
 from .ai_suggestion_schema import ai_suggestion_response, ai_suggestion_request
 
 router = APIRouter()
-suggestion = AISuggestion()
+suggestion_cache = TieredCache(
+    "suggestion_cache",
+    max_entries=settings.SUGGESTION_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.SUGGESTION_CACHE_TTL_SECONDS,
+    db_path=settings.SUGGESTION_CACHE_DB_PATH,
+) if settings.SUGGESTION_CACHE_ENABLED else None
+outline_cache = TTLCache(
+    "outline_cache",
+    max_entries=settings.OUTLINE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.OUTLINE_CACHE_TTL_SECONDS,
+) if settings.OUTLINE_CACHE_ENABLED else None
+suggestion = AISuggestion(cache=suggestion_cache, outline_cache=outline_cache, venues=venue_index)
 
 @router.post("/ai_suggestion", response_model=ai_suggestion_response)
-async def get_ai_suggestion(request_data: ai_suggestion_request):
+async def get_ai_suggestion(
+    request_data: ai_suggestion_request,
+    x_cache_bypass: bool = Header(False, description="Skip the cached itinerary and regenerate it"),
+):
     try:
-        response = await suggestion.get_suggestion(request_data)
-        return response
-    
+        response = await suggestion.get_suggestion(request_data, bypass_cache=x_cache_bypass)
+        if regenerate_plan.prefetch is not None:
+            # opt-in (REGENERATE_PREFETCH_ENABLED)
+            data = response.model_dump()["data"]
+            if isinstance(data, dict):
+                regenerate_plan.schedule_prefetch(request_data.model_dump(), data.get("days", []))
+        # already validated: skip FastAPI's second pass through response_model
+        return ModelResponse(response)
+
+    except HTTPException:
+        # the service's own 4xx/5xx, passed through as they are
+        raise
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/ai_suggestion/stream")
+async def stream_ai_suggestion(
+    request_data: ai_suggestion_request,
+    accept: str = Header("application/x-ndjson"),
+    x_cache_bypass: bool = Header(False, description="Skip the cached itinerary and regenerate it"),
+):
+    """Stream the itinerary as NDJSON (default) or SSE (`Accept: text/event-stream`)."""
+    # admit before the response starts, so a refusal is still a plain 503
+    try:
+        ticket = await admission.enter(suggestion.estimate_cost(request_data))
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    events = suggestion.stream_suggestion(request_data, bypass_cache=x_cache_bypass)
+    return event_stream_response(ticket.hold_while(events), accept)
+
+@router.get("/ai_suggestion/cache/stats")
+async def get_cache_stats():
+    if suggestion_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **suggestion_cache.stats()}
+
+@router.get("/ai_suggestion/outline_cache/stats")
+async def get_outline_cache_stats():
+    return suggestion.outline_cache_stats()
+
+@router.delete("/ai_suggestion/outline_cache")
+async def invalidate_outline_cache(
+    destination: Optional[str] = Query(None, description="Only drop outlines for this destination"),
+):
+    """Drop cached long-trip outlines so the next request regenerates them."""
+    return {"invalidated": suggestion.invalidate_outlines(destination)}
+
+@router.get("/ai_suggestion/hedging/stats")
+async def get_hedging_stats():
+    return {"enabled": suggestion.hedger is not None, **hedger.stats()}
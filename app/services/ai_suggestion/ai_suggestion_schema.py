@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Union, Dict,Any  
 
 class ai_suggestion_request (BaseModel):
@@ -14,7 +14,32 @@ class ai_suggestion_request (BaseModel):
     pacing:list[str]
     food:list[str]
     special_note:str    
+
+# Itinerary shape the prompts ask for; extra keys the model adds are kept.
+class itinerary_activity(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    time: str = ""
+    title: str = ""
+    description: str = ""
+    place: str = ""
+    keyword: str = ""
+
+class itinerary_day(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    day_number: int
+    day_uuid: str = ""
+    date: str = ""
+    activities: List[itinerary_activity] = []
+
+class itinerary_data(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    title: str = ""
+    category: str = ""
+    days: List[itinerary_day]
+    status: str = "COMPLETED"  # "PARTIAL" comes with a missing_days list
+
 class ai_suggestion_response(BaseModel):
     success: bool
     message: str
-    data: Union[str, List[Dict], Dict[str, Any]]
\ No newline at end of file
+    # typed when the LLM output has the itinerary shape; anything else passes through as before
+    data: Union[itinerary_data, str, List[Dict], Dict[str, Any]] = Field(union_mode="left_to_right")
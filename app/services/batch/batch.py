@@ -0,0 +1,116 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List
+
+from fastapi import HTTPException
+
+from app.core.admission import Overloaded
+from app.core.cache import canonical_key
+from app.core.deadline import Deadline, DeadlineExceeded, deadline_var
+from app.core.llm_scheduler import Priority, priority_floor
+from app.core.metrics import counter
+from app.core.streaming import drain_queue
+from app.services.ai_suggestion.ai_suggestion import AISuggestion
+from app.services.ai_suggestion.ai_suggestion_schema import ai_suggestion_request
+
+logger = logging.getLogger(__name__)
+
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class BatchRunner:
+    """Many itineraries for one request, reported in the order they finish.
+
+    - identical items are generated once and reported under every index
+      they appear at; items already cached or being generated by another
+      request share that result (`AISuggestion.get_suggestion`)
+    - long trips with the same destination, length and start date share
+      one outline pass through the outline cache
+    - distinct items run at most `concurrency` at a time, their upstream
+      calls at BULK priority or lower so single requests are served first
+    - each item gets its own deadline of `item_seconds` from when it
+      starts; one item failing doesn't stop the others
+    """
+
+    def __init__(self, suggestion: AISuggestion, concurrency: int = 4, item_seconds: float = 0, low_seconds: float = 0):
+        self.suggestion = suggestion
+        self.concurrency = concurrency
+        self.item_seconds = item_seconds
+        self.low_seconds = low_seconds
+
+        self.items = counter("batch_items_total", "Batch items reported, by status")
+        self.duplicates = counter("batch_duplicate_items_total", "Batch items answered by an identical item in the same batch")
+
+    @staticmethod
+    def plan(items: List[ai_suggestion_request]) -> Dict[str, List[int]]:
+        """Indices of the batch grouped by request; one generation per group."""
+        groups: Dict[str, List[int]] = {}
+        for index, item in enumerate(items):
+            groups.setdefault(canonical_key(item.model_dump()), []).append(index)
+        return groups
+
+    def estimate_cost(self, items: List[ai_suggestion_request]) -> int:
+        """Admission cost: the most the batch can have in flight at once."""
+        costs = sorted(
+            (self.suggestion.estimate_cost(items[indices[0]]) for indices in self.plan(items).values()),
+            reverse=True,
+        )
+        return sum(costs[: self.concurrency])
+
+    async def run(self, items: List[ai_suggestion_request]) -> AsyncIterator[dict]:
+        """Yield `accepted`, one `item` event per index as it finishes, then `complete`."""
+        groups = self.plan(items)
+        self.duplicates.inc(len(items) - len(groups))
+        yield {"event": "accepted", "total": len(items), "unique": len(groups)}
+
+        queue: "asyncio.Queue[dict]" = asyncio.Queue()
+        pool = asyncio.Semaphore(self.concurrency)
+        tasks = [
+            asyncio.ensure_future(self._run_group(items[indices[0]], indices, pool, queue))
+            for indices in groups.values()
+        ]
+        counts = {SUCCEEDED: 0, FAILED: 0}
+        try:
+            async for event in drain_queue(queue, tasks):
+                counts[event["status"]] += 1
+                self.items.inc(status=event["status"])
+                yield event
+        finally:
+            # client went away: stop the items still running
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        yield {"event": "complete", "total": len(items), "unique": len(groups), **counts}
+
+    async def _run_group(
+        self,
+        item: ai_suggestion_request,
+        indices: List[int],
+        pool: asyncio.Semaphore,
+        queue: "asyncio.Queue[dict]",
+    ) -> None:
+        async with pool:
+            # context changes stay in this task
+            priority_floor.set(Priority.BULK)
+            if self.item_seconds > 0:
+                deadline_var.set(Deadline(self.item_seconds, self.low_seconds))
+            try:
+                # the pool and the batch's admission ticket bound concurrency
+                response = await self.suggestion.get_suggestion(item, admit=False)
+                outcome: Dict[str, Any] = {"status": SUCCEEDED, "result": response.model_dump()}
+            except Exception as e:
+                logger.warning("Batch item %s failed: %s", indices[0], e)
+                outcome = {"status": FAILED, **self._error(e)}
+        for index in indices:
+            queue.put_nowait({"event": "item", "index": index, **outcome})
+
+    @staticmethod
+    def _error(e: Exception) -> Dict[str, Any]:
+        if isinstance(e, HTTPException):
+            return {"status_code": e.status_code, "error": e.detail}
+        if isinstance(e, Overloaded):
+            return {"status_code": 503, "error": str(e), "retry_after": e.retry_after}
+        if isinstance(e, DeadlineExceeded):
+            return {"status_code": 504, "error": str(e)}
+        return {"status_code": 500, "error": str(e)}
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException, Header
+from app.core.admission import Overloaded, admission
+from app.core.config import settings
+from app.core.streaming import event_stream_response
+from app.services.ai_suggestion.ai_suggestion_route import suggestion
+from .batch import BatchRunner
+from .batch_schema import ai_suggestion_batch_request
+
+router = APIRouter()
+batch = BatchRunner(
+    suggestion,
+    concurrency=settings.BATCH_CONCURRENCY,
+    item_seconds=settings.REQUEST_TIMEOUT_SECONDS - settings.REQUEST_DEADLINE_MARGIN_SECONDS,
+    low_seconds=settings.REQUEST_DEADLINE_LOW_SECONDS,
+)
+
+@router.post("/ai_suggestion/batch")
+async def batch_ai_suggestion(
+    request_data: ai_suggestion_batch_request,
+    accept: str = Header("application/x-ndjson"),
+):
+    """Generate several itineraries, streaming each as NDJSON (or SSE) once it is ready."""
+    # the whole batch is admitted once, for what it can have in flight
+    try:
+        ticket = await admission.enter(batch.estimate_cost(request_data.items))
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return event_stream_response(ticket.hold_while(batch.run(request_data.items)), accept)
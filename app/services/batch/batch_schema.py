@@ -0,0 +1,9 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+from app.core.config import settings
+from app.services.ai_suggestion.ai_suggestion_schema import ai_suggestion_request
+
+
+class ai_suggestion_batch_request(BaseModel):
+    items: List[ai_suggestion_request] = Field(..., min_length=1, max_length=settings.BATCH_MAX_ITEMS)
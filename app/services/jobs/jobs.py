@@ -0,0 +1,363 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.cache import TTLCache
+from app.core.metrics import counter
+from app.core.process_locks import FileLock, is_locked
+from app.core.tokens import open_ledger
+from app.core.tracing import trace_id_var
+from app.services.ai_suggestion.ai_suggestion import AISuggestion
+from app.services.ai_suggestion.ai_suggestion_schema import ai_suggestion_request
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobStore:
+    """Itinerary jobs in a local SQLite file, so they survive restarts.
+
+    Finished jobs keep their result until `ttl_seconds` after they finish;
+    queued/running jobs never expire. A running job records its `owner`
+    (the worker process running it).
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, request TEXT NOT NULL, "
+                "result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL, expires_at REAL, owner TEXT)"
+            )
+            if "owner" not in {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _row(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        return {
+            "job_id": row["id"],
+            "status": row["status"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "expires_at": row["expires_at"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+        }
+
+    def create(self, request: str) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT INTO jobs (id, status, request, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, QUEUED, request, now, now),
+            )
+            conn.commit()
+        return {"job_id": job_id, "status": QUEUED, "created_at": now, "updated_at": now}
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is not None and row["expires_at"] is not None and row["expires_at"] < time.time():
+                conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                conn.commit()
+                return None
+            return self._row(row)
+
+    def request(self, job_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._connect().execute("SELECT request FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return row["request"] if row else None
+
+    def start(self, job_id: str, owner: Optional[str] = None) -> bool:
+        """Move a queued job to running; False if it was cancelled or taken by another worker meanwhile."""
+        with self._lock:
+            conn = self._connect()
+            cur = conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (RUNNING, owner, time.time(), job_id, QUEUED),
+            )
+            conn.commit()
+            return cur.rowcount == 1
+
+    def finish(self, job_id: str, status: str, result: Optional[Any] = None, error: Optional[str] = None) -> bool:
+        """Record the outcome of an unfinished job; False if it already finished."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            cur = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, expires_at = ? "
+                f"WHERE id = ? AND status NOT IN ({', '.join('?' * len(FINISHED))})",
+                (status, json.dumps(result) if result is not None else None, error, now, now + self.ttl_seconds, job_id, *FINISHED),
+            )
+            conn.commit()
+            return cur.rowcount == 1
+
+    def cancelled(self, job_ids: List[str]) -> List[str]:
+        """Those of `job_ids` marked cancelled, by this process or another."""
+        if not job_ids:
+            return []
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT id FROM jobs WHERE status = ? AND id IN ({', '.join('?' * len(job_ids))})",
+                (CANCELLED, *job_ids),
+            ).fetchall()
+            return [row["id"] for row in rows]
+
+    def requeue_unfinished(self, owner_alive: Callable[[str], bool] = lambda owner: False) -> List[str]:
+        """Jobs left running by a process that is gone go back to queued; returns all queued ids, oldest first."""
+        with self._lock:
+            conn = self._connect()
+            running = conn.execute("SELECT id, owner FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+            orphaned = [row["id"] for row in running if not row["owner"] or not owner_alive(row["owner"])]
+            conn.executemany(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                [(QUEUED, time.time(), job_id, RUNNING) for job_id in orphaned],
+            )
+            conn.commit()
+            rows = conn.execute("SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)).fetchall()
+            return [row["id"] for row in rows]
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            conn = self._connect()
+            cur = conn.execute("DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+            conn.commit()
+            return cur.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class JobRunner:
+    """Bounded pool of background workers running `AISuggestion.get_suggestion`.
+
+    - `submit` stores the job and returns at once; workers pick jobs up in
+      submission order, at most `workers` at a time
+    - at most `max_queued` jobs wait; beyond that `submit` raises JobQueueFull
+    - `cancel` marks the job cancelled and stops it if it is running here;
+      a job running in another worker process is stopped by that process,
+      which checks the store for cancelled jobs every `cancel_poll_interval`
+    - finished jobs are also kept in memory for their TTL, so polling them
+      doesn't touch SQLite
+    - several worker processes can share one store: each holds a lock file
+      for as long as it lives, and on start only jobs whose owner's lock
+      is free (the owner exited) are requeued
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        suggestion: AISuggestion,
+        workers: int = 4,
+        max_queued: int = 1000,
+        purge_interval: float = 600,
+        cancel_poll_interval: float = 1.0,
+    ):
+        self.store = store
+        self.suggestion = suggestion
+        self.workers = workers
+        self.max_queued = max_queued
+        self.purge_interval = purge_interval
+        self.cancel_poll_interval = cancel_poll_interval
+        self.finished = TTLCache("job_results", max_entries=1024, ttl_seconds=store.ttl_seconds)
+        self.owner = uuid.uuid4().hex[:12]
+        self._owners_dir = os.path.join(os.path.dirname(store.path) or ".", "job_owners")
+        self._owner_lock = FileLock(self._owner_path(self.owner))
+
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._running: Dict[str, "asyncio.Task[Any]"] = {}
+        self._cancelled: set = set()
+        self._tasks: List["asyncio.Task[None]"] = []
+
+        self.submitted = counter("jobs_submitted_total", "Itinerary jobs accepted")
+        self.succeeded = counter("jobs_succeeded_total", "Itinerary jobs that finished with a result")
+        self.failed = counter("jobs_failed_total", "Itinerary jobs that failed")
+        self.cancelled = counter("jobs_cancelled_total", "Itinerary jobs cancelled by the client")
+
+    def _owner_path(self, owner: str) -> str:
+        return os.path.join(self._owners_dir, f"{owner}.lock")
+
+    def _owner_alive(self, owner: str) -> bool:
+        return owner == self.owner or is_locked(self._owner_path(owner))
+
+    def _remove_stale_owners(self) -> None:
+        for name in os.listdir(self._owners_dir):
+            owner = name[: -len(".lock")]
+            if name.endswith(".lock") and not self._owner_alive(owner):
+                try:
+                    os.unlink(self._owner_path(owner))
+                except FileNotFoundError:
+                    pass
+
+    async def start(self) -> None:
+        self._owner_lock.try_acquire()
+        queued = await asyncio.to_thread(self.store.requeue_unfinished, self._owner_alive)
+        await asyncio.to_thread(self._remove_stale_owners)
+        if queued:
+            logger.info("Resuming %d unfinished job(s)", len(queued))
+        for job_id in queued:
+            self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._purge_loop()))
+        self._tasks.append(asyncio.create_task(self._cancel_loop()))
+
+    async def stop(self) -> None:
+        # running jobs stay "running" in the store and are requeued on the next start
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.store.close()
+        self._owner_lock.close()
+
+    async def submit(self, request_data: ai_suggestion_request) -> Dict[str, Any]:
+        if self._queue.qsize() >= self.max_queued:
+            raise JobQueueFull(f"{self._queue.qsize()} jobs already queued")
+        job = await asyncio.to_thread(self.store.create, request_data.model_dump_json())
+        self._queue.put_nowait(job["job_id"])
+        self.submitted.inc()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.finished.get(job_id)
+        if job is not None and job["expires_at"] > time.time():
+            return job
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is not None and job["status"] in FINISHED:
+            self.finished.set(job_id, job)
+        return job
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued or running job. Returns the job as it now stands, None if unknown."""
+        if await asyncio.to_thread(self.store.finish, job_id, CANCELLED):
+            self.cancelled.inc()
+            self._stop(job_id)
+        return await self.get(job_id)
+
+    def _stop(self, job_id: str) -> None:
+        task = self._running.get(job_id)
+        if task is not None and job_id not in self._cancelled:
+            self._cancelled.add(job_id)
+            task.cancel()
+
+    async def _worker(self, n: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            # job logs carry the job id as their trace id
+            token = trace_id_var.set(job_id[:16])
+            try:
+                with open_ledger() as ledger:
+                    await self._run(job_id)
+                    if ledger.stages:
+                        logger.info("tokens job %s", ledger.summary())
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job worker %d failed on job %s", n, job_id)
+            finally:
+                trace_id_var.reset(token)
+
+    async def _run(self, job_id: str) -> None:
+        if not await asyncio.to_thread(self.store.start, job_id, self.owner):
+            return  # cancelled, expired or picked up by another worker while queued
+        raw = await asyncio.to_thread(self.store.request, job_id)
+        request_data = ai_suggestion_request.model_validate_json(raw)
+
+        # the worker pool already bounds job concurrency
+        task = asyncio.ensure_future(self.suggestion.get_suggestion(request_data, admit=False))
+        self._running[job_id] = task
+        try:
+            response = await task
+        except asyncio.CancelledError:
+            if job_id in self._cancelled:
+                return  # cancelled through `cancel`, already recorded
+            raise
+        except Exception as e:
+            logger.warning("Job %s failed: %s", job_id, e)
+            detail = getattr(e, "detail", None) or str(e)
+            if await asyncio.to_thread(self.store.finish, job_id, FAILED, error=detail):
+                self.failed.inc()
+        else:
+            if await asyncio.to_thread(self.store.finish, job_id, SUCCEEDED, result=response.model_dump()):
+                self.succeeded.inc()
+        finally:
+            self._running.pop(job_id, None)
+            self._cancelled.discard(job_id)
+
+    async def _purge_loop(self) -> None:
+        while True:
+            try:
+                purged = await asyncio.to_thread(self.store.purge_expired)
+                if purged:
+                    logger.info("Purged %d expired job(s)", purged)
+            except sqlite3.Error as e:
+                logger.warning("Job purge failed: %s", e)
+            await asyncio.sleep(self.purge_interval)
+
+    async def _cancel_loop(self) -> None:
+        # a cancel that reached another worker process only marked the job in the store
+        while True:
+            await asyncio.sleep(self.cancel_poll_interval)
+            if not self._running:
+                continue
+            try:
+                cancelled = await asyncio.to_thread(self.store.cancelled, list(self._running))
+            except sqlite3.Error as e:
+                logger.warning("Job cancel check failed: %s", e)
+                continue
+            for job_id in cancelled:
+                if job_id in self._running and job_id not in self._cancelled:
+                    logger.info("Job %s was cancelled through another worker, stopping it", job_id)
+                    self._stop(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize(),
+            "running": len(self._running),
+            "max_queued": self.max_queued,
+            "submitted": self.submitted.value,
+            "succeeded": self.succeeded.value,
+            "failed": self.failed.value,
+            "cancelled": self.cancelled.value,
+        }
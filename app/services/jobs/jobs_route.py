@@ -0,0 +1,45 @@
+from fastapi import APIRouter, HTTPException, Response
+from app.core.config import settings
+from app.services.ai_suggestion.ai_suggestion_route import suggestion
+from app.services.ai_suggestion.ai_suggestion_schema import ai_suggestion_request
+from .jobs import JobQueueFull, JobRunner, JobStore, FINISHED
+from .jobs_schema import job_status_response
+
+router = APIRouter()
+jobs = JobRunner(
+    JobStore(settings.JOBS_DB_PATH, ttl_seconds=settings.JOBS_RESULT_TTL_SECONDS),
+    suggestion,
+    workers=settings.JOBS_WORKERS,
+    max_queued=settings.JOBS_MAX_QUEUED,
+    cancel_poll_interval=settings.JOBS_CANCEL_POLL_SECONDS,
+)
+
+@router.post("/ai_suggestion/jobs", response_model=job_status_response, status_code=202)
+async def submit_ai_suggestion_job(request_data: ai_suggestion_request, response: Response):
+    """Queue an itinerary and return its job id at once; poll the job for the result."""
+    try:
+        job = await jobs.submit(request_data)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    response.headers["Location"] = f"/ai_suggestion/jobs/{job['job_id']}"
+    return job
+
+@router.get("/ai_suggestion/jobs/stats")
+async def get_job_stats():
+    return jobs.stats()
+
+@router.get("/ai_suggestion/jobs/{job_id}", response_model=job_status_response)
+async def get_ai_suggestion_job(job_id: str, response: Response):
+    job = await jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    if job["status"] not in FINISHED:
+        response.headers["Retry-After"] = "2"
+    return job
+
+@router.delete("/ai_suggestion/jobs/{job_id}", response_model=job_status_response)
+async def cancel_ai_suggestion_job(job_id: str):
+    job = await jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
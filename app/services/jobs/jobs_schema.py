@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+from typing import Any, Dict, Optional
+
+
+class job_status_response(BaseModel):
+    job_id: str
+    status: str
+    created_at: float
+    updated_at: float
+    expires_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
@@ -1,84 +1,386 @@
-import os
 import json
-import openai
-from dotenv import load_dotenv
+import time
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from app.core.cache import TTLCache, canonical_key
+from app.core.config import settings
+from app.core.deadline import deadline_var
+from app.core.json_stream import collect_stream
+from app.core.llm_backend import LLMBackend, create_backend
+from app.core.llm_scheduler import Priority, estimate_tokens, scheduler
+from app.core.llm_utils import parse_json
+from app.core.metrics import counter, histogram
+from app.core.model_router import model_router
+from app.core.streaming import drain_queue
+from app.core.tokens import stage as token_stage
+from app.core.tracing import span
+from app.core.venue_index import VenueIndex, search_terms
 from .regenerate_plan_schema import regenerate_plan_response, regenerate_plan_request
 
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+# alternatives per request, as REGENERATE_SYSTEM_PROMPT asks
+OPTIONS = 4
+
+# fixed text, so every request shares the prefix the provider caches;
+# the request's details go in the user message (`create_prompt`)
+REGENERATE_SYSTEM_PROMPT = """You are an expert travel planner. A traveler is searching for NEW activity suggestions to add to their day.
+
+The user message gives their USER SEARCH QUERY, DESTINATION, TRAVELERS, CURRENT DAY PLAN and USER TRAVEL INFO.
+
+INSTRUCTIONS:
+1. First determine which activity user want to replace based on their search query.
+2. Use web search to find activities at their destination that match the user's search query
+3. Suggest ONLY NEW activities that are NOT already in their current day plan
+4. All suggestions must be real places/activities
+5. Consider group size when making suggestions
+6. Generate exactly 4 alternative options for that exact time slot
+
+OUTPUT ONLY valid JSON exactly like this example:
+
+{
+"success": true,
+"data": {
+    "alternative_options": [
+    {
+        "option": 1,
+        "time": "9:30 AM",
+        "title": "Disneyland Paris",
+        "description": "Visit the magical Disneyland Paris theme park with attractions suitable for children of all ages. Wheelchair accessible rides available.",
+        "place": "Disneyland Paris",
+        "keyword": "entertainment"
+    },
+    ...................
+    ...................
+    {
+        "option": 4,
+        "time": "2:00 PM",
+        "title": "Seine River Cruise",
+        "description": "Enjoy a relaxing boat cruise along the Seine River, taking in iconic sights like the Eiffel Tower and Notre-Dame Cathedral. Suitable for all ages.",
+        "place": "Seine River",
+        "keyword": "sightseeing"}
+},
+"message": "Alternative activities generated successfully"
+}
+
+IMPORTANT: Use web search for real venues. Generate unique UUID for id. NO markdown, ONLY JSON."""
+
+
+def _norm(text: Any) -> str:
+    return " ".join(str(text or "").split()).lower()
+
+
+def _slot(activity: Dict[str, Any]) -> List[str]:
+    return [_norm(activity.get(field)) for field in ("time", "title", "place")]
+
+
+def match_slot(user_search: str, day_plan: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """The one activity of `day_plan` that `user_search` names by title or place, if exactly one."""
+    query = _norm(user_search)
+    matches = [
+        activity for activity in day_plan
+        if isinstance(activity, dict)
+        and any(name and name in query for name in (_norm(activity.get("title")), _norm(activity.get("place"))))
+    ]
+    return matches[0] if len(matches) == 1 else None
+
+
+def prefetch_key(destination: Any, day_plan: List[Dict[str, Any]], activity: Dict[str, Any]) -> str:
+    return canonical_key({
+        "destination": destination or "",
+        "day": [_slot(a) for a in day_plan if isinstance(a, dict)],
+        "slot": _slot(activity),
+    })
+
 
 class RegeneratePlan:
-    def __init__(self):
-        self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    
-    def regenerate_plan(self, input_data: regenerate_plan_request) -> regenerate_plan_response:     
-        prompt = self.create_prompt(input_data)
-        response = self.get_openai_response(prompt, str(input_data.dict()))
+    """Alternative activities for one slot of a day plan.
+
+    With a `prefetch` cache, `schedule_prefetch` precomputes alternatives
+    for every activity of a freshly generated itinerary at BACKGROUND
+    priority; a later request that names one of those activities and asks
+    for nothing more is answered from the cache without an upstream call.
+
+    With a `venues` index, alternatives the LLM suggests are recorded in it,
+    and a request for which it has OPTIONS confident matches (distinct
+    venues of the destination, not already in the day plan, matching every
+    word of the search) is answered from it instead of the LLM.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 2,
+        backend: Optional[LLMBackend] = None,
+        prefetch: Optional[TTLCache] = None,
+        venues: Optional[VenueIndex] = None,
+    ):
+        self.backend = backend or create_backend()
+        self.max_retries = max_retries
+        self.prefetch = prefetch
+        self.venues = venues
+        self._prefetching: Dict[str, "asyncio.Task[None]"] = {}
+        self.prefetch_scheduled = counter("regenerate_prefetch_scheduled_total", "Background regenerate calls started")
+        self.prefetch_dropped = counter("regenerate_prefetch_dropped_total", "Prefetch slots skipped because the backlog was full")
+        self.prefetch_hits = counter("regenerate_prefetch_hits_total", "Regenerate requests served from prefetched alternatives")
+        self.prefetch_misses = counter("regenerate_prefetch_misses_total", "Regenerate requests with no prefetched alternatives")
+        self.index_hits = counter("regenerate_index_hits_total", "Regenerate requests answered from the local venue index")
+        self.index_misses = counter("regenerate_index_misses_total", "Regenerate requests the venue index could not answer")
+        self.request_seconds = histogram("itinerary_request_duration_seconds", "Itinerary generation time by path")
+
+    async def regenerate_plan(self, input_data: regenerate_plan_request) -> regenerate_plan_response:
+        started = time.perf_counter()
+        path = "regenerate"
         try:
-            response_json = json.loads(response)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Failed to parse OpenAI response as JSON: {e}")
-        return regenerate_plan_response(**response_json)
-    
-    def create_prompt(self, input_data: regenerate_plan_request) -> str:
-        return f"""You are an expert travel planner. A traveler is searching for NEW activity suggestions to add to their day.
+            cached = self._prefetched(input_data)
+            if cached is None:
+                cached = await self._indexed(input_data)
+                if cached is not None:
+                    path = "regenerate_index"
+            if cached is None:
+                cached = await self._generate(input_data, Priority.INTERACTIVE)
+            with span("validate", kind="regenerate"):
+                return regenerate_plan_response(**cached)
+        finally:
+            self.request_seconds.observe(time.perf_counter() - started, path=path)
 
-    USER SEARCH QUERY:
-    {input_data.user_search}
+    async def _generate(self, input_data: regenerate_plan_request, priority: Priority) -> dict:
+        with span("prompt_build", kind="regenerate"):
+            prompt = self.create_prompt(input_data)
+        response = await self._call_with_retries(
+            lambda model: self.get_openai_response(REGENERATE_SYSTEM_PROMPT, prompt, model),
+            priority=priority,
+            tokens=estimate_tokens(REGENERATE_SYSTEM_PROMPT, prompt, completion=600),
+            stage="regenerate_prefetch" if priority is Priority.BACKGROUND else "regenerate",
+        )
+        with span("parse", kind="regenerate"):
+            try:
+                parsed = self.parse_json(response)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Failed to parse OpenAI response as JSON: {e}")
+        data = parsed.get("data") if isinstance(parsed, dict) else None
+        if isinstance(data, dict) and isinstance(data.get("alternative_options"), list):
+            await self._remember(input_data, data["alternative_options"])
+        return parsed
 
-    CURRENT DAY PLAN:
-    {input_data.day_plan}
-    
+    async def _indexed(self, input_data: regenerate_plan_request) -> Optional[dict]:
+        """Alternatives from the venue index, or None when it has too few confident matches."""
+        if self.venues is None:
+            return None
+        destination = input_data.user_info.get("destination")
+        activity = match_slot(input_data.user_search, input_data.day_plan)
+        # the destination and the activity being replaced say nothing about what is wanted
+        ignore = [destination]
+        if activity is not None:
+            ignore += [activity.get("title"), activity.get("place")]
+        terms = search_terms(input_data.user_search, ignore)
+        # "alternatives to X" and nothing more: other venues of X's kind
+        keyword = activity.get("keyword") if activity is not None and not terms else None
+        found: List[dict] = []
+        if destination and (terms or keyword):
+            with span("index_lookup", terms=len(terms)):
+                found = await self.venues.search(
+                    destination,
+                    terms,
+                    keyword=keyword,
+                    exclude=[a.get(field) for a in input_data.day_plan if isinstance(a, dict) for field in ("title", "place")],
+                    limit=OPTIONS,
+                )
+        if len(found) < OPTIONS:
+            self.index_misses.inc()
+            return None
+        self.index_hits.inc()
+        slot_time = activity.get("time") if activity is not None else None
+        options = [
+            {"option": n, **venue, "time": slot_time or venue["time"]}
+            for n, venue in enumerate(found, start=1)
+        ]
+        return {"success": True, "data": {"alternative_options": options}, "message": "Alternative activities generated successfully"}
+
+    async def _remember(self, input_data: regenerate_plan_request, options: List[Any]) -> None:
+        if self.venues is not None:
+            await self.venues.add(input_data.user_info.get("destination"), [o for o in options if isinstance(o, dict)])
+
+    async def index_stats(self) -> Dict[str, Any]:
+        lookups = self.index_hits.value + self.index_misses.value
+        return {
+            **await self.venues.stats(),
+            "hits": self.index_hits.value,
+            "misses": self.index_misses.value,
+            "hit_rate": round(self.index_hits.value / lookups, 4) if lookups else None,
+        }
+
+    def _prefetched(self, input_data: regenerate_plan_request) -> Optional[dict]:
+        if self.prefetch is None:
+            return None
+        destination = input_data.user_info.get("destination")
+        activity = match_slot(input_data.user_search, input_data.day_plan)
+        cached = None
+        # prefetched alternatives answer "alternatives to X" only; a search that
+        # also asks for something ("X but indoors") goes to the LLM
+        if activity is not None and not search_terms(
+            input_data.user_search, [destination, activity.get("title"), activity.get("place")]
+        ):
+            cached = self.prefetch.get(prefetch_key(destination, input_data.day_plan, activity))
+        if cached is None:
+            self.prefetch_misses.inc()
+        else:
+            self.prefetch_hits.inc()
+        return cached
+
+    def schedule_prefetch(self, user_info: Dict[str, Any], days: List[Dict[str, Any]]) -> int:
+        """Queue background alternatives for the activities of `days`; returns how many were queued.
+
+        Up to REGENERATE_PREFETCH_MAX_SLOTS activities per itinerary, earliest
+        days first; slots already cached or in progress are skipped, and
+        nothing new is queued while REGENERATE_PREFETCH_MAX_PENDING are.
+        """
+        if self.prefetch is None:
+            return 0
+        queued = 0
+        for day in days:
+            day_plan = [a for a in day.get("activities", []) if isinstance(a, dict)]
+            for activity in day_plan:
+                if queued >= settings.REGENERATE_PREFETCH_MAX_SLOTS:
+                    return queued
+                key = prefetch_key(user_info.get("destination"), day_plan, activity)
+                if key in self._prefetching or self.prefetch.get(key) is not None:
+                    continue
+                if len(self._prefetching) >= settings.REGENERATE_PREFETCH_MAX_PENDING:
+                    self.prefetch_dropped.inc()
+                    continue
+                request = regenerate_plan_request(
+                    user_search=f"Alternatives to {activity.get('title', '')} at {activity.get('time', '')}",
+                    day_plan=day_plan,
+                    user_info=user_info,
+                )
+                task = asyncio.ensure_future(self._prefetch_one(key, request))
+                self._prefetching[key] = task
+                task.add_done_callback(lambda _, key=key: self._prefetching.pop(key, None))
+                self.prefetch_scheduled.inc()
+                queued += 1
+        return queued
+
+    def prefetch_stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self.prefetch),
+            "pending": len(self._prefetching),
+            "scheduled": self.prefetch_scheduled.value,
+            "dropped": self.prefetch_dropped.value,
+            "hits": self.prefetch_hits.value,
+            "misses": self.prefetch_misses.value,
+        }
+
+    def cancel_prefetch(self) -> None:
+        for task in list(self._prefetching.values()):
+            task.cancel()
+
+    async def _prefetch_one(self, key: str, request: regenerate_plan_request) -> None:
+        # background work: not bound by the deadline of the request that scheduled it
+        deadline_var.set(None)
+        try:
+            response = await self._generate(request, Priority.BACKGROUND)
+            regenerate_plan_response(**response)
+        except Exception as e:
+            logger.info("Regenerate prefetch failed: %s", e)
+            return
+        self.prefetch.set(key, response)
+
+    async def stream_alternatives(self, input_data: regenerate_plan_request) -> AsyncIterator[dict]:
+        """Yield an `option` event per alternative as soon as it streams in, then `complete`."""
+        cached = self._prefetched(input_data)
+        if cached is None:
+            cached = await self._indexed(input_data)
+        if cached is not None:
+            options = cached.get("data", {}).get("alternative_options", [])
+            for option in options:
+                yield {"event": "option", "option": option}
+            yield {"event": "complete", "success": True, "message": cached.get("message") or "Alternative activities generated successfully", "total_options": len(options)}
+            return
 
-    USER TRAVEL INFO:
-    {input_data.user_info}
-
-    DESTINATION: {input_data.user_info.get("destination", "Unknown")}
-    TRAVELERS: {input_data.user_info.get("total_adults", "N/A")} adults, {input_data.user_info.get("total_children", "N/A")} children
-
-    INSTRUCTIONS:
-    1.First determine which activity user want to replace based on their search query.
-    2. Use web search to find activities in {input_data.user_info.get("destination", "Unknown")} that match the user's search query
-    3. Suggest ONLY NEW activities that are NOT already in their current day plan
-    4. All suggestions must be real places/activities
-    5. Consider group size when making suggestions
-    6. Generate exactly 4 alternative options for that exact time slot
-
-    OUTPUT ONLY valid JSON exactly like this example:
-
-    {{
-    "success": true,
-    "data": {{
-        "alternative_options": [
-        {{
-            "option": 1,
-            "time": "9:30 AM",
-            "title": "Disneyland Paris",
-            "description": "Visit the magical Disneyland Paris theme park with attractions suitable for children of all ages. Wheelchair accessible rides available.",
-            "place": "Disneyland Paris",
-            "keyword": "entertainment"
-        }},
-        ...................
-        ...................
-        {{
-            "option": 4,
-            "time": "2:00 PM",
-            "title": "Seine River Cruise",
-            "description": "Enjoy a relaxing boat cruise along the Seine River, taking in iconic sights like the Eiffel Tower and Notre-Dame Cathedral. Suitable for all ages.",
-            "place": "Seine River",
-            "keyword": "sightseeing"}}
-    }},
-    "message": "Alternative activities generated successfully"
-    }}
-
-    IMPORTANT: Use web search for real venues. Generate unique UUID for id. NO markdown, ONLY JSON."""
+        with span("prompt_build", kind="regenerate"):
+            prompt = self.create_prompt(input_data)
+        queue: "asyncio.Queue[dict]" = asyncio.Queue()
+        seen: set = set()
+        streamed: List[dict] = []
 
+        def emit(option: Any) -> None:
+            if not isinstance(option, dict):
+                return
+            marker = option.get("option", json.dumps(option, sort_keys=True))
+            if marker not in seen:
+                seen.add(marker)
+                streamed.append(option)
+                queue.put_nowait({"event": "option", "option": option})
 
+        call = asyncio.ensure_future(self._call_with_retries(
+            lambda model: collect_stream(self.stream_openai_response(REGENERATE_SYSTEM_PROMPT, prompt, model), "alternative_options", emit),
+            priority=Priority.INTERACTIVE,
+            tokens=estimate_tokens(REGENERATE_SYSTEM_PROMPT, prompt, completion=600),
+        ))
+        try:
+            async for event in drain_queue(queue, [call]):
+                yield event
+            raw = call.result()
+        finally:
+            call.cancel()
+
+        message = "Alternative activities generated successfully"
+        try:
+            parsed = self.parse_json(raw)
+            for option in parsed.get("data", {}).get("alternative_options", []):
+                emit(option)
+            message = parsed.get("message") or message
+        except (json.JSONDecodeError, AttributeError) as e:
+            if not seen:
+                raise ValueError(f"Failed to parse OpenAI response as JSON: {e}")
+            logger.warning("Regenerate JSON incomplete (%s); keeping %d streamed options", e, len(seen))
+        while not queue.empty():
+            yield queue.get_nowait()
+        await self._remember(input_data, streamed)
+        yield {"event": "complete", "success": True, "message": message, "total_options": len(seen)}
     
-    def get_openai_response(self, prompt: str, data: str) -> str:
-        completion = self.client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "system", "content": prompt}, {"role": "user", "content": data}],
+    def create_prompt(self, input_data: regenerate_plan_request) -> str:
+        """Per-request half of the prompt; the instructions are REGENERATE_SYSTEM_PROMPT."""
+        user_info = input_data.user_info
+        return f"""USER SEARCH QUERY:
+{input_data.user_search}
+
+DESTINATION: {user_info.get("destination", "Unknown")}
+TRAVELERS: {user_info.get("total_adults", "N/A")} adults, {user_info.get("total_children", "N/A")} children
+
+CURRENT DAY PLAN:
+{json.dumps(input_data.day_plan, ensure_ascii=False)}
+
+USER TRAVEL INFO:
+{json.dumps(user_info, ensure_ascii=False)}"""
+
+    async def get_openai_response(self, system_prompt: str, user_prompt: str, model: str) -> str:
+        return await self.backend.complete(
+            model=model,
+            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
             temperature=0.7            
         )
-        raw_content = completion.choices[0].message.content.strip()
-        return raw_content
\ No newline at end of file
+
+    async def stream_openai_response(self, system_prompt: str, user_prompt: str, model: str) -> AsyncIterator[str]:
+        async for piece in self.backend.stream(
+            model=model,
+            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+            temperature=0.7
+        ):
+            yield piece
+
+    async def _call_with_retries(
+        self, func: Callable[[str], Any], priority: Priority = Priority.INTERACTIVE, tokens: int = 0, stage: str = "regenerate"
+    ) -> Any:
+        """Run `func(model)` for the regenerate model; `stage` only labels the tokens."""
+        with span("upstream", priority=priority.name, llm_stage=stage), token_stage(stage):
+            return await model_router.run(
+                "regenerate",
+                func,
+                lambda attempt: scheduler.run(attempt, priority=priority, tokens=tokens, max_retries=self.max_retries),
+            )
+
+    def parse_json(self, raw: str) -> Any:
+        return parse_json(raw)
@@ -1,15 +1,61 @@
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Header
+from app.core.admission import Overloaded, admission
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.deadline import DeadlineExceeded
+from app.core.json_codec import ModelResponse
+from app.core.streaming import event_stream_response
+from app.core.venue_index import VenueIndex
 from .regenerate_plan import RegeneratePlan
 from .regenerate_plan_schema import regenerate_plan_response, regenerate_plan_request
 
 router = APIRouter()
-regenerate_plan = RegeneratePlan()
+prefetch_cache = TTLCache(
+    "regenerate_prefetch",
+    max_entries=settings.REGENERATE_PREFETCH_MAX_ENTRIES,
+    ttl_seconds=settings.REGENERATE_PREFETCH_TTL_SECONDS,
+) if settings.REGENERATE_PREFETCH_ENABLED else None
+# shared with /ai_suggestion, whose itineraries fill it
+venue_index = VenueIndex(
+    settings.VENUE_INDEX_DB_PATH,
+    ttl_seconds=settings.VENUE_INDEX_TTL_SECONDS,
+) if settings.VENUE_INDEX_ENABLED else None
+regenerate_plan = RegeneratePlan(prefetch=prefetch_cache, venues=venue_index)
 
 @router.post("/regenerate_plan", response_model=regenerate_plan_response)
 async def get_regenerated_plan(request_data: regenerate_plan_request):
     try:
-        response = regenerate_plan.regenerate_plan(request_data)
-        return response
-    
+        async with admission.slot(1):
+            response = await regenerate_plan.regenerate_plan(request_data)
+        return ModelResponse(response)
+
+    except HTTPException:
+        # the service's own 4xx/5xx, passed through as they are
+        raise
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/regenerate_plan/stream")
+async def stream_regenerated_plan(request_data: regenerate_plan_request, accept: str = Header("application/x-ndjson")):
+    """Stream each alternative option as NDJSON (default) or SSE (`Accept: text/event-stream`)."""
+    try:
+        ticket = await admission.enter(1)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return event_stream_response(ticket.hold_while(regenerate_plan.stream_alternatives(request_data)), accept)
+
+@router.get("/regenerate_plan/prefetch/stats")
+async def get_prefetch_stats():
+    if prefetch_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **regenerate_plan.prefetch_stats()}
+
+@router.get("/regenerate_plan/index/stats")
+async def get_venue_index_stats():
+    if venue_index is None:
+        return {"enabled": False}
+    return {"enabled": True, **await regenerate_plan.index_stats()}
@@ -0,0 +1,137 @@
+"""Throughput of a batch of itineraries: one `AISuggestion.get_suggestion` call
+after another versus `BatchRunner` (deduplicated items, shared outlines,
+bounded pool).
+
+The batch mixes short and long trips over a few destinations, with a share of
+exact repeats; it runs against the stub backend with fixed latencies and no
+itinerary cache, so the difference is the scheduling and the calls saved.
+
+    python benchmarks/batch_throughput.py --items 40 --duplicates 0.25 --concurrency 4
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+from app.core.cache import TTLCache
+from app.core.llm_stub import StubBackend, StubConfig
+from app.services.ai_suggestion.ai_suggestion import AISuggestion
+from app.services.ai_suggestion.ai_suggestion_schema import ai_suggestion_request
+from app.services.batch.batch import BatchRunner
+
+DESTINATIONS = [("Lisbon, Portugal", "Lisbon"), ("Kyoto, Japan", "Kyoto"), ("Denver, USA", "Colorado")]
+TRIP_DAYS = [3, 7, 10]
+
+
+def make_request(destination: tuple, days: int, adults: int) -> ai_suggestion_request:
+    start = datetime.date(2025, 6, 1)
+    return ai_suggestion_request(
+        total_adults=adults,
+        total_children=0,
+        destination=destination[0],
+        destination_state=destination[1],
+        location="",
+        departure_date=start.isoformat(),
+        return_date=(start + datetime.timedelta(days=days - 1)).isoformat(),
+        amenities=["wifi"],
+        activities=["museums", "sightseeing"],
+        pacing=["balanced"],
+        food=["local cuisine"],
+        special_note="",
+    )
+
+
+def make_batch(args: argparse.Namespace) -> list:
+    """Items differing in party size (so they share outlines, not results), plus exact repeats."""
+    rng = random.Random(args.seed)
+    items = []
+    for n in range(args.items):
+        if items and rng.random() < args.duplicates:
+            items.append(rng.choice(items))
+        else:
+            items.append(make_request(rng.choice(DESTINATIONS), rng.choice(TRIP_DAYS), adults=1 + n % 4))
+    return items
+
+
+def make_service(config: StubConfig) -> AISuggestion:
+    return AISuggestion(
+        backend=StubBackend(config),
+        outline_cache=TTLCache("bench_outline_cache", max_entries=256, ttl_seconds=3600),
+    )
+
+
+async def run_sequential(items: list, config: StubConfig) -> dict:
+    service = make_service(config)
+    started = time.perf_counter()
+    for item in items:
+        await service.get_suggestion(item, admit=False)
+    return {"seconds": time.perf_counter() - started, "calls": dict(service.backend.calls)}
+
+
+async def run_batch(items: list, config: StubConfig, concurrency: int) -> dict:
+    service = make_service(config)
+    runner = BatchRunner(service, concurrency=concurrency)
+    started = time.perf_counter()
+    summary = {}
+    async for event in runner.run(items):
+        if event["event"] == "complete":
+            summary = event
+    assert summary.get("succeeded") == len(items), f"batch items failed: {summary}"
+    return {"seconds": time.perf_counter() - started, "calls": dict(service.backend.calls)}
+
+
+async def run(args: argparse.Namespace) -> dict:
+    config = StubConfig(
+        latency_dist="fixed",
+        latency_mean=args.first_token,
+        latency_per_item=args.per_day,
+        seed=args.seed,
+    )
+    items = make_batch(args)
+    results = {
+        "sequential": await run_sequential(items, config),
+        "batch": await run_batch(items, config, args.concurrency),
+    }
+    report = {}
+    for name, r in results.items():
+        report[name] = {
+            "seconds": round(r["seconds"], 3),
+            "items_per_s": round(len(items) / r["seconds"], 2),
+            "upstream_calls": sum(r["calls"].values()),
+            "calls_by_kind": r["calls"],
+        }
+    return {
+        "config": {
+            "items": len(items),
+            "unique": len({item.model_dump_json() for item in items}),
+            "concurrency": args.concurrency,
+            "first_token_s": args.first_token,
+            "per_item_s": args.per_day,
+        },
+        **report,
+        "speedup": round(results["sequential"]["seconds"] / results["batch"]["seconds"], 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=40)
+    parser.add_argument("--duplicates", type=float, default=0.25, help="share of items repeating an earlier one")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--first-token", type=float, default=0.2, help="stub time to first token, seconds")
+    parser.add_argument("--per-day", type=float, default=0.02, help="stub time per generated item, seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
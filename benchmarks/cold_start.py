@@ -0,0 +1,140 @@
+"""Cold start and upstream connection reuse, with and without pool warm-up.
+
+For each mode this starts `uvicorn main:app` against the HTTP stub LLM
+(itinerary cache off, fresh data directory) and measures:
+
+- time from process launch to the app answering /health, and to the first
+  successful /ai_suggestion response
+- the latency of that first itinerary request on its own
+- after replaying `--total` more requests: upstream connections opened
+  versus HTTP requests sent (`/upstream/stats`)
+
+The stub speaks plain HTTP on localhost, so connection setup is cheap
+here; against a TLS endpoint (`--base-url`, with OPENAI_API_KEY set) the
+warm-up saves the handshake round trips as well.
+
+    python benchmarks/cold_start.py --warmup 0 4 --total 100 --concurrency 16
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from typing import Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+
+from load_test import load_requests, replay, summarize
+from worker_scaling import free_port, start, stop, wait_ready
+
+
+async def first_success(client: httpx.AsyncClient, entry: dict, timeout: float) -> float:
+    """Seconds until `entry` first gets a 200."""
+    started = time.perf_counter()
+    while True:
+        try:
+            response = await client.post(entry["endpoint"], json=entry["body"], timeout=timeout)
+            if response.status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.05)
+
+
+async def measure(warmup: int, base_url: str, requests: list, args: argparse.Namespace) -> dict:
+    port = free_port()
+    data = tempfile.mkdtemp(prefix="vacay-bench-")
+    launched = time.perf_counter()
+    app = start(
+        ["-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        {
+            "LLM_BACKEND": "openai",
+            "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "stub"),
+            "OPENAI_BASE_URL": base_url,
+            "UPSTREAM_WARMUP_CONNECTIONS": str(warmup),
+            "UPSTREAM_HTTP2": "true" if args.http2 else "false",
+            "JOBS_DB_PATH": os.path.join(data, "jobs.sqlite3"),
+            "SUGGESTION_CACHE_ENABLED": "false",
+        },
+    )
+    try:
+        await wait_ready(f"http://127.0.0.1:{port}/health", timeout=60)
+        ready = time.perf_counter() - launched
+        first = [e for e in requests if e["endpoint"] == "/ai_suggestion"][0]
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+            first_request = await first_success(client, first, args.timeout)
+            to_first_success = time.perf_counter() - launched
+            results, elapsed = await replay(client, requests, args.total, args.concurrency, args.timeout)
+            pool = (await client.get("/upstream/stats")).json()
+    finally:
+        stop(app)
+
+    statuses = {}
+    for _, _, status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    return {
+        "ready_s": round(ready, 3),
+        "first_request_s": round(first_request, 4),
+        "to_first_success_s": round(to_first_success, 3),
+        "replay": summarize([r[3] for r in results], statuses, elapsed),
+        "upstream_connections_opened": pool["connections_opened"],
+        "upstream_requests": pool["requests"],
+        "connection_reuse_rate": pool["reuse_rate"],
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    requests, skipped = load_requests(args.requests)
+    stub: Optional[object] = None
+    base_url = args.base_url
+    if base_url is None:
+        stub_port = free_port()
+        stub = start(
+            ["-m", "app.core.llm_stub", "--port", str(stub_port), "--latency-dist", "fixed",
+             "--latency-mean", str(args.latency_mean)],
+            {},
+        )
+        base_url = f"http://127.0.0.1:{stub_port}/v1"
+        await wait_ready(f"http://127.0.0.1:{stub_port}/stats")
+    try:
+        results = {}
+        for warmup in args.warmup:
+            results[f"warmup_{warmup}"] = await measure(warmup, base_url, requests, args)
+    finally:
+        if stub is not None:
+            stop(stub)
+    return {
+        "config": {
+            "base_url": base_url,
+            "requests_file": args.requests,
+            "skipped_lines": skipped,
+            "total": args.total,
+            "concurrency": args.concurrency,
+            "latency_mean": args.latency_mean,
+            "http2": args.http2,
+        },
+        "modes": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", default=os.path.join(ROOT, "benchmarks", "request_mix.jsonl"))
+    parser.add_argument("--warmup", type=int, nargs="+", default=[0, 4], help="UPSTREAM_WARMUP_CONNECTIONS values to compare")
+    parser.add_argument("--base-url", help="upstream chat-completions base URL (default: a local stub server)")
+    parser.add_argument("--http2", action="store_true")
+    parser.add_argument("--total", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-mean", type=float, default=0.05, help="stub time to first token, seconds")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
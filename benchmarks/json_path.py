@@ -0,0 +1,161 @@
+"""CPU time and allocations of the JSON path from LLM completion to response body.
+
+Payloads are itineraries of `--days` days rendered by the stub backend, as
+pretty-printed JSON (the way models write it) and wrapped in a ```json
+fence. Each is taken through three stages, the way the service did before
+and does now:
+
+- parse: `clean_json` (validity check, fence strip, extraction) followed by
+  the caller's `json.loads`, versus one `parse_json`
+- validate: `ai_suggestion_response` with an untyped `data` field, versus
+  the typed itinerary models
+- serialize: FastAPI's handling of a returned model (validate again against
+  `response_model`, dump, `json.dumps`), versus `ModelResponse` rendering
+  it directly
+
+CPU time is `time.process_time` per call over `--iterations` runs; memory
+is the tracemalloc peak of one call and the blocks it allocated.
+
+    python benchmarks/json_path.py --days 5 10 20 30 --iterations 200
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from typing import Any, Callable, Dict, List, Union
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+from pydantic import BaseModel
+
+from app.core import json_codec
+from app.core.json_codec import ModelResponse
+from app.core.llm_stub import render_completion
+from app.core.llm_utils import parse_json
+from app.services.ai_suggestion.ai_suggestion_schema import ai_suggestion_response
+
+
+class untyped_response(BaseModel):
+    """`ai_suggestion_response` as it was, with `data` left untyped."""
+    success: bool
+    message: str
+    data: Union[str, List[Dict], Dict[str, Any]]
+
+
+def clean_json(raw: str) -> str:
+    """The previous extraction: a full parse just to check validity, then one on the extracted span."""
+    try:
+        json.loads(raw)
+        return raw
+    except Exception:
+        pass
+    if raw.startswith("```json"):
+        raw = raw[len("```json"):].strip()
+    elif raw.startswith("```"):
+        raw = raw[len("```"):].strip()
+    start = raw.find("{")
+    end = raw.rfind("}")
+    if start != -1 and end != -1 and end > start:
+        candidate = raw[start : end + 1]
+        try:
+            json.loads(candidate)
+            return candidate
+        except Exception:
+            pass
+    return raw
+
+
+def fastapi_serialize(response: BaseModel) -> bytes:
+    """What FastAPI does with a model returned under `response_model`."""
+    revalidated = type(response).model_validate(response.model_dump())
+    return json.dumps(
+        revalidated.model_dump(mode="json"), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode()
+
+
+def make_completion(days: int, seed: int) -> str:
+    prompt = (
+        "TRAVEL DETAILS:\n"
+        f"- Trip Duration: {days} days\n"
+        "- Destination: Kyōto, Japan\n"
+        "- Departure Date: 2025-06-01"
+    )
+    _, payload = render_completion([{"role": "user", "content": prompt}], random.Random(seed))
+    return "```json\n" + json.dumps(payload, ensure_ascii=False, indent=2) + "\n```"
+
+
+def measure(fn: Callable[[], Any], iterations: int) -> Dict[str, float]:
+    fn()  # warm up
+    started = time.process_time()
+    for _ in range(iterations):
+        fn()
+    cpu = (time.process_time() - started) / iterations
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del result
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    return {"cpu_us": round(cpu * 1e6, 1), "peak_kib": round(peak / 1024, 1), "blocks": blocks}
+
+
+def bench(days: int, args: argparse.Namespace) -> dict:
+    raw = make_completion(days, args.seed)
+    parsed = parse_json(raw)
+    data = parsed["data"]
+    message = parsed["message"]
+    old_response = untyped_response(success=True, message=message, data=data)
+    new_response = ai_suggestion_response(success=True, message=message, data=data)
+    assert type(new_response.data).__name__ == "itinerary_data", "payload did not fit the typed models"
+
+    stages = {
+        "parse": (
+            lambda: json.loads(clean_json(raw)),
+            lambda: parse_json(raw),
+        ),
+        "validate": (
+            lambda: untyped_response(success=True, message=message, data=data),
+            lambda: ai_suggestion_response(success=True, message=message, data=data),
+        ),
+        "serialize": (
+            lambda: fastapi_serialize(old_response),
+            lambda: ModelResponse(new_response).body,
+        ),
+    }
+    result: Dict[str, Any] = {"completion_kib": round(len(raw.encode()) / 1024, 1)}
+    totals = {"before": 0.0, "after": 0.0}
+    for name, (before, after) in stages.items():
+        result[name] = {"before": measure(before, args.iterations), "after": measure(after, args.iterations)}
+        for side in totals:
+            totals[side] += result[name][side]["cpu_us"]
+    result["total_cpu_us"] = {side: round(value, 1) for side, value in totals.items()}
+    result["speedup"] = round(totals["before"] / totals["after"], 2) if totals["after"] else None
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, nargs="+", default=[5, 10, 20, 30])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    report = {
+        "config": {"iterations": args.iterations, "json_backend": json_codec.BACKEND},
+        "days": {str(days): bench(days, args) for days in args.days},
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
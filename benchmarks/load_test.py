@@ -0,0 +1,274 @@
+"""Replay a recorded request mix against the API and report latency/throughput.
+
+Targets:
+- in-process (default): drives `main.app` through httpx's ASGI transport,
+  with the stub LLM backend configured from the CLI flags
+- a running server: `--target http://localhost:9073` (start it with
+  `LLM_BACKEND=stub`, or point it at `python -m app.core.llm_stub` and pass
+  `--stub-url` so upstream call counts can be collected)
+
+Each line of the request file is `{"endpoint": "/ai_suggestion", "body": {...}}`.
+Lines that are not in that shape are skipped and counted.
+
+    python benchmarks/load_test.py --requests benchmarks/request_mix.jsonl \\
+        --total 200 --concurrency 20 --latency-mean 0.5 --output run.json
+    python benchmarks/load_test.py ... --baseline run.json   # exit 1 on regression
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import datetime
+import resource
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+
+
+def load_requests(path: str) -> Tuple[List[dict], int]:
+    requests, skipped = [], 0
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                skipped += 1
+                continue
+            if isinstance(entry, dict) and isinstance(entry.get("endpoint"), str) and isinstance(entry.get("body"), dict):
+                requests.append(entry)
+            else:
+                skipped += 1
+    return requests, skipped
+
+
+def classify(entry: dict) -> str:
+    """Which service path a request exercises: short, long or regenerate."""
+    if entry["endpoint"].startswith("/regenerate_plan"):
+        return "regenerate"
+    body = entry["body"]
+    try:
+        dep = datetime.date.fromisoformat(body["departure_date"])
+        ret = datetime.date.fromisoformat(body["return_date"])
+    except (KeyError, ValueError):
+        return "invalid"
+    return "short" if (ret - dep).days + 1 <= 4 else "long"
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(latencies: List[float], statuses: Dict[int, int], elapsed: float) -> dict:
+    return {
+        "count": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else None,
+        "p50_s": _round(percentile(latencies, 50)),
+        "p95_s": _round(percentile(latencies, 95)),
+        "p99_s": _round(percentile(latencies, 99)),
+        "max_s": _round(max(latencies) if latencies else None),
+        "status": {str(k): v for k, v in sorted(statuses.items())},
+    }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 4) if value is not None else None
+
+
+def configure_stub_env(args: argparse.Namespace) -> None:
+    """Must run before `main` is imported: settings are read at import time."""
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    os.environ["STUB_LATENCY_DIST"] = args.latency_dist
+    os.environ["STUB_LATENCY_MEAN"] = str(args.latency_mean)
+    os.environ["STUB_LATENCY_STDDEV"] = str(args.latency_stddev)
+    os.environ["STUB_LATENCY_PER_ITEM"] = str(args.latency_per_item)
+    os.environ["STUB_ERROR_RATE"] = str(args.error_rate)
+    os.environ["STUB_MALFORMED_RATE"] = str(args.malformed_rate)
+    os.environ["SUGGESTION_CACHE_ENABLED"] = "true" if args.with_cache else "false"
+
+
+def inprocess_upstream_calls() -> Dict[str, int]:
+    from app.services.ai_suggestion.ai_suggestion_route import suggestion
+    from app.services.regenerate_plan.regenerate_plan_route import regenerate_plan
+
+    calls: Dict[str, int] = defaultdict(int)
+    for service in (suggestion, regenerate_plan):
+        for kind, n in getattr(service.backend, "calls", {}).items():
+            calls[kind] += n
+    return dict(calls)
+
+
+async def remote_upstream_calls(stub_url: Optional[str]) -> Optional[Dict[str, int]]:
+    if not stub_url:
+        return None
+    async with httpx.AsyncClient() as client:
+        response = await client.get(stub_url.rstrip("/") + "/stats")
+        return response.json().get("calls", {})
+
+
+async def replay(client: httpx.AsyncClient, requests: List[dict], total: int, concurrency: int, timeout: float) -> Tuple[list, float]:
+    results: List[Tuple[str, str, int, float]] = []
+    queue: "asyncio.Queue[dict]" = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(requests[i % len(requests)])
+
+    async def worker() -> None:
+        while True:
+            try:
+                entry = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                response = await client.post(entry["endpoint"], json=entry["body"], timeout=timeout)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            results.append((entry["endpoint"], classify(entry), status, time.perf_counter() - started))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results, time.perf_counter() - started
+
+
+def build_report(args: argparse.Namespace, results: list, elapsed: float, upstream: Optional[Dict[str, int]], skipped: int) -> dict:
+    groups: Dict[str, Dict[str, Any]] = {"overall": {}, "endpoint": defaultdict(list), "path": defaultdict(list)}
+    statuses: Dict[str, Dict[str, Dict[int, int]]] = {"endpoint": defaultdict(lambda: defaultdict(int)), "path": defaultdict(lambda: defaultdict(int))}
+    all_latencies, all_statuses = [], defaultdict(int)
+    for endpoint, path, status, latency in results:
+        all_latencies.append(latency)
+        all_statuses[status] += 1
+        groups["endpoint"][endpoint].append(latency)
+        groups["path"][path].append(latency)
+        statuses["endpoint"][endpoint][status] += 1
+        statuses["path"][path][status] += 1
+
+    report = {
+        "config": {
+            "target": args.target,
+            "requests_file": args.requests,
+            "skipped_lines": skipped,
+            "total": args.total,
+            "concurrency": args.concurrency,
+            "latency_dist": args.latency_dist,
+            "latency_mean": args.latency_mean,
+            "latency_stddev": args.latency_stddev,
+            "latency_per_item": args.latency_per_item,
+            "error_rate": args.error_rate,
+            "malformed_rate": args.malformed_rate,
+            "with_cache": args.with_cache,
+        },
+        "elapsed_s": round(elapsed, 4),
+        "overall": summarize(all_latencies, all_statuses, elapsed),
+        "by_endpoint": {k: summarize(v, statuses["endpoint"][k], elapsed) for k, v in sorted(groups["endpoint"].items())},
+        "by_path": {k: summarize(v, statuses["path"][k], elapsed) for k, v in sorted(groups["path"].items())},
+        "upstream_calls": upstream,
+        "upstream_calls_per_request": (
+            round(sum(upstream.values()) / len(results), 3) if upstream is not None and results else None
+        ),
+        "memory": {"max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss},
+    }
+    return report
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Regressions of `report` against `baseline` beyond `tolerance` (fractional)."""
+    problems = []
+    for scope in ("by_endpoint", "by_path"):
+        for name, current in report.get(scope, {}).items():
+            previous = baseline.get(scope, {}).get(name)
+            if not previous:
+                continue
+            for metric in ("p50_s", "p95_s", "p99_s"):
+                if previous.get(metric) and current.get(metric) and current[metric] > previous[metric] * (1 + tolerance):
+                    problems.append(f"{scope}.{name}.{metric}: {previous[metric]} -> {current[metric]}")
+    now, before = report.get("upstream_calls_per_request"), baseline.get("upstream_calls_per_request")
+    if now and before and now > before * (1 + tolerance):
+        problems.append(f"upstream_calls_per_request: {before} -> {now}")
+    return problems
+
+
+async def run(args: argparse.Namespace) -> dict:
+    requests, skipped = load_requests(args.requests)
+    if not requests:
+        raise SystemExit(f"No replayable requests in {args.requests} ({skipped} lines skipped)")
+
+    if args.target == "inprocess":
+        configure_stub_env(args)
+        tracemalloc.start()
+        import main
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with main.app.router.lifespan_context(main.app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                results, elapsed = await replay(client, requests, args.total, args.concurrency, args.timeout)
+        upstream = inprocess_upstream_calls()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report = build_report(args, results, elapsed, upstream, skipped)
+        report["memory"]["python_peak_kb"] = peak // 1024
+    else:
+        before = await remote_upstream_calls(args.stub_url)
+        async with httpx.AsyncClient(base_url=args.target) as client:
+            results, elapsed = await replay(client, requests, args.total, args.concurrency, args.timeout)
+        after = await remote_upstream_calls(args.stub_url)
+        upstream = None
+        if before is not None and after is not None:
+            upstream = {k: after.get(k, 0) - before.get(k, 0) for k in after}
+        report = build_report(args, results, elapsed, upstream, skipped)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", default=os.path.join(ROOT, "benchmarks", "request_mix.jsonl"))
+    parser.add_argument("--target", default="inprocess", help="'inprocess' or a base URL of a running server")
+    parser.add_argument("--stub-url", help="stub LLM server URL, for upstream call counts against a running server")
+    parser.add_argument("--total", type=int, default=100, help="requests to send (the mix is cycled)")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--latency-dist", default="lognormal")
+    parser.add_argument("--latency-mean", type=float, default=0.2)
+    parser.add_argument("--latency-stddev", type=float, default=0.05)
+    parser.add_argument("--latency-per-item", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--with-cache", action="store_true", help="leave the itinerary cache enabled")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="previous report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed fractional slowdown vs the baseline")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    problems: List[str] = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        report["regressions"] = problems
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
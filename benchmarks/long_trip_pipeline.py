@@ -0,0 +1,95 @@
+"""Wall-clock of long-trip generation: sequential (outline, then fixed 4-day
+chunks) versus pipelined (adaptive chunks started while the outline streams).
+
+Runs `AISuggestion.generate_suggestion` directly against the stub backend with
+fixed latencies, so the difference is purely the scheduling of the calls.
+
+    python benchmarks/long_trip_pipeline.py --days 5 10 20 30 --repeat 3
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import datetime
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+from app.core.llm_stub import StubBackend, StubConfig
+from app.services.ai_suggestion.ai_suggestion import AISuggestion
+from app.services.ai_suggestion.ai_suggestion_schema import ai_suggestion_request
+
+
+def make_request(days: int) -> ai_suggestion_request:
+    start = datetime.date(2025, 6, 1)
+    return ai_suggestion_request(
+        total_adults=2,
+        total_children=0,
+        destination="Lisbon, Portugal",
+        destination_state="Lisbon",
+        location="Europe",
+        departure_date=start.isoformat(),
+        return_date=(start + datetime.timedelta(days=days - 1)).isoformat(),
+        amenities=["wifi"],
+        activities=["museums", "sightseeing"],
+        pacing=["balanced"],
+        food=["local cuisine"],
+        special_note="",
+    )
+
+
+async def time_generation(pipeline: bool, days: int, config: StubConfig) -> dict:
+    backend = StubBackend(config)
+    service = AISuggestion(backend=backend, pipeline=pipeline)
+    started = time.perf_counter()
+    response = await service.generate_suggestion(make_request(days))
+    elapsed = time.perf_counter() - started
+    assert len(response.data["days"]) == days, "stub itinerary lost days"
+    return {"seconds": elapsed, "upstream_calls": sum(backend.calls.values())}
+
+
+async def run(args: argparse.Namespace) -> dict:
+    config = StubConfig(
+        latency_dist="fixed",
+        latency_mean=args.first_token,
+        latency_per_item=args.per_day,
+        seed=args.seed,
+    )
+    results = {}
+    for days in args.days:
+        row = {}
+        for name, pipeline in (("sequential", False), ("pipelined", True)):
+            runs = [await time_generation(pipeline, days, config) for _ in range(args.repeat)]
+            row[name] = {
+                "median_s": round(statistics.median(r["seconds"] for r in runs), 4),
+                "upstream_calls": runs[0]["upstream_calls"],
+            }
+        row["speedup"] = round(row["sequential"]["median_s"] / row["pipelined"]["median_s"], 3)
+        results[str(days)] = row
+    return {
+        "config": {
+            "first_token_s": args.first_token,
+            "per_detail_day_s": args.per_day,
+            "repeat": args.repeat,
+        },
+        "days": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, nargs="+", default=[5, 10, 20, 30])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--first-token", type=float, default=0.3, help="stub time to first token, seconds")
+    parser.add_argument("--per-day", type=float, default=0.1, help="stub time per detailed day, seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
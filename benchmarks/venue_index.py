@@ -0,0 +1,155 @@
+"""Regenerate requests answered from the local venue index versus the LLM.
+
+First `--itineraries` itineraries are generated over a few destinations
+with the stub backend, filling a fresh venue index. Then a mix of
+regenerate requests runs one after another, once with the index and once
+without: kind-of-venue searches ("museum", "gardens"), "alternatives to
+<activity>" requests naming one activity of the day plan, and searches
+for things the itineraries never contain, which must fall back to the
+LLM. For each run it reports the local-hit rate, latency per path and
+upstream calls.
+
+    python benchmarks/venue_index.py --itineraries 30 --requests 200
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import datetime
+import tempfile
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+from app.core.llm_stub import StubBackend, StubConfig
+from app.core.venue_index import VenueIndex
+from app.services.ai_suggestion.ai_suggestion import AISuggestion
+from app.services.ai_suggestion.ai_suggestion_schema import ai_suggestion_request
+from app.services.regenerate_plan.regenerate_plan import RegeneratePlan
+from app.services.regenerate_plan.regenerate_plan_schema import regenerate_plan_request
+from load_test import percentile
+
+DESTINATIONS = ["Lisbon, Portugal", "Kyoto, Japan", "Denver, USA"]
+KIND_SEARCHES = ["museum", "gardens", "a quiet park", "lunch", "cathedral", "something with a viewpoint", "theatre", "a cafe"]
+UNKNOWN_SEARCHES = ["rooftop jazz bar", "kid-friendly water park", "vegan cooking class", "hot air balloon"]
+
+
+def make_request(destination: str, start: datetime.date, days: int) -> ai_suggestion_request:
+    return ai_suggestion_request(
+        total_adults=2,
+        total_children=0,
+        destination=destination,
+        destination_state="",
+        location="",
+        departure_date=start.isoformat(),
+        return_date=(start + datetime.timedelta(days=days - 1)).isoformat(),
+        amenities=[],
+        activities=["museums"],
+        pacing=["balanced"],
+        food=["local cuisine"],
+        special_note="",
+    )
+
+
+async def fill(index: VenueIndex, config: StubConfig, args: argparse.Namespace) -> Dict[str, List[List[dict]]]:
+    """Generate itineraries into `index`; returns each destination's day plans."""
+    service = AISuggestion(backend=StubBackend(config), venues=index)
+    rng = random.Random(args.seed)
+    plans: Dict[str, List[List[dict]]] = {d: [] for d in DESTINATIONS}
+    for n in range(args.itineraries):
+        destination = DESTINATIONS[n % len(DESTINATIONS)]
+        start = datetime.date(2025, 1, 1) + datetime.timedelta(days=n)
+        response = await service.get_suggestion(make_request(destination, start, rng.randint(2, 4)), admit=False)
+        plans[destination].extend([a.model_dump() for a in day.activities] for day in response.data.days if day.activities)
+    return plans
+
+
+def make_mix(plans: Dict[str, List[List[dict]]], args: argparse.Namespace) -> List[regenerate_plan_request]:
+    rng = random.Random(args.seed + 1)
+    mix = []
+    for _ in range(args.requests):
+        destination = rng.choice(DESTINATIONS)
+        day_plan = rng.choice(plans[destination])
+        roll = rng.random()
+        if roll < args.unknown_share:
+            search = rng.choice(UNKNOWN_SEARCHES)
+        elif roll < args.unknown_share + args.named_share:
+            activity = rng.choice(day_plan)
+            search = f"Alternatives to {activity['title']} at {activity['time']}"
+        else:
+            search = rng.choice(KIND_SEARCHES)
+        mix.append(regenerate_plan_request(
+            user_search=search,
+            day_plan=day_plan,
+            user_info={"destination": destination, "total_adults": 2, "total_children": 0},
+        ))
+    return mix
+
+
+async def replay(mix: List[regenerate_plan_request], config: StubConfig, index: Optional[VenueIndex]) -> dict:
+    service = RegeneratePlan(backend=StubBackend(config), venues=index)
+    latencies: Dict[str, List[float]] = {"index": [], "llm": []}
+    started = time.perf_counter()
+    for request in mix:
+        hits = service.index_hits.value
+        t0 = time.perf_counter()
+        response = await service.regenerate_plan(request)
+        elapsed = time.perf_counter() - t0
+        assert len(response.data["alternative_options"]) == 4
+        latencies["index" if service.index_hits.value > hits else "llm"].append(elapsed)
+    total = time.perf_counter() - started
+    return {
+        "seconds": round(total, 3),
+        "local_hit_rate": round(len(latencies["index"]) / len(mix), 4),
+        "upstream_calls": sum(service.backend.calls.values()),
+        "paths": {
+            path: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50) * 1000, 2) if values else None,
+                "p95_ms": round(percentile(values, 95) * 1000, 2) if values else None,
+            }
+            for path, values in latencies.items()
+        },
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    config = StubConfig(latency_dist="fixed", latency_mean=args.latency_mean, seed=args.seed)
+    index = VenueIndex(os.path.join(tempfile.mkdtemp(prefix="vacay-bench-"), "venues.sqlite3"))
+    plans = await fill(index, config, args)
+    indexed = await index.stats()
+    mix = make_mix(plans, args)
+    return {
+        "config": {
+            "itineraries": args.itineraries,
+            "requests": len(mix),
+            "unknown_share": args.unknown_share,
+            "named_share": args.named_share,
+            "latency_mean": args.latency_mean,
+            "venues_indexed": indexed["venues"],
+            "full_text_search": indexed["full_text_search"],
+        },
+        "without_index": await replay(mix, config, None),
+        "with_index": await replay(mix, config, index),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--itineraries", type=int, default=30)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--unknown-share", type=float, default=0.2, help="share of searches the index cannot answer")
+    parser.add_argument("--named-share", type=float, default=0.3, help="share of 'alternatives to <activity>' requests")
+    parser.add_argument("--latency-mean", type=float, default=0.3, help="stub time to first token, seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""How throughput scales with the number of uvicorn worker processes.
+
+For each worker count this starts the HTTP stub LLM and `uvicorn main:app
+--workers N` pointed at it (fresh data directory; itinerary cache off unless
+`--with-cache`), replays the request mix at a fixed concurrency and reports
+throughput and latency. The stub's `peak_in_flight` shows the workers
+together kept to LLM_MAX_IN_FLIGHT upstream calls.
+
+With a low stub latency the service's own CPU work (JSON parsing,
+validation, scheduling) is the bottleneck, which is what extra workers
+spread over cores; expect little gain beyond the host's core count.
+
+    python benchmarks/worker_scaling.py --workers 1 2 4 --total 400 --concurrency 64
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+
+from load_test import load_requests, replay, summarize
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start(args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, *args],
+        cwd=ROOT,
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_ready(url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not come up")
+            await asyncio.sleep(0.2)
+
+
+def stop(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def measure(workers: int, requests: List[dict], args: argparse.Namespace) -> dict:
+    stub_port, app_port = free_port(), free_port()
+    data = tempfile.mkdtemp(prefix="vacay-bench-")
+    stub = start(
+        ["-m", "app.core.llm_stub", "--port", str(stub_port), "--latency-dist", "fixed",
+         "--latency-mean", str(args.latency_mean), "--latency-per-item", str(args.latency_per_item)],
+        {},
+    )
+    app = start(
+        ["-m", "uvicorn", "main:app", "--port", str(app_port), "--workers", str(workers), "--log-level", "warning"],
+        {
+            "LLM_BACKEND": "openai",
+            "OPENAI_API_KEY": "stub",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{stub_port}/v1",
+            "WEB_CONCURRENCY": str(workers),
+            "LLM_MAX_IN_FLIGHT": str(args.max_in_flight),
+            "LLM_SLOTS_DIR": os.path.join(data, "llm_slots"),
+            "JOBS_DB_PATH": os.path.join(data, "jobs.sqlite3"),
+            "SUGGESTION_CACHE_ENABLED": "true" if args.with_cache else "false",
+            "SUGGESTION_CACHE_DB_PATH": os.path.join(data, "suggestion_cache.sqlite3"),
+            "ADMISSION_ENABLED": "false",
+        },
+    )
+    try:
+        await wait_ready(f"http://127.0.0.1:{stub_port}/stats")
+        await wait_ready(f"http://127.0.0.1:{app_port}/health")
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{app_port}", limits=limits) as client:
+            results, elapsed = await replay(client, requests, args.total, args.concurrency, args.timeout)
+            stub_stats = (await client.get(f"http://127.0.0.1:{stub_port}/stats")).json()
+    finally:
+        stop(app)
+        stop(stub)
+
+    statuses: Dict[int, int] = {}
+    for _, _, status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    return {
+        **summarize([r[3] for r in results], statuses, elapsed),
+        "upstream_calls": sum(stub_stats["calls"].values()),
+        "upstream_peak_in_flight": stub_stats["peak_in_flight"],
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    requests, skipped = load_requests(args.requests)
+    results = {}
+    for workers in args.workers:
+        results[str(workers)] = await measure(workers, requests, args)
+    base = results[str(args.workers[0])]["throughput_rps"]
+    for row in results.values():
+        row["scaling"] = round(row["throughput_rps"] / base, 3) if base else None
+    return {
+        "config": {
+            "requests_file": args.requests,
+            "skipped_lines": skipped,
+            "total": args.total,
+            "concurrency": args.concurrency,
+            "latency_mean": args.latency_mean,
+            "latency_per_item": args.latency_per_item,
+            "max_in_flight": args.max_in_flight,
+            "with_cache": args.with_cache,
+            "cpus": os.cpu_count(),
+        },
+        "workers": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", default=os.path.join(ROOT, "benchmarks", "request_mix.jsonl"))
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--total", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--latency-mean", type=float, default=0.05, help="stub time to first token, seconds")
+    parser.add_argument("--latency-per-item", type=float, default=0.0, help="stub time per generated item, seconds")
+    parser.add_argument("--max-in-flight", type=int, default=16, help="LLM_MAX_IN_FLIGHT shared by all workers")
+    parser.add_argument("--with-cache", action="store_true", help="keep the itinerary cache on (shared by the workers through SQLite)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
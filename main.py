@@ -1,9 +1,41 @@
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.core.config import settings
-from app.services.ai_suggestion.ai_suggestion_route import router as ai_suggestion_router
-from app.services.regenerate_plan.regenerate_plan_route import router as regenerate_plan_router
+from app.core.admission import admission
+from app.core.deadline import DeadlineMiddleware
+from app.core.metrics import render_prometheus
+from app.core.model_router import model_router
+from app.core.tracing import TraceMiddleware, configure_logging
+from app.core.upstream import upstream
+
+# before the service imports, which log while building their backends
+configure_logging()
+
+from app.services.ai_suggestion.ai_suggestion_route import router as ai_suggestion_router, suggestion_cache
+from app.services.regenerate_plan.regenerate_plan_route import router as regenerate_plan_router, regenerate_plan
+from app.services.jobs.jobs_route import router as jobs_router, jobs
+from app.services.batch.batch_route import router as batch_router
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.LLM_BACKEND == "openai":
+        # connect before the first request rather than during it
+        await upstream.start()
+    await jobs.start()
+    if suggestion_cache is not None:
+        suggestion_cache.start(purge_interval=settings.SUGGESTION_CACHE_PURGE_INTERVAL_SECONDS)
+    try:
+        yield
+    finally:
+        regenerate_plan.cancel_prefetch()
+        if suggestion_cache is not None:
+            await suggestion_cache.stop()
+        await jobs.stop()
+        await upstream.close()
 
 
 app = FastAPI(
@@ -11,7 +43,8 @@ app = FastAPI(
     description="An AI-powered travel planning companion",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -20,10 +53,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id", "X-Token-Usage"],
+)
+app.add_middleware(
+    DeadlineMiddleware,
+    default_seconds=settings.REQUEST_TIMEOUT_SECONDS,
+    margin_seconds=settings.REQUEST_DEADLINE_MARGIN_SECONDS,
+    low_seconds=settings.REQUEST_DEADLINE_LOW_SECONDS,
 )
+app.add_middleware(TraceMiddleware)
 
 app.include_router(ai_suggestion_router, tags=["AI Suggestion"])
 app.include_router(regenerate_plan_router, tags=["Regenerate Plan"])
+app.include_router(jobs_router, tags=["Jobs"])
+app.include_router(batch_router, tags=["Batch"])
 
 
 @app.get("/", tags=["Health"])
@@ -43,10 +86,31 @@ async def health_check():
         "service": "Vacay Breeze AI"
     }
 
+@app.get("/admission/stats", tags=["Health"])
+async def admission_stats():
+    """Admission queue, shed counts and upstream circuit state"""
+    return admission.stats()
+
+@app.get("/models/stats", tags=["Health"])
+async def model_stats():
+    """Model per stage, and rolling latency/error rate per model"""
+    return model_router.stats()
+
+@app.get("/upstream/stats", tags=["Health"])
+async def upstream_stats():
+    """Upstream connection pool: connections opened versus requests sent"""
+    return upstream.stats()
+
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app", 
         host="0.0.0.0", 
         port=9073, 
-        reload=True
+        reload=settings.RELOAD,
+        workers=1 if settings.RELOAD else settings.WEB_CONCURRENCY,
     )
\ No newline at end of file
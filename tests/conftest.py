@@ -0,0 +1,17 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# offline: the stub backend, and databases in a throwaway directory (set
+# before anything imports app.core.config)
+DATA = tempfile.mkdtemp(prefix="vacay-tests-")
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+os.environ.setdefault("LLM_BACKEND", "stub")
+os.environ.setdefault("STUB_LATENCY_DIST", "fixed")
+os.environ.setdefault("STUB_LATENCY_MEAN", "0.01")
+os.environ.setdefault("SUGGESTION_CACHE_DB_PATH", os.path.join(DATA, "suggestion_cache.sqlite3"))
+os.environ.setdefault("JOBS_DB_PATH", os.path.join(DATA, "jobs.sqlite3"))
+os.environ.setdefault("VENUE_INDEX_DB_PATH", os.path.join(DATA, "venues.sqlite3"))
@@ -0,0 +1,120 @@
+import time
+import asyncio
+
+import httpx
+import pytest
+
+import main
+from app.core.admission import AdmissionController, CircuitBreaker, CircuitOpen, Overloaded, admission
+from app.core.llm_stub import StubBackend, StubConfig
+from app.services.regenerate_plan.regenerate_plan_route import regenerate_plan
+
+
+def regenerate_body(search: str) -> dict:
+    return {
+        "user_search": search,
+        "day_plan": [{"time": "9:00 AM", "title": "Nyhavn", "description": "", "place": "Nyhavn", "keyword": "sightseeing"}],
+        "user_info": {"destination": "Copenhagen, Denmark", "total_adults": 2, "total_children": 0},
+    }
+
+
+def make_breaker(**kwargs) -> CircuitBreaker:
+    options = {"error_threshold": 0.5, "min_calls": 4, "window_seconds": 30, "open_seconds": 0.1}
+    options.update(kwargs)
+    return CircuitBreaker(**options)
+
+
+def trip(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.min_calls):
+        breaker.record(breaker.check(), False)
+
+
+def test_requests_beyond_capacity_are_shed_with_503_and_retry_after(monkeypatch):
+    # room for one request and no queue
+    monkeypatch.setattr(admission, "enabled", True)
+    monkeypatch.setattr(admission, "capacity", 1)
+    monkeypatch.setattr(admission, "max_queue_cost", 0)
+    monkeypatch.setattr(regenerate_plan, "backend", StubBackend(StubConfig(latency_dist="fixed", latency_mean=0.3)))
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(
+                client.post("/regenerate_plan", json=regenerate_body("a harbour boat tour")),
+                client.post("/regenerate_plan", json=regenerate_body("a smørrebrød lunch")),
+            )
+
+    responses = asyncio.run(run())
+
+    assert sorted(r.status_code for r in responses) == [200, 503]
+    shed = next(r for r in responses if r.status_code == 503)
+    assert int(shed.headers["Retry-After"]) >= 1
+    assert admission._in_use == 0
+
+
+def test_failures_open_the_circuit_and_shed_at_admission():
+    breaker = make_breaker(open_seconds=30)
+    breaker.record(breaker.check(), True)
+    breaker.record(breaker.check(), False)
+    breaker.record(breaker.check(), True)
+    assert breaker.state == "closed"  # below min_calls
+
+    breaker.record(breaker.check(), False)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpen) as excinfo:
+        breaker.check()
+    assert excinfo.value.retry_after >= 1
+
+    controller = AdmissionController(capacity=4, breaker=breaker)
+    with pytest.raises(Overloaded):
+        asyncio.run(controller.acquire(1))
+    assert controller._in_use == 0
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = make_breaker()
+    trip(breaker)
+    time.sleep(0.15)
+    assert breaker.state == "half_open"
+
+    probe = breaker.check()
+    with pytest.raises(CircuitOpen):
+        breaker.check()  # only one probe at a time
+    breaker.record(probe, True)
+    assert breaker.state == "closed"
+
+
+def test_failed_probe_reopens_and_abandoned_probe_frees_the_slot():
+    breaker = make_breaker()
+    trip(breaker)
+    time.sleep(0.15)
+
+    breaker.abandon(breaker.check())
+    probe = breaker.check()  # the cancelled probe did not use up the half-open slot
+    breaker.record(probe, False)
+    assert breaker.state == "open"
+
+
+def test_calls_from_before_the_circuit_opened_are_not_the_probe():
+    breaker = make_breaker()
+    slow_success = breaker.check()
+    slow_failure = breaker.check()
+    trip(breaker)
+    time.sleep(0.15)
+    probe = breaker.check()
+
+    # late outcomes of calls let through while the circuit was closed
+    breaker.record(slow_success, True)
+    assert breaker.state == "half_open"
+    breaker.record(slow_failure, False)
+    assert breaker.state == "half_open"
+    breaker.abandon(slow_failure)
+    with pytest.raises(CircuitOpen):
+        breaker.check()  # the probe is still the one in flight
+
+    breaker.record(probe, True)
+    assert breaker.state == "closed"
+    # and once closed, they do not count towards opening it again
+    for _ in range(breaker.min_calls):
+        breaker.record(slow_failure, False)
+    assert breaker.state == "closed"
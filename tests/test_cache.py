@@ -0,0 +1,40 @@
+import time
+import asyncio
+
+from app.core.cache import SQLiteStore, TieredCache
+
+
+def rows(store: SQLiteStore) -> int:
+    with store._lock:
+        return store._connect().execute(f"SELECT COUNT(*) FROM {store.table}").fetchone()[0]
+
+
+def test_purge_expired_deletes_only_expired_rows(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.sqlite3"), ttl_seconds=0.05)
+    for n in range(20):
+        store.set(f"old-{n}", "{}")
+    time.sleep(0.1)
+    store.ttl_seconds = 60
+    store.set("fresh", "{}")
+
+    assert store.purge_expired() == 20
+    assert rows(store) == 1
+    assert store.get("fresh") == "{}"
+
+
+def test_background_purge_removes_rows_nobody_looks_up(tmp_path):
+    cache = TieredCache("test_purge_cache", max_entries=4, ttl_seconds=0.05, db_path=str(tmp_path / "cache.sqlite3"))
+
+    async def run() -> int:
+        cache.start(purge_interval=0.05)
+        try:
+            for n in range(10):
+                await cache.set(f"key-{n}", {"n": n})
+            assert rows(cache.disk) == 10
+            await asyncio.sleep(0.3)
+            return rows(cache.disk)
+        finally:
+            await cache.stop()
+
+    assert asyncio.run(run()) == 0
+    assert cache.stats()["purged"] >= 10
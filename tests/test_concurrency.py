@@ -0,0 +1,78 @@
+import time
+import asyncio
+
+import httpx
+
+import main
+from app.core.llm_stub import StubBackend, StubConfig
+from app.services.ai_suggestion.ai_suggestion_route import suggestion
+from app.services.regenerate_plan.regenerate_plan_route import regenerate_plan
+
+REGENERATE_LATENCY = 1.0
+N = 5
+
+DESTINATIONS = ["Kyoto, Japan", "Lisbon, Portugal", "Denver, USA", "Porto, Portugal", "Oslo, Norway"]
+SEARCHES = ["a quiet tea house", "rooftop jazz bar", "vegan cooking class", "a bookshop", "hot springs"]
+
+
+def suggestion_body(n: int) -> dict:
+    # different trips, so the calls are not coalesced into one generation
+    return {
+        "total_adults": 2,
+        "total_children": 0,
+        "destination": DESTINATIONS[n],
+        "destination_state": "",
+        "location": "",
+        "departure_date": "2025-06-01",
+        "return_date": "2025-06-03",
+        "amenities": [],
+        "activities": ["museums"],
+        "pacing": ["balanced"],
+        "food": ["local cuisine"],
+        "special_note": "",
+    }
+
+
+def regenerate_body(n: int) -> dict:
+    return {
+        "user_search": SEARCHES[n],
+        "day_plan": [
+            {"time": "9:00 AM", "title": "Fushimi Inari Shrine", "description": "Torii gates", "place": "Fushimi Inari Shrine", "keyword": "cultural"},
+        ],
+        "user_info": {"destination": DESTINATIONS[n], "total_adults": 2, "total_children": 0},
+    }
+
+
+def test_regenerate_calls_do_not_block_suggestions(monkeypatch):
+    monkeypatch.setattr(regenerate_plan, "backend", StubBackend(StubConfig(latency_dist="fixed", latency_mean=REGENERATE_LATENCY)))
+    monkeypatch.setattr(suggestion, "backend", StubBackend(StubConfig(latency_dist="fixed", latency_mean=0.05)))
+    spans = {"regenerate": [], "suggestion": []}
+
+    async def timed(client: httpx.AsyncClient, name: str, path: str, body: dict) -> None:
+        started = time.perf_counter()
+        response = await client.post(path, json=body, headers={"X-Cache-Bypass": "true"})
+        assert response.status_code == 200, response.text
+        spans[name].append((started, time.perf_counter()))
+
+    async def run() -> float:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            started = time.perf_counter()
+            await asyncio.gather(
+                *(timed(client, "regenerate", "/regenerate_plan", regenerate_body(n)) for n in range(N)),
+                *(timed(client, "suggestion", "/ai_suggestion", suggestion_body(n)) for n in range(N)),
+            )
+            return time.perf_counter() - started
+
+    wall = asyncio.run(run())
+
+    assert len(spans["regenerate"]) == len(spans["suggestion"]) == N
+    # all the regenerate calls waited on their upstream at the same time...
+    assert wall < 1.5 * REGENERATE_LATENCY
+    # ...and every suggestion was served while they did
+    first_regenerate_end = min(end for _, end in spans["regenerate"])
+    last_regenerate_start = max(start for start, _ in spans["regenerate"])
+    for start, end in spans["suggestion"]:
+        assert end < first_regenerate_end
+        assert end - start < REGENERATE_LATENCY / 2
+    assert last_regenerate_start < min(end for _, end in spans["suggestion"])
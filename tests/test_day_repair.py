@@ -0,0 +1,88 @@
+import re
+import json
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.llm_stub import StubBackend, StubConfig
+from app.services.ai_suggestion.ai_suggestion import AISuggestion, _day_order
+from app.services.ai_suggestion.ai_suggestion_schema import ai_suggestion_request
+
+
+class DroppingBackend(StubBackend):
+    """Stub backend that leaves `drop` out of the first `times` detail completions containing it."""
+
+    def __init__(self, drop: int, times: int):
+        super().__init__(StubConfig(latency_dist="fixed", latency_mean=0.0))
+        self.drop = drop
+        self.times = times
+        self.detail_days = []  # day numbers asked for by each detail call
+
+    def _prepare(self, model, messages):
+        kind, content, items, item_latency = super()._prepare(model, messages)
+        if kind == "detail":
+            asked = [int(n) for n in re.findall(r"^Day (\d+) ", messages[-1]["content"], re.MULTILINE)]
+            self.detail_days.append(asked)
+            if self.drop in asked and self.times:
+                self.times -= 1
+                payload = json.loads(content)
+                payload["days"] = [day for day in payload["days"] if day["day_number"] != self.drop]
+                content = json.dumps(payload)
+        return kind, content, items, item_latency
+
+
+def make_request() -> ai_suggestion_request:
+    # 8 days: the long-trip path, outline then detail chunks
+    return ai_suggestion_request(
+        total_adults=2,
+        total_children=0,
+        destination="Lisbon, Portugal",
+        destination_state="",
+        location="",
+        departure_date="2025-06-01",
+        return_date="2025-06-08",
+        amenities=[],
+        activities=["museums"],
+        pacing=["balanced"],
+        food=["local cuisine"],
+        special_note="",
+    )
+
+
+def generate(backend: DroppingBackend):
+    service = AISuggestion(backend=backend)
+    return asyncio.run(service.get_suggestion(make_request(), admit=False)), service
+
+
+def test_missing_day_is_re_requested_alone():
+    backend = DroppingBackend(drop=2, times=1)
+    response, _ = generate(backend)
+
+    first_calls = [asked for asked in backend.detail_days if 2 in asked]
+    assert len(first_calls) == 2
+    assert len(first_calls[0]) > 1
+    # the repair call asks for the missing day only
+    assert first_calls[1] == [2]
+    assert response.data.status == "COMPLETED"
+
+
+def test_repaired_days_are_merged_in_day_order():
+    response, _ = generate(DroppingBackend(drop=2, times=1))
+
+    days = [day.model_dump() for day in response.data.days]
+    assert days == sorted(days, key=_day_order)
+    assert [day["day_number"] for day in days] == list(range(1, 9))
+
+
+def test_day_still_missing_after_last_repair_round_is_an_error():
+    backend = DroppingBackend(drop=2, times=100)
+    service = AISuggestion(backend=backend)
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(service.get_suggestion(make_request(), admit=False))
+
+    assert excinfo.value.status_code == 502
+    assert "did not return valid days 2 " in excinfo.value.detail
+    # the first call plus one per repair round
+    assert sum(2 in asked for asked in backend.detail_days) == service.max_repair_rounds + 1
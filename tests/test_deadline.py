@@ -0,0 +1,133 @@
+import json
+import time
+import asyncio
+
+import httpx
+
+import main
+from app.core.config import settings
+from app.core.llm_stub import StubBackend, StubConfig
+from app.services.ai_suggestion.ai_suggestion_route import suggestion
+from app.services.regenerate_plan.regenerate_plan_route import regenerate_plan
+
+DEADLINE = 0.5
+# the caller's budget; the middleware keeps REQUEST_DEADLINE_MARGIN_SECONDS of it back
+HEADERS = {"X-Request-Timeout": str(DEADLINE + settings.REQUEST_DEADLINE_MARGIN_SECONDS), "X-Cache-Bypass": "true"}
+
+
+class SlowBackend(StubBackend):
+    """Stub backend whose calls of the given kinds take `seconds`; counts calls cut off mid-way."""
+
+    def __init__(self, seconds: float, kinds: tuple = ("short", "outline", "detail", "regenerate")):
+        super().__init__(StubConfig(latency_dist="fixed", latency_mean=0.0))
+        self.seconds = seconds
+        self.kinds = kinds
+        self.started = 0
+        self.cancelled = 0
+
+    def _delay(self, messages) -> float:
+        text = messages[-1]["content"]
+        if "ASSIGNED DAYS" in text:
+            kind = "detail"
+        elif "Itinerary ID" in text:
+            kind = "short"
+        elif "TRAVEL DETAILS" in text:
+            kind = "outline"
+        else:
+            kind = "regenerate"
+        return self.seconds if kind in self.kinds else 0.0
+
+    async def generate(self, model, messages):
+        self.started += 1
+        try:
+            await asyncio.sleep(self._delay(messages))
+            return await super().generate(model, messages)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+    async def generate_stream(self, model, messages):
+        self.started += 1
+        try:
+            await asyncio.sleep(self._delay(messages))
+            async for piece in super().generate_stream(model, messages):
+                yield piece
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+def trip(return_date: str, note: str) -> dict:
+    return {
+        "total_adults": 2,
+        "total_children": 0,
+        "destination": "Oslo, Norway",
+        "destination_state": "",
+        "location": "",
+        "departure_date": "2025-06-01",
+        "return_date": return_date,
+        "amenities": [],
+        "activities": ["museums"],
+        "pacing": ["balanced"],
+        "food": ["local cuisine"],
+        "special_note": note,
+    }
+
+
+async def post(path: str, body: dict, **headers) -> httpx.Response:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.post(path, json=body, headers={**HEADERS, **headers})
+
+
+def run_timed(coro):
+    started = time.perf_counter()
+    result = asyncio.run(coro)
+    return result, time.perf_counter() - started
+
+
+def test_suggestion_past_deadline_is_504_and_upstream_cancelled(monkeypatch):
+    backend = SlowBackend(seconds=10.0)
+    monkeypatch.setattr(suggestion, "backend", backend)
+
+    response, elapsed = run_timed(post("/ai_suggestion", trip("2025-06-03", "deadline 504")))
+
+    assert response.status_code == 504, response.text
+    assert elapsed < DEADLINE + 1.0
+    assert backend.started >= 1
+    assert backend.cancelled == backend.started
+
+
+def test_regenerate_past_deadline_is_504_and_upstream_cancelled(monkeypatch):
+    backend = SlowBackend(seconds=10.0)
+    monkeypatch.setattr(regenerate_plan, "backend", backend)
+    body = {
+        "user_search": "a sauna by the fjord",
+        "day_plan": [{"time": "9:00 AM", "title": "Vigeland Park", "description": "", "place": "Vigeland Park", "keyword": "outdoor"}],
+        "user_info": {"destination": "Oslo, Norway", "total_adults": 2, "total_children": 0},
+    }
+
+    response, elapsed = run_timed(post("/regenerate_plan", body))
+
+    assert response.status_code == 504, response.text
+    assert elapsed < DEADLINE + 1.0
+    assert backend.started >= 1
+    assert backend.cancelled == backend.started
+
+
+def test_stream_past_deadline_ends_partial_and_upstream_cancelled(monkeypatch):
+    # the outline comes back at once; every detail call outlasts the deadline
+    backend = SlowBackend(seconds=10.0, kinds=("detail",))
+    monkeypatch.setattr(suggestion, "backend", backend)
+
+    response, elapsed = run_timed(post("/ai_suggestion/stream", trip("2025-06-08", "deadline stream")))
+
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines() if line.strip()]
+    assert events[0]["event"] == "outline"
+    assert events[-1]["event"] == "complete"
+    assert events[-1]["status"] == "PARTIAL"
+    assert events[-1]["missing_days"] == list(range(1, 9))
+    assert elapsed < DEADLINE + 1.0
+    # every detail call was cut off; only the outline call finished
+    assert backend.cancelled == backend.started - 1
@@ -0,0 +1,48 @@
+import asyncio
+
+import httpx
+
+import main
+from app.core.llm_stub import StubBackend, StubConfig
+from app.services.ai_suggestion.ai_suggestion_route import suggestion
+
+
+def trip(departure_date: str, return_date: str) -> dict:
+    return {
+        "total_adults": 2,
+        "total_children": 0,
+        "destination": "Vienna, Austria",
+        "destination_state": "",
+        "location": "",
+        "departure_date": departure_date,
+        "return_date": return_date,
+        "amenities": [],
+        "activities": ["museums"],
+        "pacing": ["balanced"],
+        "food": ["local cuisine"],
+        "special_note": "",
+    }
+
+
+def post(path: str, body: dict) -> httpx.Response:
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(path, json=body, headers={"X-Cache-Bypass": "true"})
+    return asyncio.run(run())
+
+
+def test_bad_dates_are_400_not_500():
+    response = post("/ai_suggestion", trip("2025-06-05", "2025-06-01"))
+    assert response.status_code == 400
+    assert "return_date" in response.json()["detail"]
+
+    response = post("/ai_suggestion", trip("5 June", "2025-06-08"))
+    assert response.status_code == 400
+
+
+def test_unparseable_completion_is_502_not_500(monkeypatch):
+    monkeypatch.setattr(suggestion, "backend", StubBackend(StubConfig(latency_dist="fixed", latency_mean=0.0, malformed_rate=1.0)))
+    response = post("/ai_suggestion", trip("2025-06-01", "2025-06-03"))
+    assert response.status_code == 502
+    assert "invalid JSON" in response.json()["detail"]
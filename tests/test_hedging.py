@@ -0,0 +1,109 @@
+import time
+import asyncio
+
+from app.core.hedging import Hedger
+from app.core.llm_stub import StubBackend, StubConfig
+
+MESSAGES = [{"role": "user", "content": "TRAVEL DETAILS:\n- Trip Duration: 2 days\n- Destination: Seville, Spain"}]
+
+
+class ScriptedBackend(StubBackend):
+    """Stub backend whose successive calls take the given latencies; records starts and cancellations."""
+
+    def __init__(self, *latencies: float):
+        super().__init__(StubConfig(latency_dist="fixed", latency_mean=0.0))
+        self.latencies = list(latencies)
+        self.starts = []
+        self.cancelled = 0
+
+    async def generate(self, model, messages):
+        seconds = self.latencies.pop(0)
+        self.starts.append(time.monotonic())
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return await super().generate(model, messages)
+
+
+def make_hedger(name: str, **kwargs) -> Hedger:
+    options = {"min_samples": 3, "budget_ratio": 1.0, "burst": 10.0, "min_delay": 0.05}
+    options.update(kwargs)
+    hedger = Hedger(name, **options)
+    for _ in range(hedger.min_samples):
+        hedger.observe("detail", 0.05)  # calls usually take 50ms
+    return hedger
+
+
+def call(hedger: Hedger, backend: ScriptedBackend, **kwargs):
+    async def run():
+        started = time.monotonic()
+        result = await hedger.run(lambda: backend.complete("stub", MESSAGES), group="detail", **kwargs)
+        return result, time.monotonic() - started
+    return asyncio.run(run())
+
+
+def test_slow_call_is_hedged_after_the_delay_and_the_loser_cancelled():
+    hedger = make_hedger("test_hedge_fires")
+    backend = ScriptedBackend(2.0, 0.01)
+    delay = hedger.delay("detail")
+
+    result, elapsed = call(hedger, backend)
+
+    assert result
+    assert len(backend.starts) == 2
+    # the copy went out once the call ran past the p95 delay, not before
+    assert backend.starts[1] - backend.starts[0] >= delay - 0.01
+    assert elapsed < 0.5
+    assert hedger.hedges.value == 1 and hedger.wins.value == 1
+    # the slow primary lost and was cancelled
+    assert backend.cancelled == 1
+
+
+def test_primary_that_wins_cancels_the_hedge():
+    hedger = make_hedger("test_hedge_loses")
+    backend = ScriptedBackend(0.15, 2.0)
+
+    _, elapsed = call(hedger, backend)
+
+    assert len(backend.starts) == 2
+    assert elapsed < 0.5
+    assert hedger.wins.value == 0
+    assert backend.cancelled == 1
+
+
+def test_fast_call_is_not_hedged():
+    hedger = make_hedger("test_hedge_fast")
+    backend = ScriptedBackend(0.01)
+
+    call(hedger, backend)
+
+    assert len(backend.starts) == 1
+    assert hedger.hedges.value == 0
+
+
+def test_no_hedge_without_budget():
+    # each call earns half a hedge: the first cannot pay for one, the second can
+    hedger = make_hedger("test_hedge_budget", budget_ratio=0.5, burst=1.0)
+    backend = ScriptedBackend(0.3, 1.0, 0.01)
+
+    _, elapsed = call(hedger, backend)
+    assert len(backend.starts) == 1
+    assert elapsed >= 0.3
+    assert hedger.budget_exhausted.value == 1
+    assert hedger.hedges.value == 0
+
+    call(hedger, backend)
+    assert len(backend.starts) == 3
+    assert hedger.hedges.value == 1
+
+
+def test_no_hedge_when_no_upstream_slot_is_free():
+    hedger = make_hedger("test_hedge_no_slot")
+    backend = ScriptedBackend(0.2, 0.01)
+
+    call(hedger, backend, can_hedge=lambda: False)
+
+    assert len(backend.starts) == 1
+    assert hedger.hedges.value == 0
@@ -0,0 +1,64 @@
+import asyncio
+
+from app.core.llm_stub import StubBackend, StubConfig
+from app.services.ai_suggestion.ai_suggestion import AISuggestion
+from app.services.ai_suggestion.ai_suggestion_schema import ai_suggestion_request
+from app.services.jobs.jobs import CANCELLED, JobRunner, JobStore
+
+POLL = 0.05
+
+
+def make_request() -> ai_suggestion_request:
+    return ai_suggestion_request(
+        total_adults=2,
+        total_children=0,
+        destination="Denver, USA",
+        destination_state="",
+        location="",
+        departure_date="2025-06-01",
+        return_date="2025-06-03",
+        amenities=[],
+        activities=["museums"],
+        pacing=["balanced"],
+        food=["local cuisine"],
+        special_note="",
+    )
+
+
+async def wait_for(condition, timeout: float = 2.0) -> bool:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+
+def test_cancel_through_another_worker_stops_the_owner(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    # two worker processes sharing one store; the owner's upstream call would take 30s
+    slow = AISuggestion(backend=StubBackend(StubConfig(latency_dist="fixed", latency_mean=30.0)))
+    idle = AISuggestion(backend=StubBackend(StubConfig(latency_dist="fixed", latency_mean=0.0)))
+
+    async def run() -> None:
+        owner = JobRunner(JobStore(path), slow, workers=1, cancel_poll_interval=POLL)
+        other = JobRunner(JobStore(path), idle, workers=1, cancel_poll_interval=POLL)
+        await owner.start()
+        await other.start()
+        try:
+            job = await owner.submit(make_request())
+            assert await wait_for(lambda: job["job_id"] in owner._running)
+
+            cancelled = await other.cancel(job["job_id"])
+            assert cancelled["status"] == CANCELLED
+            assert job["job_id"] not in other._running
+
+            # the owner notices on its next poll and stops the generation
+            assert await wait_for(lambda: not owner._running, timeout=10 * POLL)
+            assert len(slow.inflight) == 0
+            assert (await owner.get(job["job_id"]))["status"] == CANCELLED
+        finally:
+            await owner.stop()
+            await other.stop()
+
+    asyncio.run(run())
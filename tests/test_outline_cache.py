@@ -0,0 +1,92 @@
+import time
+import asyncio
+
+from app.core.cache import TTLCache
+from app.core.llm_stub import StubBackend, StubConfig
+from app.services.ai_suggestion.ai_suggestion import AISuggestion
+from app.services.ai_suggestion.ai_suggestion_schema import ai_suggestion_request
+
+
+def make_request(note: str = "", destination: str = "Lisbon, Portugal") -> ai_suggestion_request:
+    # 8 days: the long-trip path. Trips differing only in the note share an
+    # outline but not a response, so none of them is coalesced with another
+    return ai_suggestion_request(
+        total_adults=2,
+        total_children=0,
+        destination=destination,
+        destination_state="",
+        location="",
+        departure_date="2025-06-01",
+        return_date="2025-06-08",
+        amenities=[],
+        activities=["museums"],
+        pacing=["balanced"],
+        food=["local cuisine"],
+        special_note=note,
+    )
+
+
+def make_service(ttl_seconds: float = 3600) -> AISuggestion:
+    return AISuggestion(
+        backend=StubBackend(StubConfig(latency_dist="fixed", latency_mean=0.05)),
+        outline_cache=TTLCache("test_outline_cache", max_entries=16, ttl_seconds=ttl_seconds),
+    )
+
+
+def generate(service: AISuggestion, *requests: ai_suggestion_request) -> list:
+    async def run():
+        return await asyncio.gather(*(service.get_suggestion(r, admit=False) for r in requests))
+    return asyncio.run(run())
+
+
+def test_cache_hit_skips_the_outline_call():
+    service = make_service()
+    generate(service, make_request("first"))
+    details = service.backend.calls["detail"]
+    responses = generate(service, make_request("second"))
+
+    assert service.backend.calls["outline"] == 1
+    assert service.backend.calls["detail"] > details
+    assert len(responses[0].data.days) == 8
+
+
+def test_concurrent_requests_wait_for_one_outline():
+    service = make_service()
+    responses = generate(service, *(make_request(f"traveller {n}") for n in range(5)))
+
+    assert service.backend.calls["outline"] == 1
+    assert all(len(r.data.days) == 8 for r in responses)
+    assert not service._outline_leaders
+
+
+def test_invalidation_forces_a_new_outline():
+    service = make_service()
+    generate(service, make_request("first"))
+    assert service.invalidate_outlines("  lisbon,   PORTUGAL ") == 1
+    generate(service, make_request("second"))
+
+    assert service.backend.calls["outline"] == 2
+
+
+def test_invalidating_another_destination_keeps_the_outline():
+    service = make_service()
+    generate(service, make_request("first"))
+    assert service.invalidate_outlines("Kyoto, Japan") == 0
+    generate(service, make_request("second"))
+
+    assert service.backend.calls["outline"] == 1
+
+
+def test_expired_outline_forces_a_new_call():
+    service = make_service(ttl_seconds=0.2)
+    generate(service, make_request("first"))
+    time.sleep(0.3)
+    generate(service, make_request("second"))
+
+    assert service.backend.calls["outline"] == 2
+
+
+def test_stats_without_outline_cache():
+    service = AISuggestion(backend=StubBackend(StubConfig(latency_dist="fixed", latency_mean=0.0)))
+    assert service.outline_cache_stats() == {"enabled": False}
+    assert make_service().outline_cache_stats()["enabled"] is True
@@ -0,0 +1,106 @@
+import re
+import asyncio
+from collections import defaultdict
+
+from app.core.llm_stub import StubBackend, StubConfig
+from app.services.ai_suggestion.ai_suggestion import (
+    AISuggestion,
+    DETAIL_SYSTEM_PROMPT,
+    OUTLINE_SYSTEM_PROMPT,
+    SHORT_TRIP_SYSTEM_PROMPT,
+)
+from app.services.ai_suggestion.ai_suggestion_schema import ai_suggestion_request
+from app.services.regenerate_plan.regenerate_plan import REGENERATE_SYSTEM_PROMPT, RegeneratePlan
+from app.services.regenerate_plan.regenerate_plan_schema import regenerate_plan_request
+
+SYSTEM_PROMPTS = {
+    "short": SHORT_TRIP_SYSTEM_PROMPT,
+    "outline": OUTLINE_SYSTEM_PROMPT,
+    "detail": DETAIL_SYSTEM_PROMPT,
+    "regenerate": REGENERATE_SYSTEM_PROMPT,
+}
+
+# two requests per stage, with values no instructions would contain
+TRIPS = [
+    {"destination": "Lisbon, Portugal", "start": "2025-06-01", "note": "travelling with grandma"},
+    {"destination": "Kyoto, Japan", "start": "2025-09-14", "note": "bring the tripod"},
+]
+SEARCHES = [
+    ("Porto, Portugal", "rooftop jazz bar", "Ribeira Square"),
+    ("Denver, USA", "vegan cooking class", "Red Rocks Amphitheatre"),
+]
+
+
+class RecordingBackend(StubBackend):
+    """Stub backend keeping the messages of every call, by stage."""
+
+    def __init__(self, config: StubConfig):
+        super().__init__(config)
+        self.sent = defaultdict(list)
+
+    def _prepare(self, model, messages):
+        prepared = super()._prepare(model, messages)
+        self.sent[prepared[0]].append(messages)
+        return prepared
+
+
+def make_request(trip: dict, return_date: str) -> ai_suggestion_request:
+    return ai_suggestion_request(
+        total_adults=2,
+        total_children=1,
+        destination=trip["destination"],
+        destination_state="",
+        location="",
+        departure_date=trip["start"],
+        return_date=return_date,
+        amenities=[],
+        activities=["museums"],
+        pacing=["balanced"],
+        food=["local cuisine"],
+        special_note=trip["note"],
+    )
+
+
+def record_prompts() -> RecordingBackend:
+    backend = RecordingBackend(StubConfig(latency_dist="fixed", latency_mean=0.0))
+    suggestion = AISuggestion(backend=backend)
+    regenerate = RegeneratePlan(backend=backend)
+
+    async def run() -> None:
+        for trip in TRIPS:
+            year, month, day = trip["start"].split("-")
+            # a 3-day trip takes the short path, an 8-day one outline + detail
+            await suggestion.get_suggestion(make_request(trip, f"{year}-{month}-{int(day) + 2:02d}"), admit=False)
+            await suggestion.get_suggestion(make_request(trip, f"{year}-{month}-{int(day) + 7:02d}"), admit=False)
+        for destination, search, title in SEARCHES:
+            await regenerate.regenerate_plan(regenerate_plan_request(
+                user_search=search,
+                day_plan=[{"time": "9:00 AM", "title": title, "description": "", "place": title, "keyword": "cultural"}],
+                user_info={"destination": destination, "total_adults": 2, "total_children": 0},
+            ))
+
+    asyncio.run(run())
+    return backend
+
+
+def request_values(user_messages: list) -> list:
+    values = [v for trip in TRIPS for v in trip.values()]
+    values += [v for search in SEARCHES for v in search]
+    values += [i for message in user_messages for i in re.findall(r"itinerary-[0-9a-f-]+", message)]
+    return values
+
+
+def test_system_prompts_are_shared_and_request_free():
+    backend = record_prompts()
+    for stage, system_prompt in SYSTEM_PROMPTS.items():
+        sent = backend.sent[stage]
+        assert len(sent) >= 2, stage
+        systems = {(messages[0]["role"], messages[0]["content"]) for messages in sent}
+        users = [m["content"] for messages in sent for m in messages if m["role"] == "user"]
+        assert systems == {("system", system_prompt)}, stage
+        # the requests differ in the user message only
+        values = request_values(users)
+        assert len(set(users)) >= 2, stage
+        assert any(value in user for value in values for user in users), stage
+        for value in values:
+            assert value not in system_prompt, (stage, value)
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from app.core.llm_stub import StubBackend, StubConfig
+from app.core.singleflight import SingleFlight
+from app.services.ai_suggestion.ai_suggestion import AISuggestion
+from app.services.ai_suggestion.ai_suggestion_schema import ai_suggestion_request
+
+
+def make_request() -> ai_suggestion_request:
+    return ai_suggestion_request(
+        total_adults=2,
+        total_children=0,
+        destination="Lisbon, Portugal",
+        destination_state="",
+        location="",
+        departure_date="2025-06-01",
+        return_date="2025-06-03",
+        amenities=[],
+        activities=["museums"],
+        pacing=["balanced"],
+        food=["local cuisine"],
+        special_note="",
+    )
+
+
+def make_backend() -> StubBackend:
+    return StubBackend(StubConfig(latency_dist="fixed", latency_mean=0.05, seed=0))
+
+
+def test_identical_requests_share_one_generation():
+    alone = make_backend()
+    asyncio.run(AISuggestion(backend=alone).get_suggestion(make_request(), admit=False))
+
+    backend = make_backend()
+    service = AISuggestion(backend=backend)
+
+    async def burst():
+        return await asyncio.gather(*(service.get_suggestion(make_request(), admit=False) for _ in range(50)))
+
+    responses = asyncio.run(burst())
+
+    assert sum(alone.calls.values()) > 0
+    assert backend.calls == alone.calls
+    assert all(r.model_dump() == responses[0].model_dump() for r in responses)
+    assert len(service.inflight) == 0
+
+
+def test_leader_error_reaches_every_waiter():
+    flight = SingleFlight("test_singleflight")
+    calls = 0
+
+    async def fail():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        raise RuntimeError("upstream down")
+
+    async def burst():
+        return await asyncio.gather(*(flight.do("key", fail) for _ in range(50)), return_exceptions=True)
+
+    results = asyncio.run(burst())
+
+    assert calls == 1
+    assert len(results) == 50
+    assert all(isinstance(r, RuntimeError) and str(r) == "upstream down" for r in results)
+    # the failed call is forgotten: the next caller starts a new one
+    assert len(flight) == 0
+    with pytest.raises(RuntimeError):
+        asyncio.run(flight.do("key", fail))
+    assert calls == 2
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.llm_stub import StubBackend, StubConfig
+from app.core.venue_index import VenueIndex
+from app.services.regenerate_plan.regenerate_plan import RegeneratePlan
+from app.services.regenerate_plan.regenerate_plan_schema import regenerate_plan_request
+
+MUSEUMS = ["Gulbenkian Museum", "Tile Museum", "Coach Museum", "Orient Museum", "Design Museum"]
+DAY_PLAN = [
+    {"time": "10:00 AM", "title": "Coach Museum", "description": "Royal carriages", "place": "Coach Museum", "keyword": "museum"},
+    {"time": "1:00 PM", "title": "Time Out Market", "description": "Food hall", "place": "Time Out Market", "keyword": "meal"},
+]
+
+
+def venue(title: str) -> dict:
+    return {"time": "11:00 AM", "title": title, "description": f"Collections of the {title}", "place": title, "keyword": "museum"}
+
+
+@pytest.fixture(params=[True, False], ids=["fts5", "word_match"])
+def index(request, tmp_path) -> VenueIndex:
+    index = VenueIndex(str(tmp_path / "venues.sqlite3"))
+    asyncio.run(index.add("Lisbon, Portugal", [venue(title) for title in MUSEUMS]))
+    if not request.param:
+        # the word-match search used where SQLite lacks FTS5
+        index.fts5 = False
+    return index
+
+
+def regenerate(index: VenueIndex, search: str):
+    service = RegeneratePlan(backend=StubBackend(StubConfig(latency_dist="fixed", latency_mean=0.0)), venues=index)
+    hits, misses = service.index_hits.value, service.index_misses.value
+    response = asyncio.run(service.regenerate_plan(regenerate_plan_request(
+        user_search=search,
+        day_plan=DAY_PLAN,
+        user_info={"destination": "lisbon,  portugal", "total_adults": 2, "total_children": 0},
+    )))
+    return response, service, service.index_hits.value - hits, service.index_misses.value - misses
+
+
+def test_index_hit_answers_without_the_llm(index):
+    response, service, hits, misses = regenerate(index, "Something with museums instead")
+
+    assert (hits, misses) == (1, 0)
+    assert sum(service.backend.calls.values()) == 0
+    options = response.data["alternative_options"]
+    titles = [option["title"] for option in options]
+    assert len(options) == 4
+    # venues already in the day plan are not offered again
+    assert "Coach Museum" not in titles
+    assert set(titles) <= set(MUSEUMS)
+
+
+def test_index_miss_falls_back_to_the_llm(index):
+    response, service, hits, misses = regenerate(index, "rooftop jazz bar")
+
+    assert (hits, misses) == (0, 1)
+    assert service.backend.calls["regenerate"] == 1
+    assert len(response.data["alternative_options"]) == 4
+
+
+def test_stats_are_read_off_the_event_loop(index, monkeypatch):
+    threads = []
+    read = VenueIndex._stats
+
+    def recording_stats(self):
+        threads.append(threading.get_ident())
+        return read(self)
+
+    monkeypatch.setattr(VenueIndex, "_stats", recording_stats)
+
+    async def run():
+        return threading.get_ident(), await index.stats()
+
+    loop_thread, stats = asyncio.run(run())
+
+    assert len(threads) == 1 and threads[0] != loop_thread
+    assert stats["venues"] == len(MUSEUMS)
+    assert stats["destinations"] == 1